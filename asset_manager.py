@@ -0,0 +1,128 @@
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import pygame
+import statics
+from interfaces import ImageCache
+
+
+class AssetKey(NamedTuple):
+    """One variant of an image: the file scaled to size, then rotated by angle degrees, then tinted."""
+    path: str
+    size: Optional[tuple[int, int]] = None
+    angle: int = 0
+    tint: Optional[tuple] = None
+
+
+def surface_bytes(surface) -> int:
+    """Bytes of pixel data held by a surface."""
+    return surface.get_pitch() * surface.get_height()
+
+
+class AssetManager:
+    """Bounded LRU cache of images and their scaled, rotated and tinted variants.
+
+    Images are loaded through ImageCache.load and every variant is derived
+    once and then kept under its AssetKey, so the frame path only does
+    dictionary lookups. Once the cached pixel data exceeds budget_bytes the
+    least recently used entries are dropped. Entries loaded by preload() are
+    pinned: they count towards the budget but are never evicted, so the
+    manifest never touches the disk again after startup.
+    """
+
+    def __init__(self, budget_bytes: int = statics.ASSET_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self._entries: OrderedDict[AssetKey, pygame.Surface] = OrderedDict()
+        self._pinned: set[AssetKey] = set()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, path: str, size: Optional[tuple[int, int]] = None, angle: int = 0, tint: Optional[tuple] = None):
+        """Get an image variant, loading the image and deriving the variant on a miss."""
+        return self.get_variant(AssetKey(path, size, angle, tint))
+
+    def get_variant(self, key: AssetKey):
+        key = self.normalize(key)
+        surface = self._entries.get(key)
+        if surface is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = self._derive(key)
+        self._entries[key] = surface
+        self.bytes += surface_bytes(surface)
+        self._evict()
+        return surface
+
+    def _derive(self, key: AssetKey):
+        # Each variant is built from the next simpler one, which is cached along the way
+        if key.tint is not None:
+            surface = self.get_variant(key._replace(tint=None)).copy()
+            surface.fill(key.tint, special_flags=pygame.BLEND_RGBA_MULT)
+            return surface
+        if key.angle:
+            return pygame.transform.rotate(self.get_variant(key._replace(angle=0)), key.angle)
+        if key.size is not None:
+            return pygame.transform.smoothscale(self.get_variant(key._replace(size=None)), key.size)
+        return ImageCache.load(key.path)
+
+    def _evict(self):
+        if self.bytes <= self.budget_bytes:
+            return
+        # The newest entry is kept even if it alone exceeds the budget
+        for key in list(self._entries)[:-1]:
+            if self.bytes <= self.budget_bytes:
+                break
+            if key in self._pinned:
+                continue
+            self.bytes -= surface_bytes(self._entries.pop(key))
+            self.evictions += 1
+
+    def directional(self, path: str, size: Optional[tuple[int, int]] = None, tint: Optional[tuple] = None) -> dict:
+        """Get the variants of an image facing right, up, left and down, keyed by angle in degrees."""
+        return {angle: self.get(path, size, angle, tint) for angle in (0, 90, 180, 270)}
+
+    def preload(self, manifest=statics.ASSET_MANIFEST):
+        """Load and pin every variant listed in manifest. Entries are (path, size, angle, tint) with optional tails."""
+        for entry in manifest:
+            key = self.normalize(AssetKey(*entry))
+            self.get_variant(key)
+            self._pinned.add(key)
+
+    @staticmethod
+    def normalize(key: AssetKey) -> AssetKey:
+        """Make equal variants hash equal: sizes and tints as tuples, angles in [0, 360)."""
+        return AssetKey(key.path, None if key.size is None else tuple(key.size), key.angle % 360,
+                        None if key.tint is None else tuple(key.tint))
+
+    def stats(self) -> dict:
+        """Get cache hits, misses, evictions and memory use."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "pinned": len(self._pinned),
+            "bytes": self.bytes,
+            "budget_bytes": self.budget_bytes,
+        }
+
+    def clear(self):
+        """Drop every cached image, pinned ones included, and reset the statistics."""
+        self._entries.clear()
+        self._pinned.clear()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+
+# Shared by everything that draws images, like ImageCache
+ASSETS = AssetManager()
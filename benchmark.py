@@ -0,0 +1,261 @@
+"""Reproducible benchmarks for the engine hot paths.
+
+Runs under the SDL dummy video driver with fixed seeds and writes the
+results as JSON. A previous results file can be given as a baseline, in
+which case any benchmark slower than the baseline by more than the
+threshold is reported and the process exits with status 1.
+
+    python benchmark.py --output results.json
+    python benchmark.py --quick --baseline results.json --threshold 0.2
+"""
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pygame
+import statics
+from game_engine import GameEngine
+from interfaces import AttackDirection, EntityType, WeaponType
+from define_additional_content import main as define_additional_content_main
+from replay import build_replay_engine, read_recording, replay
+
+DEFAULT_ENTITY_COUNTS = (1_000, 10_000, 100_000)
+DEFAULT_MAP_SIZES = (250, 500, 1000)
+QUICK_ENTITY_COUNTS = (1_000, 10_000)
+QUICK_MAP_SIZES = (250, 500)
+WINDOW_SIZE = (1920, 1080)
+# Entities only spawn on free tiles, so keep populations well below the tile count
+MAX_ENTITY_DENSITY = 0.5
+
+
+def time_call(function, repeat: int, setup=None, warmup: bool = True) -> dict:
+    """Time function repeat times, running setup untimed before each call.
+
+    One untimed warm-up call comes first, so lazily built caches are not charged to the first sample.
+    Pass warmup=False for functions that must only run the timed number of times.
+    """
+    if warmup:
+        if setup is not None:
+            setup()
+        function()
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "median_ms": statistics.median(samples),
+        "min_ms": min(samples),
+        "max_ms": max(samples),
+        "runs": repeat,
+    }
+
+
+def build_engine(map_size: int, seed: int, use_enemy_swarm: bool) -> GameEngine:
+    game_engine = GameEngine(use_enemy_swarm=use_enemy_swarm)
+    define_additional_content_main(game_engine)
+    game_engine.player.add_weapon(game_engine.weapons_list[WeaponType.HAMMER])
+    game_engine.map_engine.initialize(windows_size=WINDOW_SIZE)
+    game_engine.map_engine.generate_seeded_map(seed=seed, width=map_size, height=map_size)
+    return game_engine
+
+
+def populate(game_engine: GameEngine, num_entities: int, seed: int):
+    """Spawn the same population main.py uses, scaled to num_entities."""
+    random.seed(seed)
+    per_type = num_entities // 3
+    game_logic = game_engine.game_logic
+    game_logic.populate_entities(num_entities=per_type, entity_type=EntityType.ITEM, size=statics.COIN_SIZE, health=0)
+    game_logic.populate_entities(num_entities=per_type, entity_type=EntityType.ENEMY, size=statics.ENEMY_SIZE, health=100)
+    game_logic.populate_entities(num_entities=num_entities - 2 * per_type, entity_type=EntityType.HEALTH, size=statics.ENEMY_SIZE, health=0)
+
+
+def start_attack(game_engine: GameEngine):
+    map_engine = game_engine.map_engine
+    weapon = game_engine.player.weapon
+    weapon.attack_timer = weapon.attack_duration
+    weapon.cooldown_timer = 0
+    map_engine.current_attack_direction = AttackDirection.DOWN
+    map_engine.damaged_entities_this_attack.clear()
+    if game_engine.game_logic.enemy_swarm is not None:
+        game_engine.game_logic.enemy_swarm.clear_hits()
+
+
+def bench_entities(results: dict, num_entities: int, map_size: int, seed: int, repeat: int, use_enemy_swarm: bool):
+    tag = f"[entities={num_entities},map={map_size}]"
+    game_engine = build_engine(map_size, seed, use_enemy_swarm)
+    map_engine = game_engine.map_engine
+    game_logic = game_engine.game_logic
+
+    results[f"populate_entities{tag}"] = time_call(lambda: populate(game_engine, num_entities, seed), 1,
+                                                   warmup=False)
+
+    # Park the player in the middle of the map, surrounded by the population
+    game_engine.player.x = game_engine.player.y = (map_size // 2) * statics.TILE_SIZE + statics.TILE_SIZE // 2
+    game_logic.spatial_index.update(game_engine.player)
+    game_engine.player.invincibility_timer = 10 ** 9
+    map_engine.simulate()
+
+    results[f"draw_map{tag}"] = time_call(map_engine.draw_map, repeat)
+    results[f"draw_entities{tag}"] = time_call(map_engine.draw_entities, repeat)
+    results[f"update_enemies{tag}"] = time_call(map_engine.update_enemies, repeat)
+    results[f"pickup_coin{tag}"] = time_call(lambda: game_logic.pickup_coin(game_engine.player), repeat)
+    results[f"deal_damage{tag}"] = time_call(
+        lambda: game_logic.deal_damage(game_engine.player, map_engine.current_attack_direction,
+                                       game_engine.player.weapon.attack_timer, map_engine.damaged_entities_this_attack),
+        repeat, setup=lambda: start_attack(game_engine))
+    results[f"MapEngine.update{tag}"] = time_call(map_engine.update, repeat)
+    game_engine.reset()
+
+
+def bench_memory(memory: dict, num_entities: int, map_size: int, seed: int, use_enemy_swarm: bool):
+    """Record the bytes each entity keeps allocated, including its spatial index and registry entries."""
+    game_engine = build_engine(map_size, seed, use_enemy_swarm)
+    # Allocate the per-map structures up front so only per-entity memory is traced
+    game_engine.game_logic.spatial_index.attach_occupancy(map_size, map_size)
+    game_engine.map_engine.get_tile_array()
+    tracemalloc.start()
+    populate(game_engine, num_entities, seed)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    memory[f"bytes_per_entity[entities={num_entities},map={map_size}]"] = round(allocated / num_entities, 1)
+    game_engine.reset()
+
+
+def bench_maps(results: dict, map_size: int, seed: int, repeat: int, maps_root: str):
+    tag = f"[map={map_size}]"
+    game_engine = GameEngine()
+    map_engine = game_engine.map_engine
+    map_engine.initialize(windows_size=WINDOW_SIZE)
+
+    results[f"generate_seeded_map{tag}"] = time_call(
+        lambda: map_engine.generate_seeded_map(seed=seed, width=map_size, height=map_size), repeat)
+
+    previous_root = statics.MAPS_ROOT
+    statics.MAPS_ROOT = maps_root
+    try:
+        for extension in (".txt", statics.BINARY_MAP_EXTENSION):
+            name = f"bench_{map_size}{extension}"
+            map_engine.generate_seeded_map(seed=seed, width=map_size, height=map_size)
+            results[f"save_map[{extension}]{tag}"] = time_call(lambda: map_engine.save_map(name), repeat)
+            results[f"load_map[{extension}]{tag}"] = time_call(lambda: map_engine.load_map(name), repeat)
+    finally:
+        statics.MAPS_ROOT = previous_root
+    game_engine.reset()
+
+
+def bench_replays(results: dict, paths: list[str], repeat: int):
+    """Time headless replays of recorded sessions, as workloads made of real play."""
+    game_engine = build_replay_engine()
+    for path in paths:
+        recording = read_recording(path)
+        name = os.path.splitext(os.path.basename(path))[0]
+        results[f"replay[{name},frames={recording.frames}]"] = time_call(
+            lambda: replay(game_engine, recording, verify=False), repeat)
+    game_engine.reset()
+
+
+def compare(results: dict, baseline: dict, threshold: float, noise_floor_ms: float = 0.05) -> list[str]:
+    """Print a comparison table and return the names of regressed benchmarks.
+
+    Slowdowns smaller than noise_floor_ms are ignored, so sub-microsecond jitter never fails a run.
+    """
+    regressions = []
+    print(f"\n{'benchmark':60} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        ratio = current["median_ms"] / previous["median_ms"] if previous["median_ms"] > 0 else 1.0
+        flag = ""
+        if ratio > 1 + threshold and current["median_ms"] - previous["median_ms"] > noise_floor_ms:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:60} {previous['median_ms']:>9.3f}ms {current['median_ms']:>9.3f}ms {ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the engine hot paths.")
+    parser.add_argument("--entities", type=int, nargs="+", help="entity counts to benchmark")
+    parser.add_argument("--map-sizes", type=int, nargs="+", help="square map sizes in tiles")
+    parser.add_argument("--quick", action="store_true", help="use a smaller set of entity counts and map sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark (default: 5)")
+    parser.add_argument("--seed", type=int, default=1234, help="seed for map generation and spawning")
+    parser.add_argument("--swarm", action="store_true", help="store enemies in the NumPy enemy swarm")
+    parser.add_argument("--replay", nargs="+", default=[], help="recorded sessions (.lrec) to time headless replays of")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file to write results to")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed slowdown against the baseline before failing (default: 0.2 = 20%%)")
+    parser.add_argument("--noise-floor-ms", type=float, default=0.05,
+                        help="ignore slowdowns smaller than this many milliseconds (default: 0.05)")
+    args = parser.parse_args(argv)
+
+    entity_counts = args.entities or (QUICK_ENTITY_COUNTS if args.quick else DEFAULT_ENTITY_COUNTS)
+    map_sizes = args.map_sizes or (QUICK_MAP_SIZES if args.quick else DEFAULT_MAP_SIZES)
+
+    results = {}
+    memory = {}
+    maps_root = tempfile.mkdtemp(prefix="llpc_bench_")
+    try:
+        for map_size in map_sizes:
+            print(f"maps {map_size}x{map_size}...")
+            bench_maps(results, map_size, args.seed, args.repeat, maps_root)
+            for num_entities in entity_counts:
+                if num_entities > map_size * map_size * MAX_ENTITY_DENSITY:
+                    continue
+                print(f"entities {num_entities} on {map_size}x{map_size}...")
+                bench_entities(results, num_entities, map_size, args.seed, args.repeat, args.swarm)
+                bench_memory(memory, num_entities, map_size, args.seed, args.swarm)
+        if args.replay:
+            print(f"replays of {len(args.replay)} recording(s)...")
+            bench_replays(results, args.replay, args.repeat)
+    finally:
+        shutil.rmtree(maps_root, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "swarm": args.swarm,
+        },
+        "results": results,
+        "memory": memory,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Wrote {len(results)} results to {args.output}")
+    for name, value in sorted(memory.items()):
+        print(f"{name:60} {value:>9.1f} B")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold, args.noise_floor_ms)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
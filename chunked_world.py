@@ -0,0 +1,156 @@
+from collections import OrderedDict
+
+import statics
+import map_io
+
+
+class _WorldRow:
+    """One row of a ChunkedWorld, so world[y][x] works like on a list of lists."""
+    __slots__ = ("world", "y")
+
+    def __init__(self, world, y):
+        self.world = world
+        self.y = y
+
+    def __len__(self):
+        return self.world.width
+
+    def __getitem__(self, x):
+        return self.world.get_tile(x, self.y)
+
+    def __setitem__(self, x, value):
+        self.world.set_tile(x, self.y, value)
+
+    def __iter__(self):
+        for x in range(self.world.width):
+            yield self.world.get_tile(x, self.y)
+
+
+class ChunkedWorld:
+    """Tile map streamed from a binary map file one square chunk at a time.
+
+    Only chunks near the focus points (camera and player) stay resident.
+    Edited chunks are written back to the file when they are evicted or on
+    flush(), so memory is bounded by the view radius instead of the map size.
+    """
+
+    def __init__(self, path: str, chunk_tiles: int = statics.WORLD_CHUNK_TILES,
+                 view_radius_chunks: int = statics.WORLD_VIEW_RADIUS_CHUNKS, max_focus_points: int = 2):
+        self.path = path
+        self._file = open(path, "r+b")
+        header = self._file.read(map_io.BINARY_MAP_HEADER.size)
+        magic, version, typecode, width, height = map_io.BINARY_MAP_HEADER.unpack(header)
+        if magic != map_io.BINARY_MAP_MAGIC or version != map_io.BINARY_MAP_VERSION:
+            self._file.close()
+            raise ValueError(f"'{path}' is not a version {map_io.BINARY_MAP_VERSION} binary map.")
+
+        self.width = width
+        self.height = height
+        self.typecode = typecode.decode("ascii")
+        self._itemsize = map_io.TILE_TYPECODES[self.typecode]
+        self.chunk_tiles = chunk_tiles
+        self.view_radius_chunks = view_radius_chunks
+        side = view_radius_chunks * 2 + 1
+        self.max_chunks = side * side * max_focus_points
+        self._focus_chunks: list[tuple[int, int]] = []
+        self._chunks: OrderedDict[tuple[int, int], memoryview] = OrderedDict()
+        self._dirty: set[tuple[int, int]] = set()
+
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, y):
+        if y < 0 or y >= self.height:
+            raise IndexError("World row out of range.")
+        return _WorldRow(self, y)
+
+    def __iter__(self):
+        for y in range(self.height):
+            yield _WorldRow(self, y)
+
+    @property
+    def resident_chunks(self) -> int:
+        return len(self._chunks)
+
+    def _chunk_bounds(self, chunk_x, chunk_y):
+        start_x = chunk_x * self.chunk_tiles
+        start_y = chunk_y * self.chunk_tiles
+        return start_x, start_y, min(start_x + self.chunk_tiles, self.width), min(start_y + self.chunk_tiles, self.height)
+
+    def _load_chunk(self, key) -> memoryview:
+        start_x, start_y, end_x, end_y = self._chunk_bounds(*key)
+        size = self.chunk_tiles
+        itemsize = self._itemsize
+        data = bytearray(size * size * itemsize)
+        row_bytes = (end_x - start_x) * itemsize
+        for y in range(start_y, end_y):
+            self._file.seek(map_io.BINARY_MAP_HEADER.size + (y * self.width + start_x) * itemsize)
+            offset = (y - start_y) * size * itemsize
+            data[offset:offset + row_bytes] = self._file.read(row_bytes)
+        chunk = memoryview(data).cast(self.typecode)
+
+        self._chunks[key] = chunk
+        while len(self._chunks) > self.max_chunks:
+            self._evict(next(iter(self._chunks)))
+        return chunk
+
+    def _write_chunk(self, key):
+        start_x, start_y, end_x, end_y = self._chunk_bounds(*key)
+        data = self._chunks[key].cast("B")
+        itemsize = self._itemsize
+        row_bytes = (end_x - start_x) * itemsize
+        for y in range(start_y, end_y):
+            self._file.seek(map_io.BINARY_MAP_HEADER.size + (y * self.width + start_x) * itemsize)
+            offset = (y - start_y) * self.chunk_tiles * itemsize
+            self._file.write(data[offset:offset + row_bytes])
+
+    def _evict(self, key):
+        if key in self._dirty:
+            self._write_chunk(key)
+            self._dirty.discard(key)
+        del self._chunks[key]
+
+    def _get_chunk(self, x, y):
+        if x < 0 or x >= self.width or y < 0 or y >= self.height:
+            raise IndexError("Tile coordinates out of bounds.")
+        key = (x // self.chunk_tiles, y // self.chunk_tiles)
+        chunk = self._chunks.get(key)
+        if chunk is None:
+            chunk = self._load_chunk(key)
+        else:
+            self._chunks.move_to_end(key)
+        return key, chunk
+
+    def get_tile(self, x: int, y: int) -> int:
+        _, chunk = self._get_chunk(x, y)
+        size = self.chunk_tiles
+        return chunk[(y % size) * size + x % size]
+
+    def set_tile(self, x: int, y: int, value: int):
+        key, chunk = self._get_chunk(x, y)
+        size = self.chunk_tiles
+        chunk[(y % size) * size + x % size] = value
+        self._dirty.add(key)
+
+    def set_focus(self, points):
+        """Keep chunks within the view radius of the given tile positions and evict the rest."""
+        size = self.chunk_tiles
+        self._focus_chunks = [(int(x) // size, int(y) // size) for x, y in points]
+        radius = self.view_radius_chunks
+        for key in list(self._chunks):
+            if not any(abs(key[0] - fx) <= radius and abs(key[1] - fy) <= radius for fx, fy in self._focus_chunks):
+                self._evict(key)
+
+    def flush(self):
+        """Write every edited chunk back to the map file."""
+        for key in list(self._dirty):
+            self._write_chunk(key)
+        self._dirty.clear()
+        self._file.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        self._chunks.clear()
+        self._file.close()
@@ -0,0 +1,327 @@
+import statics
+from interfaces import Entity, EntityType
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, only the swarm backend needs it
+    np = None
+
+
+def _field_distances(flow_field, tile_x, tile_y):
+    """Look up flow field distances for arrays of tiles, -1 outside the field."""
+    distances = flow_field.distance_array()
+    local_x = tile_x - flow_field.left
+    local_y = tile_y - flow_field.top
+    inside = (local_x >= 0) & (local_x < flow_field.width) & (local_y >= 0) & (local_y < flow_field.height)
+    result = np.full(len(tile_x), -1, dtype=np.int32)
+    result[inside] = distances[local_y[inside], local_x[inside]]
+    return result
+
+
+def _count_tiles(occupancy, tile_x, tile_y, delta: int):
+    """Add delta to the OccupancyGrid count of each tile in the arrays, saturating at 0 and 255 like its add and remove."""
+    inside = (tile_x >= 0) & (tile_x < occupancy.width) & (tile_y >= 0) & (tile_y < occupancy.height)
+    offsets, repeats = np.unique(tile_y[inside] * occupancy.width + tile_x[inside], return_counts=True)
+    counts = np.frombuffer(occupancy.counts, dtype=np.uint8)
+    counts[offsets] = np.clip(counts[offsets].astype(np.int64) + delta * repeats, 0, 255)
+
+
+class EnemySwarm:
+    """Struct-of-arrays store that updates every enemy in one batched NumPy step.
+
+    Each enemy is a row index into parallel arrays instead of an Enemy object.
+    step() reproduces Enemy.update for all of them at once: cooldowns, chasing
+    the player, water blocking and contact damage, in spawn order. Live
+    enemies are counted in the spatial index's OccupancyGrid like entities
+    are, so spawning treats their tiles as taken.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        if np is None:
+            raise RuntimeError("EnemySwarm requires NumPy. Install it with 'pip install numpy'.")
+        self.count = 0
+        self._allocate(capacity)
+        # Reused for drawing so swarm enemies look exactly like Enemy objects
+        self._proxy = Entity(name="Enemy", entity_type=EntityType.ENEMY, size=statics.ENEMY_SIZE)
+
+    def _allocate(self, capacity):
+        self.x = np.zeros(capacity, dtype=np.float64)
+        self.y = np.zeros(capacity, dtype=np.float64)
+        self.health = np.zeros(capacity, dtype=np.int64)
+        self.level = np.ones(capacity, dtype=np.int64)
+        self.damage_cooldown = np.zeros(capacity, dtype=np.int64)
+        self.speed = np.zeros(capacity, dtype=np.float64)
+        self.size = np.zeros(capacity, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.hit_this_attack = np.zeros(capacity, dtype=bool)
+        self.chasing = np.zeros(capacity, dtype=bool)
+
+    def _arrays(self):
+        return ("x", "y", "health", "level", "damage_cooldown", "speed", "size", "alive", "hit_this_attack", "chasing")
+
+    def _grow(self, needed):
+        capacity = len(self.x)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        for name in self._arrays():
+            old = getattr(self, name)
+            new = np.zeros(new_capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def reserve(self, capacity: int):
+        """Make room for at least capacity rows, so spawning that many does not reallocate the arrays."""
+        self._grow(capacity)
+
+    def __len__(self):
+        return int(np.count_nonzero(self.alive[:self.count]))
+
+    def spawn(self, starting_pos, level: int = 1, health: int = 100, size: int = statics.ENEMY_SIZE, speed: float = statics.ENEMY_SPEED) -> int:
+        """Add one enemy and return its row index."""
+        self._grow(self.count + 1)
+        index = self.count
+        self.x[index], self.y[index] = starting_pos
+        self.health[index] = health
+        self.level[index] = level
+        self.damage_cooldown[index] = 0
+        self.speed[index] = speed
+        self.size[index] = size
+        self.alive[index] = True
+        self.hit_this_attack[index] = False
+        self.chasing[index] = False
+        self.count += 1
+        return index
+
+    def _tiles(self, rows):
+        tile_size = statics.TILE_SIZE
+        return (np.floor_divide(self.x[rows], tile_size).astype(np.int64),
+                np.floor_divide(self.y[rows], tile_size).astype(np.int64))
+
+    def add_to_occupancy(self, occupancy):
+        """Count the tile of every live enemy in an OccupancyGrid, like after it was rebuilt from the entities."""
+        _count_tiles(occupancy, *self._tiles(np.flatnonzero(self.alive[:self.count])), 1)
+
+    def clear(self):
+        self.count = 0
+        self.alive[:] = False
+
+    def clear_hits(self):
+        """Forget which enemies were hit by the current attack."""
+        self.hit_this_attack[:self.count] = False
+
+    def compact(self):
+        """Drop dead rows so arrays only hold live enemies. Row indices change."""
+        live = np.flatnonzero(self.alive[:self.count])
+        if len(live) == self.count:
+            return
+        for name in self._arrays():
+            array = getattr(self, name)
+            array[:len(live)] = array[live]
+        self.count = len(live)
+        self.alive[self.count:] = False
+
+    def step(self, game_engine):
+        """Run Enemy.update for every live enemy in one batched step."""
+        map_engine = game_engine.map_engine
+        if not game_engine.game_logic or not map_engine or not map_engine.map_data or self.count == 0:
+            return
+
+        live = np.flatnonzero(self.alive[:self.count])
+        if len(live) == 0:
+            return
+
+        cooldown = self.damage_cooldown
+        cooling = live[cooldown[live] > 0]
+        cooldown[cooling] -= 1
+
+        player = game_engine.player
+        if player.is_disposed():
+            self.chasing[live] = False
+            return
+
+        x = self.x[live]
+        y = self.y[live]
+        size = self.size[live]
+        dx = player.x - x
+        dy = player.y - y
+        distance = np.sqrt(dx ** 2 + dy ** 2)
+
+        # Same rule as Enemy.update: chases start inside the aggro radius and go on while the way stays short
+        chasing = distance < statics.ENEMY_AGGRO_RADIUS
+        following = np.flatnonzero(~chasing & self.chasing[live])
+        if len(following):
+            tile_size = statics.TILE_SIZE
+            steps = _field_distances(map_engine.flow_field,
+                                     np.floor_divide(x[following], tile_size).astype(np.int64),
+                                     np.floor_divide(y[following], tile_size).astype(np.int64))
+            chasing[following] = (steps > 0) & (steps <= statics.ENEMY_CHASE_STEPS)
+        self.chasing[live] = chasing
+        chasing &= distance > 0
+        if not chasing.any():
+            return
+        live = live[chasing]
+        x, y, size = x[chasing], y[chasing], size[chasing]
+        dx, dy, distance = dx[chasing], dy[chasing], distance[chasing]
+
+        speed = self.speed[live]
+        new_x = x + dx / distance * speed
+        new_y = y + dy / distance * speed
+        self._follow_flow_field(map_engine.flow_field, x, y, speed, new_x, new_y)
+
+        map_height = len(map_engine.map_data)
+        map_width = len(map_engine.map_data[0])
+        tile_size = statics.TILE_SIZE
+        half_size = size // 2
+        in_bounds = ((new_x - half_size >= 0) &
+                     (new_x + half_size < map_width * tile_size) &
+                     (new_y - half_size >= 0) &
+                     (new_y + half_size < map_height * tile_size))
+
+        tile_x = np.floor_divide(new_x, tile_size).astype(np.int64)
+        tile_y = np.floor_divide(new_y, tile_size).astype(np.int64)
+        in_bounds &= (tile_x >= 0) & (tile_x < map_width) & (tile_y >= 0) & (tile_y < map_height)
+        can_move = in_bounds.copy()
+        can_move[in_bounds] = map_engine.lookup_tiles(tile_x[in_bounds], tile_y[in_bounds]) != 1
+
+        # Contact damage is applied in spawn order. Once the player dies every
+        # later enemy stops acting, exactly as the per-object loop does.
+        attacking = (distance < size) & (cooldown[live] <= 0)
+        acted = len(live)
+        player_damaged = False
+        if player.invincibility_timer <= 0 and attacking.any():
+            attackers = np.flatnonzero(attacking)
+            damage = statics.ENEMY_DAMAGE * self.level[live[attackers]]
+            health_after = player.health - np.cumsum(damage)
+            killing = np.flatnonzero(health_after <= 0)
+            if len(killing):
+                last = killing[0]
+                attackers = attackers[:last + 1]
+                acted = attackers[-1] + 1
+                player.health = int(health_after[last])
+            else:
+                player.health = int(health_after[-1])
+            cooldown[live[attackers]] = statics.ATTACK_DURATION_FRAMES
+            player_damaged = True
+
+        moving = np.flatnonzero(can_move[:acted])
+        moved = live[moving]
+        occupancy = game_engine.game_logic.spatial_index.occupancy
+        if occupancy is not None:
+            old_tile_x, old_tile_y = self._tiles(moved)
+        self.x[moved] = new_x[moving]
+        self.y[moved] = new_y[moving]
+        if occupancy is not None:
+            new_tile_x, new_tile_y = self._tiles(moved)
+            changed = (new_tile_x != old_tile_x) | (new_tile_y != old_tile_y)
+            if changed.any():
+                _count_tiles(occupancy, old_tile_x[changed], old_tile_y[changed], -1)
+                _count_tiles(occupancy, new_tile_x[changed], new_tile_y[changed], 1)
+
+        if player_damaged and player.health <= 0:
+            game_engine.game_logic.dispose_entity(player)
+
+    @staticmethod
+    def _follow_flow_field(flow_field, x, y, speed, new_x, new_y):
+        """Redirect the straight steps FlowField.allows_step rejects to the field's next tile, in place."""
+        if not flow_field.width:
+            return
+        tile_size = statics.TILE_SIZE
+        tile_x = np.floor_divide(x, tile_size).astype(np.int64)
+        tile_y = np.floor_divide(y, tile_size).astype(np.int64)
+        new_tile_x = np.floor_divide(new_x, tile_size).astype(np.int64)
+        new_tile_y = np.floor_divide(new_y, tile_size).astype(np.int64)
+        current = _field_distances(flow_field, tile_x, tile_y)
+        target = _field_distances(flow_field, new_tile_x, new_tile_y)
+        # Same rule as FlowField.allows_step
+        center_x, center_y = flow_field.center
+        unobstructed = current == np.maximum(np.abs(tile_x - center_x), np.abs(tile_y - center_y))
+        same_tile = (new_tile_x == tile_x) & (new_tile_y == tile_y)
+        detour = (current > 0) & ~(unobstructed & (same_tile | ((target >= 0) & (target <= current))))
+        # Only blocked enemies get here, so a plain loop is fine
+        for index in np.flatnonzero(detour).tolist():
+            next_tile = flow_field.next_tile(int(tile_x[index]), int(tile_y[index]))
+            if next_tile is None:
+                continue
+            enemy_x = float(x[index])
+            enemy_y = float(y[index])
+            target_dx = next_tile[0] * tile_size + tile_size // 2 - enemy_x
+            target_dy = next_tile[1] * tile_size + tile_size // 2 - enemy_y
+            target_distance = (target_dx**2 + target_dy**2)**0.5
+            new_x[index] = enemy_x + target_dx / target_distance * float(speed[index])
+            new_y[index] = enemy_y + target_dy / target_distance * float(speed[index])
+
+    def damage_tile(self, tile_x: int, tile_y: int, damage: int, occupancy=None) -> list[int]:
+        """Damage live enemies centered on a tile that this attack has not hit yet.
+
+        Returns the experience reward of every enemy killed, in spawn order.
+        """
+        return self.damage_tiles([(tile_x, tile_y)], damage, occupancy)[0]
+
+    def damage_tiles(self, tiles, damage: int, occupancy=None) -> list[list[int]]:
+        """Damage live enemies that this attack has not hit yet on each tile in turn.
+
+        Enemy tiles are computed once for the enemies inside the tiles' bounding box, so a large pattern costs
+        about as much as a single tile. Killed enemies are uncounted from occupancy, if given. Returns the
+        experience rewards of the enemies killed on each tile, in spawn order.
+        """
+        rewards = [[] for _ in tiles]
+        if self.count == 0 or not tiles:
+            return rewards
+        tile_size = statics.TILE_SIZE
+        count = self.count
+        tile_x = np.floor_divide(self.x[:count], tile_size)
+        tile_y = np.floor_divide(self.y[:count], tile_size)
+        xs = [x for x, _ in tiles]
+        ys = [y for _, y in tiles]
+        candidates = np.flatnonzero(self.alive[:count] & ~self.hit_this_attack[:count] &
+                                    (tile_x >= min(xs)) & (tile_x <= max(xs)) &
+                                    (tile_y >= min(ys)) & (tile_y <= max(ys)))
+        if len(candidates) == 0:
+            return rewards
+        tile_x = tile_x[candidates]
+        tile_y = tile_y[candidates]
+        for i, (x, y) in enumerate(tiles):
+            # Patterns may list a tile twice, so enemies hit earlier in this call are skipped again
+            hit = candidates[(tile_x == x) & (tile_y == y) & ~self.hit_this_attack[candidates]]
+            if len(hit) == 0:
+                continue
+            self.hit_this_attack[hit] = True
+            self.health[hit] -= damage
+            killed = hit[self.health[hit] <= 0]
+            self.alive[killed] = False
+            rewards[i] = (self.level[killed] * 10).tolist()
+            if occupancy is not None:
+                for _ in range(len(killed)):
+                    occupancy.remove(x, y)
+        return rewards
+
+    def visible_indices(self, screen, camera):
+        """Get the row indices of live enemies inside the camera view."""
+        count = self.count
+        screen_width, screen_height = screen.get_size()
+        tile_size = statics.TILE_SIZE
+        half_size = self.size[:count] // 2
+        screen_x = np.floor_divide(self.x[:count], tile_size) * tile_size + tile_size // 2 - camera.x
+        screen_y = np.floor_divide(self.y[:count], tile_size) * tile_size + tile_size // 2 - camera.y
+        visible = (self.alive[:count] &
+                   (screen_x + half_size >= 0) & (screen_x - half_size <= screen_width) &
+                   (screen_y + half_size >= 0) & (screen_y - half_size <= screen_height))
+        return np.flatnonzero(visible)
+
+    def _load_proxy(self, index):
+        proxy = self._proxy
+        proxy.x = float(self.x[index])
+        proxy.y = float(self.y[index])
+        proxy.size = int(self.size[index])
+        proxy.level = int(self.level[index])
+        proxy.health = int(self.health[index])
+        return proxy
+
+    def draw(self, screen, camera) -> list:
+        """Draw the visible enemies and return the screen rects they touched."""
+        return [self._load_proxy(index).draw(screen, camera) for index in self.visible_indices(screen, camera)]
+
+    def draw_health_bars(self, screen, camera) -> list:
+        """Draw health bars for the visible enemies and return the screen rects they touched."""
+        return [self._load_proxy(index).draw_health_bar(screen, camera) for index in self.visible_indices(screen, camera)]
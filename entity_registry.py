@@ -0,0 +1,190 @@
+from typing import NamedTuple, Optional
+
+
+class EntityHandle(NamedTuple):
+    """Stable reference to a registered entity. It goes stale once the entity is removed."""
+    slot: int
+    generation: int
+
+
+class EntityRegistry:
+    """Slot map holding the entities of a game, with stable handles and per-type views.
+
+    Entities are kept in a dense list in insertion order. Removing one only
+    leaves a hole, so add and remove are O(1), and the holes are squeezed out
+    once they make up more than half of the list. Handles index a separate
+    slot table, so they survive compaction. Each EntityType also has a view
+    that only holds the entities registered under that type.
+
+    Disposed entities are normally not removed right away: schedule_removal()
+    queues them and flush_removals() drops them once per frame, so views can
+    be iterated while entities are being disposed.
+    """
+
+    def __init__(self):
+        self._dense: list = []  # Entities in insertion order, None where one was removed
+        self._dense_slots: list[int] = []  # Slot of each dense entry
+        self._slot_dense: list[int] = []  # Dense index of each slot, -1 while the slot is free
+        self._slot_generations: list[int] = []
+        self._slot_types: list = []  # Type each slot's entity was registered under
+        self._free_slots: list[int] = []
+        self._slots: dict = {}  # entity -> slot
+        self._views: dict = {}  # EntityType -> insertion-ordered dict of entities
+        self._holes = 0
+        self._pending_removals: list = []
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, entity):
+        return entity in self._slots
+
+    def __iter__(self):
+        for entity in self._dense:
+            if entity is not None:
+                yield entity
+
+    def to_list(self) -> list:
+        """Get the registered entities in insertion order as a new list, faster than list(registry)."""
+        return [entity for entity in self._dense if entity is not None]
+
+    def add(self, entity) -> EntityHandle:
+        """Register an entity. Adding a registered entity just returns its handle."""
+        slot = self._slots.get(entity)
+        if slot is not None:
+            return EntityHandle(slot, self._slot_generations[slot])
+
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            slot = len(self._slot_dense)
+            self._slot_dense.append(-1)
+            self._slot_generations.append(0)
+            self._slot_types.append(None)
+        self._slot_dense[slot] = len(self._dense)
+        self._dense.append(entity)
+        self._dense_slots.append(slot)
+        self._slots[entity] = slot
+        self._slot_types[slot] = entity.entity_type
+        self._views.setdefault(entity.entity_type, {})[entity] = None
+        return EntityHandle(slot, self._slot_generations[slot])
+
+    def extend(self, entities):
+        """Register many entities in order, like calling add() on each but with less overhead per entity."""
+        entities = list(dict.fromkeys(entities))
+        if self._slots:
+            entities = [entity for entity in entities if entity not in self._slots]
+        if not entities:
+            return
+
+        # Free slots are taken in the same order add() would pop them, then new slots are appended
+        reused = min(len(self._free_slots), len(entities))
+        slots = self._free_slots[len(self._free_slots) - reused:][::-1]
+        del self._free_slots[len(self._free_slots) - reused:]
+        first_slot = len(self._slot_dense)
+        added = len(entities) - reused
+        slots.extend(range(first_slot, first_slot + added))
+        self._slot_dense.extend([-1] * added)
+        self._slot_generations.extend([0] * added)
+        self._slot_types.extend([None] * added)
+
+        slot_dense = self._slot_dense
+        slot_types = self._slot_types
+        types = [entity.entity_type for entity in entities]
+        for dense_index, slot, entity_type in zip(range(len(self._dense), len(self._dense) + len(entities)), slots, types):
+            slot_dense[slot] = dense_index
+            slot_types[slot] = entity_type
+        self._dense.extend(entities)
+        self._dense_slots.extend(slots)
+        self._slots.update(zip(entities, slots))
+        views = {entity_type: self._views.setdefault(entity_type, {}) for entity_type in dict.fromkeys(types)}
+        for entity, entity_type in zip(entities, types):
+            views[entity_type][entity] = None
+
+    def remove(self, entity):
+        """Unregister an entity right away. Unknown entities are ignored."""
+        slot = self._slots.pop(entity, None)
+        if slot is None:
+            return
+        dense_index = self._slot_dense[slot]
+        self._dense[dense_index] = None
+        self._holes += 1
+        self._slot_dense[slot] = -1
+        self._slot_generations[slot] += 1
+        self._free_slots.append(slot)
+        del self._views[self._slot_types[slot]][entity]
+        self._slot_types[slot] = None
+
+    def get(self, handle: EntityHandle):
+        """Get the entity a handle refers to, or None if it has been removed."""
+        if handle.slot >= len(self._slot_dense) or self._slot_generations[handle.slot] != handle.generation:
+            return None
+        dense_index = self._slot_dense[handle.slot]
+        return None if dense_index < 0 else self._dense[dense_index]
+
+    def handle_of(self, entity) -> Optional[EntityHandle]:
+        slot = self._slots.get(entity)
+        return None if slot is None else EntityHandle(slot, self._slot_generations[slot])
+
+    def of_type(self, entity_type) -> dict:
+        """Get the live view of the entities registered under entity_type, in insertion order.
+
+        Do not add or remove entities of that type while iterating it, dispose them instead.
+        """
+        return self._views.setdefault(entity_type, {})
+
+    def in_order(self, entities) -> list:
+        """Sort registered entities into insertion order."""
+        slots = self._slots
+        slot_dense = self._slot_dense
+        return sorted(entities, key=lambda entity: slot_dense[slots[entity]])
+
+    def schedule_removal(self, entity):
+        """Queue an entity to be removed by the next flush_removals()."""
+        if entity in self._slots:
+            self._pending_removals.append(entity)
+
+    def flush_removals(self, compact: bool = True) -> list:
+        """Remove queued entities that are still disposed and, with compact, compact if needed. Returns the removed entities."""
+        removed = []
+        if self._pending_removals:
+            for entity in self._pending_removals:
+                # An entity revived after being disposed (like a reset player) stays registered
+                if entity in self._slots and entity.is_disposed():
+                    self.remove(entity)
+                    removed.append(entity)
+            self._pending_removals.clear()
+        if compact and self.needs_compaction():
+            self.compact()
+        return removed
+
+    def needs_compaction(self) -> bool:
+        """Whether holes make up more than half of the dense list."""
+        return self._holes > len(self._dense) // 2
+
+    def compact(self):
+        """Squeeze the holes out of the dense list. Handles and order are preserved."""
+        dense = []
+        dense_slots = []
+        for entity, slot in zip(self._dense, self._dense_slots):
+            if entity is not None:
+                self._slot_dense[slot] = len(dense)
+                dense.append(entity)
+                dense_slots.append(slot)
+        self._dense = dense
+        self._dense_slots = dense_slots
+        self._holes = 0
+
+    def clear(self):
+        """Remove every entity. Handles given out so far go stale."""
+        for slot in self._slots.values():
+            self._slot_generations[slot] += 1
+        self._slot_dense = [-1] * len(self._slot_dense)
+        self._free_slots = list(reversed(range(len(self._slot_dense))))
+        self._dense.clear()
+        self._dense_slots.clear()
+        self._slots.clear()
+        self._slot_types = [None] * len(self._slot_dense)
+        self._views.clear()
+        self._holes = 0
+        self._pending_removals.clear()
@@ -0,0 +1,136 @@
+from collections import deque
+from typing import Optional
+
+import statics
+
+try:
+    import numpy as np
+except ImportError:  # Only EnemySwarm needs distance_array()
+    np = None
+
+# Orthogonal steps come first, so ties between equally good steps prefer them
+NEIGHBOURS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+
+
+class FlowField:
+    """Breadth-first distance field over the walkable tiles around the player.
+
+    Distances count steps to the player's tile inside a square window of
+    radius_tiles around it. Diagonal steps are only allowed when both tiles
+    beside them are walkable, so following the field never cuts a corner.
+    Every enemy follows the same field, so pathfinding costs one search per
+    player tile change instead of one search per enemy.
+    """
+
+    def __init__(self, radius_tiles: int = statics.FLOW_FIELD_RADIUS_TILES):
+        self.radius_tiles = radius_tiles
+        self.center: Optional[tuple[int, int]] = None
+        self.left = 0
+        self.top = 0
+        self.width = 0
+        self.height = 0
+        self.distances: list[int] = []  # Row-major over the window, -1 where unreachable
+        self._walkable: list[bool] = []
+        self._source = None
+        self._distance_array = None
+
+    def invalidate(self):
+        """Recompute the field on the next update, for example after a tile changed."""
+        self.center = None
+
+    def update(self, map_data, tile_x: int, tile_y: int) -> bool:
+        """Recompute the field around a tile if the tile or the map changed. Returns whether it was recomputed."""
+        if (tile_x, tile_y) == self.center and map_data is self._source:
+            return False
+        self.center = (tile_x, tile_y)
+        self._source = map_data
+        self._distance_array = None
+
+        map_width = len(map_data[0]) if map_data else 0
+        map_height = len(map_data) if map_data else 0
+        radius = self.radius_tiles
+        self.left = max(tile_x - radius, 0)
+        self.top = max(tile_y - radius, 0)
+        right = min(tile_x + radius + 1, map_width)
+        bottom = min(tile_y + radius + 1, map_height)
+        width = self.width = max(right - self.left, 0)
+        height = self.height = max(bottom - self.top, 0)
+
+        walkable = self._walkable = []
+        for y in range(self.top, bottom):
+            row = map_data[y]
+            walkable.extend(row[x] != 1 for x in range(self.left, right))
+        distances = self.distances = [-1] * (width * height)
+        if not (0 <= tile_x - self.left < width and 0 <= tile_y - self.top < height):
+            return True
+
+        start = (tile_y - self.top) * width + tile_x - self.left
+        distances[start] = 0
+        queue = deque([start])
+        while queue:
+            index = queue.popleft()
+            x, y = index % width, index // width
+            distance = distances[index] + 1
+            for dx, dy in NEIGHBOURS:
+                nx, ny = x + dx, y + dy
+                if not (0 <= nx < width and 0 <= ny < height):
+                    continue
+                neighbour = ny * width + nx
+                if distances[neighbour] >= 0 or not walkable[neighbour]:
+                    continue
+                if dx and dy and not (walkable[y * width + nx] and walkable[ny * width + x]):
+                    continue
+                distances[neighbour] = distance
+                queue.append(neighbour)
+        return True
+
+    def distance(self, tile_x: int, tile_y: int) -> int:
+        """Get the number of steps from a tile to the player's tile, or -1 if unknown."""
+        x = tile_x - self.left
+        y = tile_y - self.top
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.distances[y * self.width + x]
+        return -1
+
+    def allows_step(self, from_x: int, from_y: int, to_x: int, to_y: int) -> bool:
+        """Check whether moving straight at the player from one tile to another is fine.
+
+        It is when nothing lengthens the way from the current tile, that is its distance equals the plain tile
+        distance to the player, and the step lands on a reachable tile that is no further away. Tiles the field
+        does not reach allow every move, so callers fall back to moving straight.
+        """
+        current = self.distance(from_x, from_y)
+        if current <= 0:
+            return True
+        if current != max(abs(from_x - self.center[0]), abs(from_y - self.center[1])):
+            return False
+        if from_x == to_x and from_y == to_y:
+            return True
+        target = self.distance(to_x, to_y)
+        return 0 <= target <= current
+
+    def next_tile(self, tile_x: int, tile_y: int) -> Optional[tuple[int, int]]:
+        """Get the neighbouring tile one step closer to the player, or None if there is none."""
+        current = self.distance(tile_x, tile_y)
+        if current <= 0:
+            return None
+        width = self.width
+        x = tile_x - self.left
+        y = tile_y - self.top
+        walkable = self._walkable
+        for dx, dy in NEIGHBOURS:
+            nx, ny = x + dx, y + dy
+            if not (0 <= nx < width and 0 <= ny < self.height):
+                continue
+            if self.distances[ny * width + nx] != current - 1:
+                continue
+            if dx and dy and not (walkable[y * width + nx] and walkable[ny * width + x]):
+                continue
+            return tile_x + dx, tile_y + dy
+        return None
+
+    def distance_array(self):
+        """Get the distances as a 2D NumPy array over the window (rows are y)."""
+        if self._distance_array is None:
+            self._distance_array = np.asarray(self.distances, dtype=np.int32).reshape(self.height, self.width)
+        return self._distance_array
@@ -0,0 +1,100 @@
+import time
+from typing import Callable, Optional
+
+import statics
+
+
+class FrameScheduler:
+    """Paces the main loop: game logic at a fixed tick rate, drawing once per loop, idle time spent on deferred work.
+
+    Each loop calls begin_frame(), runs the logic ticks it returns, draws and
+    calls end_frame(). Ticks are 1 / tick_rate seconds of game time each, so
+    game speed no longer depends on how fast the machine draws. After a long
+    frame at most max_catch_up_ticks are run and the rest of the backlog is
+    dropped, so a machine that cannot keep up slows the game down instead of
+    falling further behind every frame. end_frame() runs deferred jobs for up
+    to work_budget_ms and then sleeps until the next frame is due, which caps
+    drawing at max_fps (0 draws as fast as possible).
+    """
+
+    def __init__(self, tick_rate: int = statics.FPS, max_fps: int = statics.MAX_FPS,
+                 max_catch_up_ticks: int = statics.MAX_CATCH_UP_TICKS,
+                 work_budget_ms: float = statics.DEFERRED_WORK_BUDGET_MS,
+                 clock: Callable[[], float] = time.perf_counter, sleep: Callable[[float], None] = time.sleep):
+        self.tick_seconds = 1 / tick_rate
+        self.max_fps = max_fps
+        self.max_catch_up_ticks = max_catch_up_ticks
+        self.work_budget_ms = work_budget_ms
+        self._clock = clock
+        self._sleep = sleep
+        self._jobs: dict[str, Callable[[], bool]] = {}  # Insertion ordered, run round-robin
+        self.reset()
+
+    def reset(self):
+        """Forget the timing state and deferred jobs, like after loading a new game."""
+        self._jobs.clear()
+        self._last_time: Optional[float] = None
+        self._frame_start = 0.0
+        self._accumulator = 0.0  # Real time not yet turned into ticks
+        self.ticks = 0
+        self.frames = 0
+        self.dropped_ticks = 0  # Ticks skipped by the catch-up limit
+
+    @property
+    def running(self) -> bool:
+        """Whether a loop is being paced, so deferred jobs will get to run."""
+        return self._last_time is not None
+
+    def begin_frame(self) -> int:
+        """Start a frame and return the number of logic ticks to run in it."""
+        now = self._clock()
+        if self._last_time is None:
+            # The first frame runs one tick
+            self._accumulator = self.tick_seconds
+        else:
+            self._accumulator += now - self._last_time
+        self._last_time = now
+        self._frame_start = now
+
+        # The epsilon keeps float rounding from splitting exact frame lengths into 0 and 2 ticks
+        ticks = int(self._accumulator / self.tick_seconds + 1e-6)
+        self._accumulator -= ticks * self.tick_seconds
+        if ticks > self.max_catch_up_ticks:
+            self.dropped_ticks += ticks - self.max_catch_up_ticks
+            ticks = self.max_catch_up_ticks
+        self.ticks += ticks
+        return ticks
+
+    def end_frame(self):
+        """Run deferred jobs within the work budget, then sleep until the next frame is due."""
+        self.frames += 1
+        if self._jobs:
+            self.run_deferred(self._clock() + self.work_budget_ms / 1000)
+        if self.max_fps:
+            remaining = self._frame_start + 1 / self.max_fps - self._clock()
+            if remaining > 0:
+                self._sleep(remaining)
+
+    def defer(self, name: str, job: Callable[[], bool]):
+        """Queue job to run in idle frame time. It is called again on later frames until it returns a falsy value.
+
+        Jobs should do a small step of work per call. Deferring a name that is already queued replaces its job.
+        """
+        self._jobs[name] = job
+
+    def cancel(self, name: str):
+        self._jobs.pop(name, None)
+
+    @property
+    def pending_jobs(self) -> int:
+        return len(self._jobs)
+
+    def run_deferred(self, deadline: float):
+        """Call queued jobs round-robin until they are done or the clock passes deadline."""
+        jobs = self._jobs
+        while jobs and self._clock() < deadline:
+            name = next(iter(jobs))
+            job = jobs.pop(name)
+            # A job that deferred a new one under its own name is replaced by it
+            if job() and name not in jobs:
+                jobs[name] = job
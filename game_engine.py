@@ -1,10 +1,29 @@
-from dataclasses import dataclass
+from array import array
+from dataclasses import dataclass, field
 import random
 from typing import List, Optional
 import statics
 import pygame
 import pygame, os
-from interfaces import AttackDirection, EntityType,WeaponType, Entity, UI
+import time
+from interfaces import AttackDirection, EntityType,WeaponType, Entity, UI, TextCache, draw_entity_batches, ENTITY_ATLAS
+from spatial_index import SpatialIndex
+from entity_registry import EntityRegistry
+from enemy_swarm import EnemySwarm
+from terrain_cache import TerrainChunkCache
+from asset_manager import ASSETS
+from flow_field import FlowField
+import map_io
+import map_generator
+from chunked_world import ChunkedWorld
+from profiler import FrameProfiler
+from frame_scheduler import FrameScheduler
+import snapshot
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, see EnemySwarm
+    np = None
 
 os.environ['SDL_VIDEO_CENTERED'] = '1'
 
@@ -13,18 +32,26 @@ os.environ['SDL_VIDEO_CENTERED'] = '1'
 
 
 class GameEngine:
-    def __init__(self, is_map_editor:bool = False, display_camera_location:bool = False):
+    def __init__(self, is_map_editor:bool = False, display_camera_location:bool = False, use_enemy_swarm:bool = statics.USE_ENEMY_SWARM, headless:bool = False):
+        # Headless engines simulate without a window or any drawing
+        self.headless = headless
         self.game_logic = GameLogic(self)
+        if use_enemy_swarm:
+            self.game_logic.enable_enemy_swarm()
         self.player = Player(self)
         self.camera = Camera(display_camera_location=display_camera_location)
         self.map_engine = MapEngine(self)
         self.weapons_list: dict[WeaponType, Weapon] = {}
+        self.snapshot_writer = snapshot.SnapshotWriter()
+        # Paces the main loop, see frame_scheduler.py. Headless engines are stepped directly instead
+        self.scheduler = FrameScheduler()
         self.is_map_editor = is_map_editor
         self.initialized = False
 
         
-        pygame.init()
-        pygame.display.set_caption("LLPC Project 1")
+        if not self.headless:
+            pygame.init()
+            pygame.display.set_caption("LLPC Project 1")
         
         self.initialize()
 
@@ -42,6 +69,7 @@ class GameEngine:
         self.map_engine.reset()
         self.player.reset()
         self.camera.reset()
+        self.scheduler.reset()
         self.initialized = False
 
     def reset_player(self):
@@ -51,19 +79,53 @@ class GameEngine:
         
         # Ensure player is in the entities list
         if self.player not in self.game_logic.entities:
-            self.game_logic.entities.append(self.player)
+            self.game_logic.add_entities([self.player])
+        else:
+            self.game_logic.spatial_index.insert(self.player)
         
         # Clear any damage tracking that might affect the player
         self.map_engine.damaged_entities_this_attack.clear()
 
+    def snapshot(self) -> bytes:
+        """Capture the full game state as snapshot bytes (see snapshot.py)."""
+        return snapshot.capture(self)
+
+    def restore(self, data: bytes):
+        """Replace the game state with one captured by snapshot()."""
+        snapshot.restore(self, data)
+
+    def save_snapshot(self, path: str = statics.SNAPSHOT_PATH, background: bool = True):
+        """Save the game state to a file. By default only the state is copied now, it is encoded and written on a background thread."""
+        state = snapshot.copy_state(self)
+        if background:
+            return self.snapshot_writer.save(path, state)
+        snapshot.save_state(path, state)
+
+    def load_snapshot(self, path: str = statics.SNAPSHOT_PATH):
+        """Restore the game state from a file written by save_snapshot()."""
+        self.snapshot_writer.wait()
+        self.restore(snapshot.read_snapshot(path))
+
+    def step(self, attack_direction: AttackDirection = AttackDirection.NONE):
+        """Advance the simulation by one frame without drawing anything."""
+        self.map_engine.simulate(attack_direction)
+
+    def render(self):
+        """Draw the current game state and present the frame."""
+        self.map_engine.render()
+
 
 class GameLogic:
     def __init__(self, game_engine: GameEngine):
-        self.clock = pygame.time.Clock()
-        self.fps = statics.FPS
-        self.clock.tick(self.fps)
         self.game_engine = game_engine
-        self.entities = []
+        self.entities = EntityRegistry()
+        self.spatial_index = SpatialIndex()
+        self.enemy_swarm: Optional[EnemySwarm] = None
+
+    def enable_enemy_swarm(self):
+        """Store enemies created from now on in a batched NumPy EnemySwarm instead of Enemy objects."""
+        if self.enemy_swarm is None:
+            self.enemy_swarm = EnemySwarm()
 
     def __calculate_level_based_on_player_distance(self, entity_position: tuple[int, int], num_levels: int = 6) -> int:
         player_pos = self.game_engine.player.get_position()
@@ -89,8 +151,16 @@ class GameLogic:
         level = int((distance / max_distance) * (num_levels - 1)) + 1
         return level
 
-    def create_entity(self, name: str = "Entity", entity_type: EntityType = EntityType.NPC, starting_pos: tuple = (0, 0), size: int = statics.TILE_SIZE, health: int = 100):
-        """Creates a new entity with the given parameters."""
+    def create_entity(self, name: str = "Entity", entity_type: EntityType = EntityType.NPC, starting_pos: tuple = (0, 0), size: int = statics.TILE_SIZE, health: int = 100) -> Optional[Entity]:
+        """Creates a new entity with the given parameters and returns it.
+
+        When the enemy swarm is enabled, enemies are added to it with spawn_swarm_enemy() instead and None is returned,
+        since swarm enemies are rows of the swarm's arrays rather than objects.
+        """
+        if entity_type == EntityType.ENEMY and self.enemy_swarm is not None:
+            self.spawn_swarm_enemy(starting_pos, size=size, health=health)
+            return None
+
         if entity_type == EntityType.ENEMY:
             level = self.__calculate_level_based_on_player_distance(starting_pos)
             entity = Enemy(self.game_engine, name=name, starting_pos=starting_pos, size=size, level=level, health=health)
@@ -101,77 +171,165 @@ class GameLogic:
             # Create generic Entity for other types
             entity = Entity(name=name, entity_type=entity_type, starting_pos=starting_pos, size=size, health=health)
 
-        self.entities.append(entity)
+        self.entities.add(entity)
+        self.spatial_index.insert(entity)
         return entity
 
+    def spawn_swarm_enemy(self, starting_pos: tuple, size: int = statics.ENEMY_SIZE, health: int = 100) -> int:
+        """Add an enemy to the enabled enemy swarm and return its row index. The level scales with the distance to the player, like create_entity."""
+        if self.enemy_swarm is None:
+            raise RuntimeError("The enemy swarm is not enabled, see enable_enemy_swarm.")
+        level = self.__calculate_level_based_on_player_distance(starting_pos)
+        row = self.enemy_swarm.spawn(starting_pos, level=level, health=health, size=size)
+        if self.spatial_index.occupancy is not None:
+            self.spatial_index.occupancy.add(*self.spatial_index.cell_of(*starting_pos))
+        return row
+
+    def attach_occupancy(self, width: int, height: int):
+        """Track which tiles (of a map of the given size) hold entities or live swarm enemies, rebuilt from the current ones."""
+        occupancy = self.spatial_index.attach_occupancy(width, height)
+        if self.enemy_swarm is not None:
+            self.enemy_swarm.add_to_occupancy(occupancy)
+        return occupancy
+
     def add_entities(self, entities):
-        """Extends the game with entities."""
+        """Extends the game with entities. Entities that are already in the game are kept once."""
+        entities = list(entities)
         self.entities.extend(entities)
+        self.spatial_index.insert_many(entities)
+
+    def populate_entities(self, num_entities: int = 10, entity_type: EntityType = EntityType.ITEM, size: int = statics.TILE_SIZE, health: int = 100, min_spacing: int = 0) -> int:
+        """Populates the game with a specified number of entities on free walkable tiles.
 
-    def populate_entities(self, num_entities: int = 10, entity_type: EntityType = EntityType.ITEM, size: int = statics.TILE_SIZE, health: int = 100):
-        """Populates the game with a specified number of entities."""
+        Tiles are sampled directly from the free walkable ones, so spawning is close to linear in the number of entities.
+        With min_spacing > 0 the new entities are also kept at least that many tiles apart (Poisson-disc style).
+        Returns how many entities were spawned, which is less than num_entities when the map runs out of room.
+        """
+        map_engine = self.game_engine.map_engine
         # Use actual map dimensions instead of static constants
-        if self.game_engine.map_engine.map_data:
-            map_width_tiles = len(self.game_engine.map_engine.map_data[0])
-            map_height_tiles = len(self.game_engine.map_engine.map_data)
-            map_width_pixels = map_width_tiles * statics.TILE_SIZE
-            map_height_pixels = map_height_tiles * statics.TILE_SIZE
+        if map_engine.map_data:
+            map_width_tiles = len(map_engine.map_data[0])
+            map_height_tiles = len(map_engine.map_data)
         else:
             # Fallback to static constants if no map is loaded
-            map_width_pixels = statics.MAP_WIDTH
-            map_height_pixels = statics.MAP_HEIGHT
-
-        tile_x = map_width_pixels // statics.TILE_SIZE
-        tile_y = map_height_pixels // statics.TILE_SIZE
-        
-        for i in range(num_entities):
-            # Generate random tile coordinates
-            tile_occupied = False
-            while not tile_occupied:
-                tile_x = random.randint(0, map_width_pixels // statics.TILE_SIZE - 1)
-                tile_y = random.randint(0, map_height_pixels // statics.TILE_SIZE - 1)
+            map_width_tiles = statics.MAP_WIDTH // statics.TILE_SIZE
+            map_height_tiles = statics.MAP_HEIGHT // statics.TILE_SIZE
+
+        occupancy = self.spatial_index.occupancy
+        if occupancy is None or (occupancy.width, occupancy.height) != (map_width_tiles, map_height_tiles):
+            self.attach_occupancy(map_width_tiles, map_height_tiles)
+
+        if isinstance(map_engine.map_data, ChunkedWorld):
+            # Listing every free tile would page the whole world in, so streamed worlds sample by rejection
+            candidates = self._random_free_walkable_tiles(map_width_tiles, map_height_tiles)
+        elif min_spacing > 0:
+            candidates = self._free_walkable_tiles(map_width_tiles, map_height_tiles)
+            random.shuffle(candidates)
+        else:
+            candidates = self._free_walkable_tiles(map_width_tiles, map_height_tiles)
+            candidates = random.sample(candidates, min(num_entities, len(candidates)))
 
-                # Check if the tile is already occupied
-                tile_occupied = not self.game_engine.map_engine.is_tile_occupied(tile_x, tile_y)
+        tile_size = statics.TILE_SIZE
+        spacing_sq = min_spacing * min_spacing
+        spaced_cells: dict[tuple[int, int], list] = {}
+        spawned = 0
+        for offset in candidates:
+            if spawned >= num_entities:
+                break
+            tile_x, tile_y = offset % map_width_tiles, offset // map_width_tiles
+            if min_spacing > 0:
+                # With cells as wide as the spacing, any conflict lies in the 3x3 neighbouring cells
+                cell_x, cell_y = tile_x // min_spacing, tile_y // min_spacing
+                if any((tile_x - x) ** 2 + (tile_y - y) ** 2 < spacing_sq
+                       for neighbour_y in (cell_y - 1, cell_y, cell_y + 1)
+                       for neighbour_x in (cell_x - 1, cell_x, cell_x + 1)
+                       for x, y in spaced_cells.get((neighbour_x, neighbour_y), ())):
+                    continue
+                spaced_cells.setdefault((cell_x, cell_y), []).append((tile_x, tile_y))
 
             # Position entity at the center of the tile
-            center_x = tile_x * statics.TILE_SIZE + statics.TILE_SIZE // 2
-            center_y = tile_y * statics.TILE_SIZE + statics.TILE_SIZE // 2
+            center_x = tile_x * tile_size + tile_size // 2
+            center_y = tile_y * tile_size + tile_size // 2
             
-            self.create_entity(name=f"Entity {i}", entity_type=entity_type, 
+            self.create_entity(name=f"Entity {spawned}", entity_type=entity_type, 
                              starting_pos=(center_x, center_y), 
                              size=size,
                              health=health)
+            spawned += 1
+        return spawned
+
+    def _free_walkable_tiles(self, width: int, height: int) -> list[int]:
+        """List the row-major offsets of tiles that are not water and hold no entity or swarm enemy."""
+        map_data = self.game_engine.map_engine.map_data
+        counts = self.spatial_index.occupancy.counts
+        if np is not None:
+            free = np.frombuffer(counts, dtype=np.uint8) == 0
+            if map_data:
+                free &= self.game_engine.map_engine.get_tile_array().ravel() != 1
+            return np.flatnonzero(free).tolist()
+
+        if not map_data:
+            return [offset for offset, count in enumerate(counts) if not count]
+        tiles = map_data.tiles if isinstance(map_data, map_io.TileGrid) else [tile for row in map_data for tile in row]
+        return [offset for offset, (tile, count) in enumerate(zip(tiles, counts)) if tile != 1 and not count]
+
+    def _random_free_walkable_tiles(self, width: int, height: int, max_misses: int = 10000):
+        """Yield random free walkable tile offsets, giving up after max_misses rejections in a row."""
+        map_data = self.game_engine.map_engine.map_data
+        occupancy = self.spatial_index.occupancy
+        seen = set()
+        misses = 0
+        while misses < max_misses:
+            tile_x = random.randrange(width)
+            tile_y = random.randrange(height)
+            offset = tile_y * width + tile_x
+            if offset in seen or occupancy.is_occupied(tile_x, tile_y) or map_data[tile_y][tile_x] == 1:
+                misses += 1
+                continue
+            misses = 0
+            seen.add(offset)
+            yield offset
 
     def reset(self):
-        self.clock = pygame.time.Clock()
-        self.fps = statics.FPS
-        self.clock.tick(self.fps)
         self.entities.clear()
+        self.spatial_index.clear()
+        if self.enemy_swarm is not None:
+            self.enemy_swarm.clear()
 
     def cleanup_disposed_entities(self):
-        """Remove disposed entities from the entities list to prevent memory leaks."""
-        self.entities = [entity for entity in self.entities if not entity.is_disposed()]
+        """Remove entities disposed since the last cleanup to prevent memory leaks. Costs nothing when none were."""
+        scheduler = self.game_engine.scheduler
+        # Compacting the registry touches every entity, so a paced loop does it in idle frame time instead
+        for entity in self.entities.flush_removals(compact=not scheduler.running):
+            self.spatial_index.remove(entity)
+        if scheduler.running and self.entities.needs_compaction():
+            scheduler.defer("compact_entities", self.entities.compact)
+        # Compact the swarm only once most of its rows are dead
+        if self.enemy_swarm is not None and len(self.enemy_swarm) < self.enemy_swarm.count // 2:
+            self.enemy_swarm.compact()
 
     def dispose_entity(self, entity):
         """Dispose an entity and schedule it for removal."""
-        if entity in self.entities:
+        if entity in self.spatial_index or entity in self.entities:
+            self.spatial_index.remove(entity)
             entity.dispose()
+            self.entities.schedule_removal(entity)
 
     def pickup_coin(self, player):
         """Handles picking up a coin or healing entity."""
-        for entity in self.entities[:]:
-            if not entity.is_disposed():
-                if entity.entity_type == EntityType.ITEM:
-                    if player.check_collision(entity):
-                        self.entities.remove(entity)
-                        player.coins += 1
-                        entity.dispose()
-                elif entity.entity_type == EntityType.HEALTH:
-                    if player.check_collision(entity):
-                        self.entities.remove(entity)
-                        player.health = min(player.health + 20, 100)
-                        entity.dispose()
+        if player.is_disposed():
+            return
+        # Only entities whose center is close enough to overlap the player can collide
+        reach = player.size + self.spatial_index.max_entity_size
+        for entity in self.spatial_index.query_rect(player.x - reach, player.y - reach, reach * 2 + 1, reach * 2 + 1):
+            if entity.entity_type == EntityType.ITEM:
+                if player.check_collision(entity):
+                    player.coins += 1
+                    self.dispose_entity(entity)
+            elif entity.entity_type == EntityType.HEALTH:
+                if player.check_collision(entity):
+                    player.health = min(player.health + 20, 100)
+                    self.dispose_entity(entity)
 
     def add_experience_to_player(self, exp: int):
         if self.game_engine.player.level+1 in self.game_engine.player.required_exp:
@@ -195,54 +353,33 @@ class GameLogic:
         damage_out = weapon.damage * player.level if hasattr(weapon, 'damage') else damage * player.level
 
         tile_size = statics.TILE_SIZE
-        player_tile_x = player.x // tile_size
-        player_tile_y = player.y // tile_size
-        player_center_x = player_tile_x * tile_size + tile_size // 2
-        player_center_y = player_tile_y * tile_size + tile_size // 2
-
-        # For each cell in the attack pattern, check for entity center inside attack cell
-        for dx, dy in weapon.attack_pattern.pattern_data:
-            # Rotate pattern based on attack_direction (same as draw_attack)
-            if attack_direction == AttackDirection.UP:
-                rel_dx, rel_dy = dx, -dy
-            elif attack_direction == AttackDirection.DOWN:
-                rel_dx, rel_dy = dx, dy
-            elif attack_direction == AttackDirection.LEFT:
-                rel_dx, rel_dy = -dy, dx
-            elif attack_direction == AttackDirection.RIGHT:
-                rel_dx, rel_dy = dy, -dx
-            else:
-                rel_dx, rel_dy = dx, dy
+        player_tile_x = int(player.x // tile_size)
+        player_tile_y = int(player.y // tile_size)
 
-            # Calculate the center of the attack cell in world coordinates
-            cell_center_x = player_center_x + rel_dx * tile_size
-            cell_center_y = player_center_y + rel_dy * tile_size
+        # Cells of the attack pattern, already rotated for attack_direction (same as draw_attack)
+        cells = [(player_tile_x + rel_dx, player_tile_y + rel_dy)
+                 for rel_dx, rel_dy in weapon.attack_pattern.offsets(attack_direction)]
+        swarm_rewards = self.enemy_swarm.damage_tiles(cells, damage_out, self.spatial_index.occupancy) if self.enemy_swarm is not None else None
 
-            # Create a rect for the attack cell
-            attack_cell_rect = pygame.Rect(
-                cell_center_x - tile_size // 2,
-                cell_center_y - tile_size // 2,
-                tile_size,
-                tile_size
-            )
-
-            for entity in self.entities:
+        # For each cell in the attack pattern, check for entity center inside attack cell
+        for cell_index, (cell_x, cell_y) in enumerate(cells):
+            # Attack cells are whole tiles, so an entity center is inside the cell
+            # exactly when the entity is bucketed on that tile
+            for entity in self.spatial_index.query_tile(cell_x, cell_y):
                 if (not entity.is_disposed() and 
                     entity.entity_type != EntityType.PLAYER and 
                     entity.entity_type != EntityType.ITEM and
                     entity not in damaged_entities_this_attack):
+                    damaged_entities_this_attack.add(entity)
+                    entity.health -= damage_out
+                    if entity.health <= 0:
+                        if entity.entity_type == EntityType.ENEMY:
+                            self.add_experience_to_player(entity.exp_reward)
+                        self.dispose_entity(entity)
 
-                    # Use entity center for strictness
-                    entity_center_x = entity.x
-                    entity_center_y = entity.y
-
-                    if attack_cell_rect.collidepoint(entity_center_x, entity_center_y):
-                        damaged_entities_this_attack.add(entity)
-                        entity.health -= damage_out
-                        if entity.health <= 0:
-                            if entity.entity_type == EntityType.ENEMY:
-                                self.add_experience_to_player(entity.exp_reward)
-                            self.dispose_entity(entity)
+            if swarm_rewards is not None:
+                for exp_reward in swarm_rewards[cell_index]:
+                    self.add_experience_to_player(exp_reward)
 
     def change_weapon(self):
         """Cycle to the next weapon in the weapons_list dictionary."""
@@ -270,21 +407,42 @@ class MapEngine:
         self.attack_timer = 0
         self.current_attack_direction = AttackDirection.NONE
         self.damaged_entities_this_attack = set()  # Track entities damaged in current attack
+        self.enemy_tick = 0  # Number of update_enemies calls, used to catch dormant enemies up
+        self._tile_array = None
+        self._tile_array_source = None
+        self.terrain_cache = TerrainChunkCache()
+        self.flow_field = FlowField()
+        self.profiler = FrameProfiler()
+        # Dirty-rect presentation: only the regions drawn this frame or last frame are redrawn and updated
+        self.use_dirty_rects = statics.USE_DIRTY_RECTS
+        self._previous_rects = None  # Screen rects drawn last frame, None forces a full redraw
+        self._rendered_map = None  # map_data and camera position of the last rendered frame
+        self._rendered_camera = None
+        self._dirty_tiles = set()
 
         self.initialize()
 
     def initialize(self, windows_size:tuple=(800, 600)):
-        self.screen = pygame.display.set_mode(windows_size)
+        # Headless engines keep the view size for the camera but never open a window
+        self.view_size = windows_size
+        self.screen = None if self.game_engine.headless else pygame.display.set_mode(windows_size)
+        if self.screen is not None:
+            # Images are converted for the display, so they can only be loaded once it exists
+            ASSETS.preload()
+            ENTITY_ATLAS.build()
+        self.invalidate_screen()
         # Set player position to the center of the starting tile
         tile_size = statics.TILE_SIZE
         start_x = statics.PLAYER_STARTING_POSITION[0] + tile_size // 2
         start_y = statics.PLAYER_STARTING_POSITION[1] + tile_size // 2
         self.game_engine.player.x = start_x
         self.game_engine.player.y = start_y
+        self.game_engine.game_logic.spatial_index.update(self.game_engine.player)
 
         self.initialized = True
 
     def reset(self):
+        self.release_map()
         self.map_data = None
         self.seed = None
         self.screen = None
@@ -292,53 +450,46 @@ class MapEngine:
         self.attack_timer = 0
         self.current_attack_direction = AttackDirection.NONE
         self.damaged_entities_this_attack = set()
+        self._tile_array = None
+        self._tile_array_source = None
+        self.terrain_cache.clear()
+        self.flow_field.invalidate()
+        self.invalidate_screen()
+
+    def release_map(self):
+        """Flush and close a streamed world before map_data is replaced."""
+        if isinstance(self.map_data, ChunkedWorld):
+            self.map_data.close()
+
+    def get_tile_array(self):
+        """Get the map as a 2D NumPy array, cached until the map is replaced."""
+        if np is None:
+            raise RuntimeError("NumPy is required for array access to the map.")
+        if self.map_data is None:
+            raise ValueError("No map data available.")
+        if isinstance(self.map_data, ChunkedWorld):
+            raise ValueError("A streamed world cannot be viewed as one array, use lookup_tiles() instead.")
+        if self._tile_array is None or self._tile_array_source is not self.map_data:
+            if isinstance(self.map_data, map_io.TileGrid):
+                # Zero-copy view that shares memory with the grid
+                grid = self.map_data
+                self._tile_array = np.frombuffer(grid.tiles, dtype=np.dtype(grid.typecode)).reshape(grid.height, grid.width)
+            else:
+                self._tile_array = np.asarray(self.map_data, dtype=np.int16)
+            self._tile_array_source = self.map_data
+        return self._tile_array
 
-
-    def generate_seeded_map(self, seed=None, width=20, height=20):
+    def generate_seeded_map(self, seed=None, width=20, height=20, workers: int = statics.MAPGEN_WORKERS):
+        """Generate a terrain map (see map_generator.py). The same seed always gives the same map, whatever the workers."""
         if seed is not None:
             self.seed = seed
-        if self.seed is not None:
-            random.seed(self.seed)
 
         self.width = width
         self.height = height
 
-        # Generate basic terrain map with different tile types
-        # 0 = grass, 1 = water, 2 = mountain, 3 = forest
-        terrain_map = []
-
-        for y in range(height):
-            row = []
-            for x in range(width):
-                # Use position-based probability for varied terrain
-                distance_from_center = ((x - width//2)**2 + (y - height//2)**2)**0.5
-
-                rand_val = random.random()
-
-                if distance_from_center > width * 0.3:
-                    # Outer areas more likely to be mountains or water
-                    if rand_val < 0.3:
-                        tile = 2  # mountain
-                    elif rand_val < 0.5:
-                        tile = 1  # water
-                    elif rand_val < 0.8:
-                        tile = 3  # forest
-                    else:
-                        tile = 0  # grass
-                else:
-                    # Center areas more likely to be traversable
-                    if rand_val < 0.6:
-                        tile = 0  # grass
-                    elif rand_val < 0.8:
-                        tile = 3  # forest
-                    elif rand_val < 0.9:
-                        tile = 1  # water
-                    else:
-                        tile = 2  # mountain
-
-                row.append(tile)
-            terrain_map.append(row)
+        terrain_map = map_generator.generate_terrain(self.seed, width, height, workers=workers)
 
+        self.release_map()
         self.map_data = terrain_map
         return terrain_map
 
@@ -346,10 +497,10 @@ class MapEngine:
         return self.generate_seeded_map(seed=None, width=width, height=height)
     
     def generate_map_in_proportions_of_screen(self):
-        if not self.initialized or not self.screen:
+        if not self.initialized:
             raise RuntimeError("Screen not initialized. Call initialize() first.")
 
-        screen_width, screen_height = self.screen.get_size()
+        screen_width, screen_height = self.view_size
         tile_size = statics.TILE_SIZE
 
         width = screen_width // tile_size
@@ -357,24 +508,41 @@ class MapEngine:
 
         return self.generate_seeded_map(seed=None, width=width, height=height)
 
-    def save_map(self, name="random_map") -> None:
+    def lookup_tiles(self, tile_xs, tile_ys):
+        """Get the tiles at the given in-bounds tile coordinate arrays as a NumPy array."""
+        if isinstance(self.map_data, ChunkedWorld):
+            get_tile = self.map_data.get_tile
+            return np.fromiter((get_tile(x, y) for x, y in zip(tile_xs.tolist(), tile_ys.tolist())),
+                               dtype=np.int16, count=len(tile_xs))
+        return self.get_tile_array()[tile_ys, tile_xs]
+
+    def save_map(self, name="random_map", binary: Optional[bool] = None) -> None:
+        """Saves the map. Names ending in statics.BINARY_MAP_EXTENSION are saved in the binary format unless binary is given."""
         if self.map_data is None:
             raise ValueError("No map data available to save.")
-        with open(f"{statics.MAPS_ROOT}/{name}", 'w') as f:
-            for row in self.map_data:
-                if isinstance(row, int):
-                    f.write(str(row) + '\n')
-                else:
-                    f.write(' '.join(str(tile) for tile in row) + '\n')
-
-    def load_map(self, map_path: str) -> tuple[int, int]:
-        """Loads a map from a specified file path."""
+        path = f"{statics.MAPS_ROOT}/{name}"
+        if isinstance(self.map_data, ChunkedWorld):
+            # A streamed world saves in place by writing back its edited chunks
+            self.map_data.flush()
+            if os.path.abspath(path) == os.path.abspath(self.map_data.path):
+                return
+        map_io.write_map(path, self.map_data, binary=binary)
+
+    def load_map(self, map_path: str, streaming: bool = False) -> tuple[int, int]:
+        """Loads a map from a specified file path. Text and binary maps are detected automatically.
+
+        With streaming=True a binary map is opened as a ChunkedWorld that only keeps chunks around the camera and player in memory.
+        """
+        self.release_map()
         self.map_data = []
         try:
-            with open(f'{statics.MAPS_ROOT}/{map_path}', 'r') as f:
-                for line in f:
-                    row = list(map(int, line.strip().split()))
-                    self.map_data.append(row)
+            path = f'{statics.MAPS_ROOT}/{map_path}'
+            if streaming:
+                if not map_io.is_binary_map(path):
+                    raise ValueError("Only binary maps can be streamed, convert it with map_io.py first.")
+                self.map_data = ChunkedWorld(path)
+            else:
+                self.map_data = map_io.read_map(path)
         except FileNotFoundError:
             raise FileNotFoundError(f"Map file '{map_path}' not found.")
         except Exception as e:
@@ -399,6 +567,58 @@ class MapEngine:
             raise ValueError("Invalid tile type. Must be an integer.")
 
         self.map_data[tile_y][tile_x] = new_tile_type
+        if self._tile_array is not None and self._tile_array_source is self.map_data:
+            self._tile_array[tile_y, tile_x] = new_tile_type
+        self.terrain_cache.invalidate_tile(tile_x, tile_y)
+        self.flow_field.invalidate()
+        self._dirty_tiles.add((tile_x, tile_y))
+
+    def change_tiles(self, tile_xs, tile_ys, new_tile_types):
+        """Change many tiles at once and return their previous tile types as an array("H").
+
+        Coordinates are parallel sequences, array("I") being the fastest, and new_tile_types is a single tile type
+        or a sequence of them. Caches are invalidated once for the whole change instead of once per tile.
+        """
+        if not self.map_data:
+            raise ValueError("No map data available to change tiles.")
+        count = len(tile_xs)
+        if len(tile_ys) != count:
+            raise ValueError("Tile x and y coordinates must be the same length.")
+        old_tile_types = array("H")
+        if not count:
+            return old_tile_types
+        width, height = len(self.map_data[0]), len(self.map_data)
+        if isinstance(new_tile_types, int):
+            new_tile_types = array("H", [new_tile_types]) * count
+        elif len(new_tile_types) != count:
+            raise ValueError("Expected one new tile type per tile.")
+
+        if np is not None and isinstance(self.map_data, map_io.TileGrid):
+            # Vectorized through the zero-copy array view of the grid
+            xs = np.asarray(tile_xs, dtype=np.intp)
+            ys = np.asarray(tile_ys, dtype=np.intp)
+            left, right, top, bottom = int(xs.min()), int(xs.max()), int(ys.min()), int(ys.max())
+            if left < 0 or top < 0 or right >= width or bottom >= height:
+                raise IndexError("Tile coordinates out of bounds.")
+            tiles = self.get_tile_array()
+            old_tile_types.frombytes(tiles[ys, xs].astype(np.uint16).tobytes())
+            tiles[ys, xs] = np.asarray(new_tile_types)
+        else:
+            left, right, top, bottom = min(tile_xs), max(tile_xs), min(tile_ys), max(tile_ys)
+            if left < 0 or top < 0 or right >= width or bottom >= height:
+                raise IndexError("Tile coordinates out of bounds.")
+            map_data = self.map_data
+            for tile_x, tile_y, new_tile_type in zip(tile_xs, tile_ys, new_tile_types):
+                row = map_data[tile_y]
+                old_tile_types.append(row[tile_x])
+                row[tile_x] = new_tile_type
+            if self._tile_array_source is not None and not isinstance(map_data, map_io.TileGrid):
+                self._tile_array = None  # A copy of list maps, rebuilt on next use
+
+        self.terrain_cache.invalidate_rect(left, top, right, bottom)
+        self.flow_field.invalidate()
+        self.invalidate_screen()
+        return old_tile_types
 
     def is_tile_occupied(self, tile_x: int, tile_y: int) -> bool:
         """
@@ -407,91 +627,33 @@ class MapEngine:
         if not self.game_engine or not self.game_engine.game_logic or self.map_data is None:
             return False
 
-        for entity in self.game_engine.game_logic.entities:
-            if (entity.x // statics.TILE_SIZE == tile_x and 
-                entity.y // statics.TILE_SIZE == tile_y and 
-                not entity.is_disposed()) and self.map_data[tile_y][tile_x] == statics.TILE_VALUES[1]:
-                return True
-        return False
+        return bool(self.game_engine.game_logic.spatial_index.query_tile(tile_x, tile_y))
 
-    def draw_map(self):
+    def draw_map(self, rects=None):
+        """Draws the terrain, or only the parts of it inside rects when they are given."""
         if self.map_data is None or not self.screen:
             raise ValueError("No map data available to display.")
 
-        tile_colors = {
-            0: (50, 150, 50),  # grass - green
-            1: (50, 50, 150),  # water - blue
-            2: (100, 100, 100),  # mountain - gray
-            3: (0, 100, 0)  # forest - dark green
-        }
-
-        tile_size = statics.TILE_SIZE
-        screen_width, screen_height = self.screen.get_size()
-        
-        # Calculate camera offset
-        camera_x = self.game_engine.camera.x
-        camera_y = self.game_engine.camera.y
-        
-        # Calculate which tiles need to be drawn on screen (including beyond map boundaries)
-        start_tile_x = camera_x // tile_size
-        start_tile_y = camera_y // tile_size
-        end_tile_x = (camera_x + screen_width) // tile_size + 1
-        end_tile_y = (camera_y + screen_height) // tile_size + 1
-
-        # Draw all visible tiles (including black squares beyond map boundaries)
-        for y in range(start_tile_y, end_tile_y):
-            for x in range(start_tile_x, end_tile_x):
-                # Check if tile is within map boundaries
-                if (0 <= y < len(self.map_data) and 0 <= x < len(self.map_data[0])):
-                    # Draw map tile
-                    tile_type = self.map_data[y][x]
-                    color = tile_colors.get(tile_type, (255, 255, 255))
-                else:
-                    # Draw black square beyond map boundaries
-                    color = (0, 0, 0)
-
-                # Calculate screen position relative to camera
-                screen_x = x * tile_size - camera_x
-                screen_y = y * tile_size - camera_y
-
-                pygame.draw.rect(self.screen, color,
-                                 (screen_x, screen_y, tile_size, tile_size))
-
-    # def draw_player(self):
-        """Draws the player on the map."""
-        if self.game_engine.initialized and self.game_engine.player:
-            player_color = statics.PLAYER_COLOR
-            player_size = statics.PLAYER_SIZE
-            tile_size = statics.TILE_SIZE
-            
-            # Calculate which tile the player is currently in
-            tile_x = self.game_engine.player.x // tile_size
-            tile_y = self.game_engine.player.y // tile_size
-            
-            # Calculate the center of that tile in world coordinates
-            tile_center_x = tile_x * tile_size + tile_size // 2
-            tile_center_y = tile_y * tile_size + tile_size // 2
-            
-            # Calculate screen position relative to camera
-            screen_center_x = tile_center_x - self.game_engine.camera.x
-            screen_center_y = tile_center_y - self.game_engine.camera.y
-            
-            # Draw player centered at the tile center
-            draw_x = screen_center_x - player_size // 2
-            draw_y = screen_center_y - player_size // 2
-            
-            pygame.draw.rect(self.screen, player_color,
-                             (draw_x, draw_y, player_size, player_size))
+        # Terrain comes from pre-rendered chunks, black is left beyond map boundaries
+        if rects is None:
+            self.terrain_cache.draw(self.screen, self.map_data, self.game_engine.camera.x, self.game_engine.camera.y)
+        else:
+            self.terrain_cache.draw_rects(self.screen, self.map_data, self.game_engine.camera.x, self.game_engine.camera.y, rects)
 
     def draw_camera(self):
-        """Draws the camera view on the map."""
+        """Draws the camera view on the map and returns the rects of the border edges."""
         if self.screen is None:
-            return
+            return []
         if self.game_engine.initialized and self.game_engine.camera.display_camera_location:
             camera_color = (255, 255, 0)
             # Draw camera border around the screen edges to show the viewport
+            width, height = self.screen.get_size()
             pygame.draw.rect(self.screen, camera_color, 
-                           (0, 0, self.screen.get_width(), self.screen.get_height()), 2)
+                           (0, 0, width, height), 2)
+            # Only the 2px edges changed, not the whole bounding rect
+            return [pygame.Rect(0, 0, width, 2), pygame.Rect(0, height - 2, width, 2),
+                    pygame.Rect(0, 0, 2, height), pygame.Rect(width - 2, 0, 2, height)]
+        return []
 
     def draw_game_starting_position(self):
         """Draws the game starting position on the map."""
@@ -503,7 +665,7 @@ class MapEngine:
             tile_size = statics.TILE_SIZE
             player_size = statics.PLAYER_SIZE
             
-            # Calculate which tile the starting position is in (same logic as draw_player)
+            # Calculate which tile the starting position is in
             tile_x = statics.PLAYER_STARTING_POSITION[0] // tile_size
             tile_y = statics.PLAYER_STARTING_POSITION[1] // tile_size
             
@@ -520,25 +682,29 @@ class MapEngine:
             draw_y = screen_center_y - player_size // 2
             
             starting_rect = pygame.Rect(draw_x, draw_y, player_size, player_size)
-            pygame.draw.rect(self.screen, starting_color, starting_rect)
+            return pygame.draw.rect(self.screen, starting_color, starting_rect)
 
     def draw_attack(self, attack_direction):
-        """Draws the attack area for attack_duration frames after an attack is triggered, and only allows a new attack after attack_cooldown reaches 0."""
+        """Draws the attack area for attack_duration frames after an attack is triggered, and only allows a new attack after attack_cooldown reaches 0.
+
+        Returns the screen rects of the drawn attack cells.
+        """
+        rects = []
         if self.screen is None:
-            return
+            return rects
 
         weapon = self.game_engine.player.weapon
         if not weapon or not weapon.attack_pattern:
-            return
+            return rects
 
         # Draw attack area if attack_timer > 0 (attack is active)
         if not hasattr(weapon, 'attack_timer') or weapon.attack_timer <= 0:
-            return
+            return rects
 
         if self.game_engine.initialized and self.game_engine.player:
             attack_color = statics.ATTACK_COLOR
             tile_size = statics.TILE_SIZE
-            # Calculate which tile the player is currently in (same as draw_player)
+            # Calculate which tile the player is currently in
             tile_x = self.game_engine.player.x // tile_size
             tile_y = self.game_engine.player.y // tile_size
             # Calculate the center of that tile in world coordinates
@@ -549,51 +715,103 @@ class MapEngine:
             screen_center_y = tile_center_y - self.game_engine.camera.y
 
             # Draw each attack cell in the pattern relative to the player
-            for dx, dy in weapon.attack_pattern.pattern_data:
-                # Rotate pattern based on attack_direction
-                if attack_direction == AttackDirection.UP:
-                    rel_dx, rel_dy = dx, -dy
-                elif attack_direction == AttackDirection.DOWN:
-                    rel_dx, rel_dy = dx, dy
-                elif attack_direction == AttackDirection.LEFT:
-                    rel_dx, rel_dy = -dy, dx
-                elif attack_direction == AttackDirection.RIGHT:
-                    rel_dx, rel_dy = dy, -dx
-                else:
-                    rel_dx, rel_dy = dx, dy
-
+            for rel_dx, rel_dy in weapon.attack_pattern.offsets(attack_direction):
                 cell_x = screen_center_x + rel_dx * tile_size
                 cell_y = screen_center_y + rel_dy * tile_size
-                pygame.draw.rect(
+                rects.append(pygame.draw.rect(
                     self.screen,
                     attack_color,
                     (cell_x - tile_size // 2, cell_y - tile_size // 2, tile_size, tile_size),
                     2
-                )
+                ))
+        return rects
+
+    def visible_entities(self) -> list:
+        """Get the entities that may be drawn on screen, in the order they were added.
+
+        Entities are drawn on the center of their tile, so the camera rect is widened by a tile and the largest entity size.
+        """
+        game_logic = self.game_engine.game_logic
+        camera = self.game_engine.camera
+        screen_width, screen_height = self.screen.get_size()
+        margin = statics.TILE_SIZE + game_logic.spatial_index.max_entity_size
+        nearby = game_logic.spatial_index.query_rect(camera.x - margin, camera.y - margin,
+                                                     screen_width + margin * 2, screen_height + margin * 2)
+        registry = game_logic.entities
+        return registry.in_order([entity for entity in nearby if entity in registry])
 
     def draw_entities(self):
-        """Draws all entities on the map."""
-        for entity in self.game_engine.game_logic.entities:
-            if not entity.is_disposed():
-                entity.draw(self.screen, self.game_engine.camera)
+        """Draws all entities on the map in per-type batches and returns the screen rects they touched."""
+        rects = draw_entity_batches(self.screen, self.game_engine.camera, self.visible_entities())
+        if self.game_engine.game_logic.enemy_swarm is not None:
+            rects.extend(self.game_engine.game_logic.enemy_swarm.draw(self.screen, self.game_engine.camera))
+        return rects
 
     def draw_entities_health_bars(self):
-        """Draws health bars for all entities on the map."""
-        for entity in self.game_engine.game_logic.entities:
-            if not entity.is_disposed():
-                entity.draw_health_bar(self.screen, self.game_engine.camera)
+        """Draws health bars for all entities on the map and returns the screen rects they touched."""
+        rects = []
+        for entity in self.visible_entities():
+            rects.append(entity.draw_health_bar(self.screen, self.game_engine.camera))
+        if self.game_engine.game_logic.enemy_swarm is not None:
+            rects.extend(self.game_engine.game_logic.enemy_swarm.draw_health_bars(self.screen, self.game_engine.camera))
+        return rects
 
     def update_enemies(self):
-        """Updates all enemies' behavior."""
-        for entity in self.game_engine.game_logic.entities:
-            if not entity.is_disposed() and isinstance(entity, Enemy):
-                entity.update()
+        """Updates the behavior of the enemies near the player.
+
+        Enemies only act inside statics.ENEMY_WAKE_RADIUS of the player, so the rest stay dormant and cost nothing.
+        They are found through the spatial index, which wakes enemies as the player approaches, and their missed
+        cooldown ticks are caught up when they wake. Results match updating every enemy every tick.
+        Enemies find their way around obstacles with a flow field that is only recomputed when the player changes tile.
+        """
+        game_logic = self.game_engine.game_logic
+        self.enemy_tick += 1
+        player = self.game_engine.player
+        # Once the player is dead enemies only count their cooldowns down, which catch_up does later
+        if not player.is_disposed():
+            if self.map_data:
+                tile_size = statics.TILE_SIZE
+                self.flow_field.update(self.map_data, int(player.x // tile_size), int(player.y // tile_size))
+            registry = game_logic.entities
+            nearby = game_logic.spatial_index.query_radius(player.x, player.y, statics.ENEMY_WAKE_RADIUS)
+            # Updated in the order they were added, so contact damage lands in the same order as before
+            for entity in registry.in_order([entity for entity in nearby
+                                             if entity.entity_type == EntityType.ENEMY and entity in registry]):
+                if not entity.is_disposed() and isinstance(entity, Enemy):
+                    entity.update(self.enemy_tick)
+        if self.game_engine.game_logic.enemy_swarm is not None:
+            self.game_engine.game_logic.enemy_swarm.step(self.game_engine)
+
+    def update_world_focus(self):
+        """Page streamed world chunks in around the camera and player and evict distant ones."""
+        tile_size = statics.TILE_SIZE
+        camera = self.game_engine.camera
+        screen_width, screen_height = self.view_size
+        points = [((camera.x + screen_width // 2) // tile_size, (camera.y + screen_height // 2) // tile_size)]
+        player = self.game_engine.player
+        if not self.game_engine.is_map_editor and not player.is_disposed():
+            points.append((player.x // tile_size, player.y // tile_size))
+        self.map_data.set_focus(points)
 
     def update(self, attack_direction: AttackDirection = AttackDirection.NONE):
-        """Updates the map engine state."""
-        if not self.initialized or self.screen is None:
+        """Updates the map engine state and draws the frame."""
+        if self.profiler.enabled:
+            start = time.perf_counter()
+            self.simulate(attack_direction)
+            self.render()
+            self.profiler.record("frame", (time.perf_counter() - start) * 1000)
+        else:
+            self.simulate(attack_direction)
+            self.render()
+
+    def simulate(self, attack_direction: AttackDirection = AttackDirection.NONE):
+        """Advances the game logic by one frame. Never draws, so it also runs headless."""
+        if not self.initialized:
             raise RuntimeError("Game engine not initialized.")
 
+        self.profiler.begin_frame()
+        run = self.profiler.runner
+
         weapon = self.game_engine.player.weapon
         # Handle attack input and timers for weapon
         if weapon:
@@ -610,43 +828,101 @@ class MapEngine:
                     weapon.attack_timer = weapon.attack_duration
                     weapon.cooldown_timer = weapon.attack_cooldown
                     self.damaged_entities_this_attack.clear()
+                    if self.game_engine.game_logic.enemy_swarm is not None:
+                        self.game_engine.game_logic.enemy_swarm.clear_hits()
 
         if self.game_engine.player and not self.game_engine.is_map_editor:
             # Center camera on player (player position is already in pixels)
-            self.game_engine.camera.x = self.game_engine.player.x - self.screen.get_width() // 2
-            self.game_engine.camera.y = self.game_engine.player.y - self.screen.get_height() // 2
-
-        self.draw_map()
-        self.draw_game_starting_position()
-        # self.draw_player()
-        self.draw_entities()
-        self.update_enemies()
+            self.game_engine.camera.x = self.game_engine.player.x - self.view_size[0] // 2
+            self.game_engine.camera.y = self.game_engine.player.y - self.view_size[1] // 2
+
+        if isinstance(self.map_data, ChunkedWorld):
+            self.update_world_focus()
+
+        run("update_enemies", self.update_enemies)
         self.game_engine.player.update()  # Update player state including invincibility timer
-        self.game_engine.game_logic.pickup_coin(self.game_engine.player)
+        run("pickup_coin", self.game_engine.game_logic.pickup_coin, self.game_engine.player)
         # Use weapon's attack_timer for damage
         attack_timer = weapon.attack_timer if weapon else 0
-        self.game_engine.game_logic.deal_damage(
+        run("deal_damage", self.game_engine.game_logic.deal_damage,
             self.game_engine.player, 
             self.current_attack_direction, 
             attack_timer, 
             self.damaged_entities_this_attack
         )
-        self.draw_entities_health_bars()
 
-        self.draw_camera()
+        # Clean up disposed entities
+        run("cleanup_disposed_entities", self.game_engine.game_logic.cleanup_disposed_entities)
+
+    def invalidate_screen(self):
+        """Make the next frame redraw and present the whole screen."""
+        self._previous_rects = None
+        self._rendered_map = None
+        self._dirty_tiles.clear()
+
+    def _dirty_tile_rects(self) -> list:
+        tile_size = statics.TILE_SIZE
+        camera = self.game_engine.camera
+        return [pygame.Rect(x * tile_size - camera.x, y * tile_size - camera.y, tile_size, tile_size)
+                for x, y in self._dirty_tiles]
+
+    def render(self):
+        """Draws the current state to the screen and presents the frame. Only reads game state.
+
+        With dirty rects enabled and an unmoved camera, only the terrain under last frame's drawings and edited
+        tiles is redrawn, and only those regions plus this frame's drawings are presented.
+        """
+        if not self.initialized or self.screen is None:
+            raise RuntimeError("Cannot render without a screen. Headless engines only simulate.")
+
+        weapon = self.game_engine.player.weapon
+        run = self.profiler.runner
+        camera = self.game_engine.camera
+
+        # Scrolling or a new map changes every pixel, so those frames are redrawn and flipped whole
+        full_redraw = (not self.use_dirty_rects or self._previous_rects is None
+                       or self.map_data is not self._rendered_map or (camera.x, camera.y) != self._rendered_camera)
+        if full_redraw:
+            restored_rects = []
+            run("draw_map", self.draw_map)
+        else:
+            restored_rects = self._previous_rects + self._dirty_tile_rects()
+            run("draw_map", self.draw_map, restored_rects)
+        self._dirty_tiles.clear()
+
+        rects = [self.draw_game_starting_position()]
+        rects += run("draw_entities", self.draw_entities)
+        rects += run("draw_entities_health_bars", self.draw_entities_health_bars)
+
+        rects += self.draw_camera()
 
         # Draw attack if timer is active (use weapon's attack_timer)
         if weapon and weapon.attack_timer > 0:
-            self.draw_attack(self.current_attack_direction)
+            rects += run("draw_attack", self.draw_attack, self.current_attack_direction)
 
         # Draw UI (inventory, etc.)
         if not self.game_engine.is_map_editor:
-            self.game_engine.player.inventory.draw(self.screen, self.game_engine.player)
+            rects.append(run("draw_inventory", self.game_engine.player.inventory.draw, self.screen, self.game_engine.player))
 
-        # Clean up disposed entities
-        self.game_engine.game_logic.cleanup_disposed_entities()
+        rects.append(self.profiler.draw_overlay(self.screen))
 
-        pygame.display.flip()
+        rects = [rect for rect in rects if rect]
+        # Past a point restoring many small rects costs more than one full redraw
+        self._previous_rects = rects if len(rects) <= statics.DIRTY_RECTS_MAX else None
+        self._rendered_map = self.map_data
+        self._rendered_camera = (camera.x, camera.y)
+        if full_redraw:
+            run("present", pygame.display.flip)
+        else:
+            run("present", pygame.display.update, restored_rects + rects)
+        self.game_engine.scheduler.defer("prefetch_terrain", self.prefetch_terrain)
+
+    def prefetch_terrain(self) -> bool:
+        """Render one terrain chunk the camera may scroll onto next. Returns whether more are left, see FrameScheduler.defer."""
+        if not self.map_data or self.screen is None:
+            return False
+        camera = self.game_engine.camera
+        return self.terrain_cache.prefetch(self.map_data, camera.x, camera.y, *self.screen.get_size())
 
 
 
@@ -660,10 +936,38 @@ class MapEngine:
             print("No map data available to print.")
 
 
+def rotate_attack_offset(dx: int, dy: int, attack_direction) -> tuple[int, int]:
+    """Rotate a pattern offset, written for an attack facing down, to face attack_direction."""
+    if attack_direction == AttackDirection.UP:
+        return dx, -dy
+    elif attack_direction == AttackDirection.DOWN:
+        return dx, dy
+    elif attack_direction == AttackDirection.LEFT:
+        return -dy, dx
+    elif attack_direction == AttackDirection.RIGHT:
+        return dy, -dx
+    return dx, dy
+
+
 @dataclass
 class AttackPattern:
     pattern_type: str
     pattern_data: list[tuple[int, int]]  
+    # Rotated offsets per AttackDirection, built by compile()
+    _offsets: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.compile()
+
+    def compile(self):
+        """Precompute the tile offsets for every attack direction. Call it again after changing pattern_data."""
+        self._offsets = {direction: tuple(rotate_attack_offset(dx, dy, direction) for dx, dy in self.pattern_data)
+                         for direction in AttackDirection}
+
+    def offsets(self, attack_direction) -> tuple:
+        """Get the tile offsets from the player covered by an attack in attack_direction."""
+        offsets = self._offsets.get(attack_direction)
+        return self._offsets[AttackDirection.NONE] if offsets is None else offsets
 
 @dataclass
 class Weapon:
@@ -678,6 +982,11 @@ class Weapon:
 
     def __hash__(self) -> int:
         return hash((self.name, self.weapon_type, self.damage, self.attack_pattern, self.attack_cooldown, self.attack_duration))
+
+
+def weapon_icon_path(weapon_type: WeaponType) -> str:
+    """Get the icon texture of a weapon type. Files are named after the enum member, like SWORD.png."""
+    return f"{statics.WEAPON_TEXTURES_ROOT}/{weapon_type.name}.png"
     
 
 
@@ -685,6 +994,8 @@ class Inventory(UI):
     def __init__(self):
         super().__init__()
         self.items = []
+        self._hud_surface = None  # Rendered HUD, reused while _hud_key still matches the state
+        self._hud_key = None
 
     def __add__(self, item):
         """Adds an item to the inventory."""
@@ -707,57 +1018,81 @@ class Inventory(UI):
             self.items.remove(item)
 
     def draw(self, screen, player=None):
-        """Draw the player's inventory on screen."""
+        """Draw the player's inventory on screen and return the rect it covers.
+
+        The HUD is rendered into a cached surface, which is only redrawn when the state it shows changes,
+        and blitted in one go otherwise.
+        """
         if not self.show_inventory or not player or not hasattr(player, 'inventory'):
             return
-        
+
         # Get inventory items - handle both list and Inventory object
         inventory_items = player.inventory.items if hasattr(player.inventory, 'items') else player.inventory
-        
-        # Initialize font
-        font = pygame.font.Font(statics.FONT_NAME, statics.FONT_SIZE)
-        
+        state = self._hud_state(player, inventory_items)
+        if self._hud_surface is None or state != self._hud_key:
+            self._hud_surface = self._render_hud(screen, player, inventory_items)
+            self._hud_key = state
+        return screen.blit(self._hud_surface, (self.inventory_x, self.inventory_y))
+
+    def _hud_state(self, player, inventory_items):
+        """Everything the HUD shows, so a changed value means the cached HUD is stale."""
+        weapon = getattr(player, 'weapon', None)
+        level = getattr(player, 'level', None)
+        required_exp = player.required_exp.get(level + 1, 100) if level is not None and hasattr(player, 'required_exp') else None
+        return (
+            self.slot_size, self.slot_padding,
+            getattr(player, 'coins', 0), getattr(player, 'experience', None), level, required_exp,
+            getattr(weapon, 'weapon_type', None),
+            len(inventory_items),
+            tuple((item.entity_type, item.name, item.is_disposed()) for item in inventory_items[:8]),
+        )
+
+    def _render_hud(self, screen, player, inventory_items):
+        """Draw the HUD onto a new surface the size of the inventory panel."""
         # Draw inventory background (slightly longer for text fit)
         slot_count = 8
         inventory_width = (self.slot_size + self.slot_padding) * slot_count + self.slot_padding + 75  # 8 slots + weapon icon + extra for text
         inventory_height = self.slot_size + 2 * self.slot_padding + 28  # Slightly more height for text
 
+        # Same pixel format as the screen, so blitting the cached HUD looks exactly like drawing it there
+        surface = pygame.Surface((inventory_width, inventory_height), 0, screen)
+
         # Background rectangle
-        inventory_rect = pygame.Rect(self.inventory_x, self.inventory_y, inventory_width, inventory_height)
-        pygame.draw.rect(screen, (50, 50, 50, 180), inventory_rect)
-        pygame.draw.rect(screen, (200, 200, 200), inventory_rect, 2)
+        inventory_rect = pygame.Rect(0, 0, inventory_width, inventory_height)
+        pygame.draw.rect(surface, (50, 50, 50, 180), inventory_rect)
+        pygame.draw.rect(surface, (200, 200, 200), inventory_rect, 2)
         
         # Draw title and experience bar/text beside it
-        title_text = font.render("Inventory", True, (255, 255, 255))
-        title_x = self.inventory_x + 5
-        title_y = self.inventory_y + 5
-        screen.blit(title_text, (title_x, title_y))
+        title_text = TextCache.render("Inventory", (255, 255, 255))
+        title_x = 5
+        title_y = 5
+        surface.blit(title_text, (title_x, title_y))
 
         if hasattr(player, 'experience') and hasattr(player, 'level'):
             exp = player.experience
             level = player.level
             required_exp = player.required_exp.get(level + 1, 100)
-            exp_text = font.render(f"EXP: {exp} / {required_exp}", True, (0, 191, 255))
+            exp_text = TextCache.render(f"EXP: {exp} / {required_exp}", (0, 191, 255))
             exp_text_x = title_x + title_text.get_width() + 20
             exp_text_y = title_y
-            screen.blit(exp_text, (exp_text_x, exp_text_y))
+            surface.blit(exp_text, (exp_text_x, exp_text_y))
             # Draw small experience bar beside exp text
             exp_bar_width = 80
             exp_bar_height = 10
             exp_bar_x = exp_text_x + exp_text.get_width() + 10
             exp_bar_y = exp_text_y + (title_text.get_height() - exp_bar_height) // 2
             exp_ratio = min(exp / required_exp, 1.0)
-            pygame.draw.rect(screen, (40, 40, 40), (exp_bar_x, exp_bar_y, exp_bar_width, exp_bar_height))
-            pygame.draw.rect(screen, (0, 128, 255), (exp_bar_x, exp_bar_y, int(exp_bar_width * exp_ratio), exp_bar_height))
+            pygame.draw.rect(surface, (40, 40, 40), (exp_bar_x, exp_bar_y, exp_bar_width, exp_bar_height))
+            pygame.draw.rect(surface, (0, 128, 255), (exp_bar_x, exp_bar_y, int(exp_bar_width * exp_ratio), exp_bar_height))
         
         # Draw inventory slots (now 12 slots for more space)
-        slot_y = self.inventory_y + 30
+        slot_y = 30
         for i in range(slot_count):  # Display up to 8 inventory slots
-            slot_x = self.inventory_x + self.slot_padding + i * (self.slot_size + self.slot_padding)
+            slot_x = self.slot_padding + i * (self.slot_size + self.slot_padding)
             # Draw slot background
             slot_rect = pygame.Rect(slot_x, slot_y, self.slot_size, self.slot_size)
-            pygame.draw.rect(screen, (80, 80, 80), slot_rect)
-            pygame.draw.rect(screen, (150, 150, 150), slot_rect, 1)
+            pygame.draw.rect(surface, (80, 80, 80), slot_rect)
+            pygame.draw.rect(surface, (150, 150, 150), slot_rect, 1)
             # Draw item if it exists
             if i < len(inventory_items):
                 item = inventory_items[i]
@@ -767,40 +1102,37 @@ class Inventory(UI):
                     item_size = self.slot_size - 8
                     item_x = slot_x + 4
                     item_y = slot_y + 4
-                    pygame.draw.rect(screen, item_color, (item_x, item_y, item_size, item_size))
+                    pygame.draw.rect(surface, item_color, (item_x, item_y, item_size, item_size))
                     # Draw item count or type indicator
                     if hasattr(item, 'name') and item.name:
                         # Show first letter of item name
-                        text = font.render(item.name[0].upper(), True, (0, 0, 0))
+                        text = TextCache.render(item.name[0].upper(), (0, 0, 0))
                         text_rect = text.get_rect(center=(slot_x + self.slot_size // 2, slot_y + self.slot_size // 2))
-                        screen.blit(text, text_rect)
+                        surface.blit(text, text_rect)
 
         # Draw weapon texture (if player has a weapon)
         weapon = getattr(player, 'weapon', None)
         if weapon and hasattr(weapon, 'weapon_type'):
-            import os
-            weapon_texture_path = os.path.join('textures', 'weapons', f'{weapon.weapon_type.name.lower()}.png')
-            try:
-                weapon_image = pygame.image.load(weapon_texture_path).convert_alpha()
-                weapon_image = pygame.transform.smoothscale(weapon_image, (32, 32))
-                # Place icon right after last slot
-                texture_x = self.inventory_x + self.slot_padding + slot_count * (self.slot_size + self.slot_padding)
-                texture_y = slot_y + (self.slot_size - 32) // 2
-                screen.blit(weapon_image, (texture_x, texture_y))
-            except Exception:
-                pass
-        
+            # Preloaded from statics.ASSET_MANIFEST, so drawing it never loads or scales anything
+            icon_size = statics.WEAPON_ICON_SIZE
+            weapon_image = ASSETS.get(weapon_icon_path(weapon.weapon_type), (icon_size, icon_size))
+            # Place icon right after last slot
+            texture_x = self.slot_padding + slot_count * (self.slot_size + self.slot_padding)
+            texture_y = slot_y + (self.slot_size - icon_size) // 2
+            surface.blit(weapon_image, (texture_x, texture_y))
+
         # Draw items count and coins count beside each other, top right
         items_count = len(inventory_items)
         coins_count = getattr(player, 'coins', 0)
-        count_text = font.render(f"Items: {items_count}", True, (255, 255, 255))
-        coin_text = font.render(f"Coins: {coins_count}", True, (255, 223, 0))
+        count_text = TextCache.render(f"Items: {items_count}", (255, 255, 255))
+        coin_text = TextCache.render(f"Coins: {coins_count}", (255, 223, 0))
         # Calculate widths for proper alignment
         total_width = count_text.get_width() + 12 + coin_text.get_width()
-        start_x = self.inventory_x + inventory_width - total_width - 10
-        y = self.inventory_y + 5
-        screen.blit(count_text, (start_x, y))
-        screen.blit(coin_text, (start_x + count_text.get_width() + 12, y))
+        start_x = inventory_width - total_width - 10
+        y = 5
+        surface.blit(count_text, (start_x, y))
+        surface.blit(coin_text, (start_x + count_text.get_width() + 12, y))
+        return surface
 
     def update(self):
         super().update()
@@ -812,6 +1144,8 @@ class Inventory(UI):
 
 
 class Player(Entity):
+    __slots__ = ("game_engine", "inventory", "coins", "invincibility_timer", "experience", "required_exp", "weapon")
+
     def __init__(self, game_engine:GameEngine, starting_pos=statics.PLAYER_STARTING_POSITION, name="Player", size=statics.PLAYER_SIZE):
         tile_size = statics.TILE_SIZE
         centered_pos = (starting_pos[0] + tile_size // 2, starting_pos[1] + tile_size // 2)
@@ -864,6 +1198,7 @@ class Player(Entity):
 
         self.x = new_x
         self.y = new_y
+        self.game_engine.game_logic.spatial_index.update(self)
 
     def level_up(self):
         """Levels up the player and increases health."""
@@ -888,42 +1223,86 @@ class Player(Entity):
             6: 800,
         }
         self.level = 1
+        self.game_engine.game_logic.spatial_index.update(self)
 
 
 class Enemy(Entity):
+    __slots__ = ("game_engine", "speed", "damage_cooldown", "exp_reward", "last_tick", "chasing")
+
     def __init__(self, game_engine: GameEngine, starting_pos=statics.ENEMY_STARTING_POSITION, name="Enemy", size=statics.ENEMY_SIZE, level: int=1, health: int=100):
         super().__init__(name=name, starting_pos=starting_pos, entity_type=EntityType.ENEMY, size=size, health=health, level=level)
         self.game_engine = game_engine
         self.speed = statics.ENEMY_SPEED 
         self.damage_cooldown = 0
         self.exp_reward = level * 10
+        self.last_tick = 0  # Enemy tick of the last update, see catch_up
+        self.chasing = False
 
-    def update(self):
-        """Updates the enemy's behavior."""
+    def catch_up(self, tick: int):
+        """Apply the cooldown ticks missed while dormant, so the enemy is as if it had been updated every tick.
+
+        Dormant enemies are outside the flow field window (see statics.ENEMY_WAKE_RADIUS), so a missed tick also
+        ended any chase.
+        """
+        if self.damage_cooldown > 0:
+            self.damage_cooldown = max(self.damage_cooldown - (tick - self.last_tick), 0)
+        if tick - self.last_tick > 1:
+            self.chasing = False
+        self.last_tick = tick
+
+    def update(self, tick: Optional[int] = None):
+        """Updates the enemy's behavior.
+
+        With a tick (see MapEngine.update_enemies) missed ticks are caught up first, otherwise exactly one tick passes.
+        """
         if not self.game_engine or not self.game_engine.game_logic or not self.game_engine.map_engine or not self.game_engine.map_engine.map_data:
             return
         if self.is_disposed():
             return
         
-        if self.damage_cooldown > 0:
+        if tick is not None:
+            self.catch_up(tick)
+        elif self.damage_cooldown > 0:
             self.damage_cooldown -= 1
         
         player = self.game_engine.player
         if player.is_disposed():
+            self.chasing = False
             return
         
         dx = player.x - self.x
         dy = player.y - self.y
         distance = (dx**2 + dy**2)**0.5
 
-        if distance < statics.ENEMY_AGGRO_RADIUS and distance > 0:
+        tile_size = statics.TILE_SIZE
+        flow_field = self.game_engine.map_engine.flow_field
+        # Chases start inside the aggro radius. Walking around an obstacle can lead back out of it,
+        # so a chase goes on while the flow field's way to the player stays short.
+        if distance < statics.ENEMY_AGGRO_RADIUS:
+            self.chasing = True
+        elif self.chasing:
+            steps = flow_field.distance(int(self.x // tile_size), int(self.y // tile_size))
+            self.chasing = 0 < steps <= statics.ENEMY_CHASE_STEPS
+
+        if self.chasing and distance > 0:
             dx_normalized = dx / distance
             dy_normalized = dy / distance
             
             new_x = self.x + dx_normalized * self.speed
             new_y = self.y + dy_normalized * self.speed
             
-            tile_size = statics.TILE_SIZE
+            # Head straight for the player unless that leads away along the flow field, then take its next step
+            current_tile_x = int(self.x // tile_size)
+            current_tile_y = int(self.y // tile_size)
+            if not flow_field.allows_step(current_tile_x, current_tile_y, int(new_x // tile_size), int(new_y // tile_size)):
+                next_tile = flow_field.next_tile(current_tile_x, current_tile_y)
+                if next_tile is not None:
+                    target_dx = next_tile[0] * tile_size + tile_size // 2 - self.x
+                    target_dy = next_tile[1] * tile_size + tile_size // 2 - self.y
+                    target_distance = (target_dx**2 + target_dy**2)**0.5
+                    new_x = self.x + target_dx / target_distance * self.speed
+                    new_y = self.y + target_dy / target_distance * self.speed
+
             if (new_x - self.size // 2 >= 0 and 
                 new_x + self.size // 2 < len(self.game_engine.map_engine.map_data[0]) * tile_size and
                 new_y - self.size // 2 >= 0 and 
@@ -938,12 +1317,13 @@ class Enemy(Entity):
                     if tile_type != 1:
                         self.x = new_x
                         self.y = new_y
+                        self.game_engine.game_logic.spatial_index.update(self)
             
             if distance < self.size and self.damage_cooldown <= 0 and player.invincibility_timer <= 0:
                 player.health -= statics.ENEMY_DAMAGE * self.level
                 self.damage_cooldown = statics.ATTACK_DURATION_FRAMES
                 if player.health <= 0:
-                    player.dispose()
+                    self.game_engine.game_logic.dispose_entity(player)
 
 
 
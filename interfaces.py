@@ -1,6 +1,8 @@
+from collections import OrderedDict
 from enum import Enum
 import pygame
 import statics
+from texture_atlas import TextureAtlas
 
 
 class AttackDirection(Enum):
@@ -38,21 +40,148 @@ class ImageCache:
     def get_image(cls, path):
         """Get cached image or load and cache it."""
         if path not in cls._cache:
-            try:
-                cls._cache[path] = pygame.image.load(path).convert_alpha()
-            except pygame.error:
-                # Return a default colored surface if image fails to load
-                cls._cache[path] = pygame.Surface((16, 16))
-                cls._cache[path].fill((255, 0, 255))  # Magenta for missing textures
+            cls._cache[path] = cls.load(path)
         return cls._cache[path]
 
+    @staticmethod
+    def load(path):
+        """Load an image without caching it, or a magenta stand-in if it cannot be loaded."""
+        try:
+            return pygame.image.load(path).convert_alpha()
+        except (pygame.error, FileNotFoundError):
+            # Return a default colored surface if image fails to load
+            image = pygame.Surface((16, 16))
+            image.fill((255, 0, 255))  # Magenta for missing textures
+            return image
+
     @classmethod
     def clear_cache(cls):
         """Clear all cached images."""
         cls._cache.clear()
 
 
+class FontCache:
+    """Registry of loaded fonts, shared so each font/size pair is only constructed once."""
+    _fonts = {}
+
+    @classmethod
+    def get_font(cls, size: int = statics.FONT_SIZE, name: str = statics.FONT_NAME):
+        """Get a cached font or load and cache it."""
+        key = (name, size)
+        font = cls._fonts.get(key)
+        if font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            try:
+                font = pygame.font.Font(name, size)
+            except (pygame.error, OSError):
+                font = pygame.font.SysFont(None, size)
+            cls._fonts[key] = font
+        return font
+
+    @classmethod
+    def clear_cache(cls):
+        """Clear all cached fonts."""
+        cls._fonts.clear()
+
+
+class TextCache:
+    """Bounded LRU cache of rendered text surfaces keyed on text, color and font size."""
+    _cache = OrderedDict()
+    max_entries = statics.TEXT_CACHE_SIZE
+
+    @classmethod
+    def render(cls, text: str, color, size: int = statics.FONT_SIZE, antialias: bool = True):
+        """Get a cached text surface or render and cache it."""
+        key = (text, tuple(color), size, antialias)
+        surface = cls._cache.get(key)
+        if surface is None:
+            surface = FontCache.get_font(size).render(text, antialias, color)
+            cls._cache[key] = surface
+            if len(cls._cache) > cls.max_entries:
+                cls._cache.popitem(last=False)
+        else:
+            cls._cache.move_to_end(key)
+        return surface
+
+    @classmethod
+    def clear_cache(cls):
+        """Clear all cached text surfaces."""
+        cls._cache.clear()
+
+
+# Entity types drawn with an atlas sprite; every other type is drawn as a colored rect
+ENTITY_SPRITES = {
+    EntityType.ITEM: "coin",
+    EntityType.HEALTH: "heart",
+}
+ENTITY_COLORS = {
+    EntityType.PLAYER: statics.PLAYER_COLOR,
+    EntityType.ENEMY: statics.ENEMY_COLOR,
+    EntityType.ITEM: statics.COIN_COLOR,
+    EntityType.NPC: statics.NPC_COLOR,
+}
+ENTITY_ATLAS = TextureAtlas(statics.ATLAS_SPRITES, ImageCache.load)
+
+
+def union_rects(*rects):
+    """Get the smallest rect covering the given non-empty rects, or None if all are empty or None."""
+    result = None
+    for rect in rects:
+        if rect:
+            result = rect if result is None else result.union(rect)
+    return result
+
+
+def draw_entity_batches(screen, camera, entities) -> list:
+    """Draw entities grouped by type and return the screen rects they touched.
+
+    Types are drawn in the order their first entity appears in entities, and
+    each type's sprites go out in one batched Surface.blits call from the
+    texture atlas. Rect-drawn types draw their rects first and then their
+    level labels in one batch. Looks the same as calling Entity.draw on each
+    entity, except that labels are no longer covered by rects of the same type.
+    """
+    screen_width, screen_height = screen.get_size()
+    tile_size = statics.TILE_SIZE
+    half_tile = tile_size // 2
+    camera_x = camera.x
+    camera_y = camera.y
+    batches = {}
+    for entity in entities:
+        entity_type = entity.entity_type
+        if entity_type is None:
+            continue
+        # Same culling as Entity._is_visible
+        center_x = entity.x // tile_size * tile_size + half_tile - camera_x
+        center_y = entity.y // tile_size * tile_size + half_tile - camera_y
+        half_size = entity.size // 2
+        if (center_x + half_size < 0 or center_x - half_size > screen_width or
+                center_y + half_size < 0 or center_y - half_size > screen_height):
+            continue
+        batch = batches.get(entity_type)
+        if batch is None:
+            batch = batches[entity_type] = []
+        batch.append((entity, center_x, center_y))
+
+    rects = []
+    for entity_type, batch in batches.items():
+        sprite = ENTITY_SPRITES.get(entity_type)
+        if sprite is not None:
+            rects += ENTITY_ATLAS.blit_many(screen, sprite, [(x, y) for _, x, y in batch])
+            continue
+        color = ENTITY_COLORS.get(entity_type, statics.COLOR_WHITE)
+        for entity, x, y in batch:
+            half_size = entity.size // 2
+            rects.append(pygame.draw.rect(screen, color, (x - half_size, y - half_size, entity.size, entity.size)))
+        rects += screen.blits([entity._level_blit(x, y) for entity, x, y in batch])
+    return rects
+
+
 class Entity:
+    # Slots instead of a per-instance __dict__ keep large populations small
+    __slots__ = ("name", "x", "y", "health", "entity_type", "size", "level")
+
     def __init__(self, name:str = "Entity", entity_type: EntityType = EntityType.NPC, starting_pos: tuple = (0, 0), size: int = statics.TILE_SIZE, health: int = 100, level: int = 1):
         self.name = name
         self.x, self.y = starting_pos
@@ -70,6 +199,7 @@ class Entity:
         return self.entity_type is None
 
     def draw(self, screen, camera):
+        """Draw the entity and return the screen rect it touched, or None if nothing was drawn."""
         # Don't draw disposed entities
         if self.entity_type is None:
             return
@@ -78,32 +208,20 @@ class Entity:
         if not self._is_visible(screen, camera):
             return
 
-        image = None
-        color = None
-
-        # Placeholder for drawing logic
-        if self.entity_type == EntityType.PLAYER:
-            color = statics.PLAYER_COLOR
-        elif self.entity_type == EntityType.ENEMY:
-            color = statics.ENEMY_COLOR
-        elif self.entity_type == EntityType.ITEM:
-            color = statics.COIN_COLOR
-            image = ImageCache.get_image(f'{statics.TEXTURES_ROOT}/coin16x16.png')
-        elif self.entity_type == EntityType.NPC:
-            color = statics.NPC_COLOR
-        elif self.entity_type == EntityType.HEALTH:
-            image = ImageCache.get_image(f'{statics.TEXTURES_ROOT}/hearth16x16.png')
-        else:
-            color = statics.COLOR_WHITE
-
-        # If we have an image, use draw_image method
-        if image is not None:
-            self.draw_image(screen, camera, image)
-            return
+        sprite = ENTITY_SPRITES.get(self.entity_type)
+        if sprite is not None:
+            return ENTITY_ATLAS.blit(screen, sprite, self._screen_center(camera))
 
         # Draw colored rectangle
-        self._draw_colored_rect(screen, camera, color)
-        self._draw_level(screen, camera)
+        rect = self._draw_colored_rect(screen, camera, ENTITY_COLORS.get(self.entity_type, statics.COLOR_WHITE))
+        level_rect = self._draw_level(screen, camera)
+        return union_rects(rect, level_rect)
+
+    def _screen_center(self, camera):
+        """Get the screen position of the center of the entity's tile, where it is drawn."""
+        tile_size = statics.TILE_SIZE
+        return (self.x // tile_size * tile_size + tile_size // 2 - camera.x,
+                self.y // tile_size * tile_size + tile_size // 2 - camera.y)
 
     def _is_visible(self, screen, camera):
         """Check if entity is within camera range."""
@@ -141,7 +259,7 @@ class Entity:
         draw_x = screen_center_x - entity_half_size
         draw_y = screen_center_y - entity_half_size
 
-        pygame.draw.rect(screen, color, (draw_x, draw_y, self.size, self.size))
+        return pygame.draw.rect(screen, color, (draw_x, draw_y, self.size, self.size))
 
     def draw_image(self, screen, camera, image):
         """Draw the entity using a specific image."""
@@ -163,7 +281,7 @@ class Entity:
         draw_y = screen_center_y - entity_half_size
 
         image_rect = image.get_rect(center=(draw_x + entity_half_size, draw_y + entity_half_size))
-        screen.blit(image, image_rect)
+        return screen.blit(image, image_rect)
 
     def check_collision(self, other_entity):
         """Check if this entity collides with another entity."""
@@ -196,33 +314,17 @@ class Entity:
         """Draw the entity's level above its sprite."""
         if self.entity_type is None:
             return
-        font = pygame.font.Font(statics.FONT_NAME, statics.FONT_SIZE)
-        if not font:
-            font = pygame.font.SysFont(None, 16)
+        return screen.blit(*self._level_blit(*self._screen_center(camera)))
+
+    def _level_blit(self, screen_center_x, screen_center_y):
+        """Get the level text surface and the rect it is drawn at for an entity drawn at the given screen center."""
         if self.entity_type == EntityType.PLAYER:
-            level_text = font.render(f"level: {self.level}", True, (255, 255, 255))
+            level_text = TextCache.render(f"level: {self.level}", (255, 255, 255))
             # Draw above health bar (health bar is 2px above entity, 5px tall, so 10px above that)
-            tile_size = statics.TILE_SIZE
-            tile_x = self.x // tile_size
-            tile_y = self.y // tile_size
-            tile_center_x = tile_x * tile_size + tile_size // 2
-            tile_center_y = tile_y * tile_size + tile_size // 2
-            screen_center_x = tile_center_x - camera.x
-            screen_center_y = tile_center_y - camera.y
             draw_y = screen_center_y - self.size // 2 - 5 - 2 - 10  # health bar height + offset + 10px above
-            text_rect = level_text.get_rect(center=(screen_center_x, draw_y))
-            screen.blit(level_text, text_rect)
-        else:
-            level_text = font.render(str(self.level), True, (255, 255, 255))
-            tile_size = statics.TILE_SIZE
-            tile_x = self.x // tile_size
-            tile_y = self.y // tile_size
-            tile_center_x = tile_x * tile_size + tile_size // 2
-            tile_center_y = tile_y * tile_size + tile_size // 2
-            screen_center_x = tile_center_x - camera.x
-            screen_center_y = tile_center_y - camera.y
-            text_rect = level_text.get_rect(center=(screen_center_x, screen_center_y - self.size // 2 - 10))
-            screen.blit(level_text, text_rect)
+            return level_text, level_text.get_rect(center=(screen_center_x, draw_y))
+        level_text = TextCache.render(str(self.level), (255, 255, 255))
+        return level_text, level_text.get_rect(center=(screen_center_x, screen_center_y - self.size // 2 - 10))
 
     def draw_health_bar(self, screen, camera):
         # Don't draw health bar for disposed entities
@@ -245,9 +347,11 @@ class Entity:
         # Move health bar closer to entity (just above, not far)
         draw_x = screen_center_x - health_bar_width // 2
         draw_y = screen_center_y - self.size // 2 - health_bar_height - 2  # 2 pixels above entity
-        pygame.draw.rect(screen, (0, 0, 0), (draw_x, draw_y, health_bar_width, health_bar_height))
-        pygame.draw.rect(screen, health_bar_color, (draw_x, draw_y, health_bar_width * health_ratio, health_bar_height))
+        background_rect = pygame.draw.rect(screen, (0, 0, 0), (draw_x, draw_y, health_bar_width, health_bar_height))
+        # Health above 100 draws past the background, so the touched area is the union of both
+        bar_rect = pygame.draw.rect(screen, health_bar_color, (draw_x, draw_y, health_bar_width * health_ratio, health_bar_height))
         # ...health bar drawing only, no level drawing here...
+        return union_rects(background_rect, bar_rect)
     
     def dispose(self):
         """Clean up resources and reset entity state."""
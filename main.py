@@ -1,8 +1,12 @@
+import os
+import time
 import pygame
 import statics
 from game_engine import GameEngine, Weapon, WeaponType, AttackPattern
 from interfaces import EntityType, AttackDirection
 from define_additional_content import main as define_additional_content_main
+from replay import (InputRecorder, apply_commands, COMMAND_MOVE, COMMAND_ATTACK, COMMAND_CHANGE_WEAPON,
+                    COMMAND_RESET_PLAYER, COMMAND_TOGGLE_INVENTORY)
 
 
 def main():
@@ -32,9 +36,19 @@ def main():
 
     # game_engine.map_engine.print_map()
 
+    recorder = InputRecorder()
+
+    def save_recording():
+        # Written in the background like quicksaves
+        game_engine.snapshot_writer.write(statics.RECORDING_PATH, recorder.stop(game_engine).to_bytes())
+
+    scheduler = game_engine.scheduler
+    profiler = game_engine.map_engine.profiler
+    # Gameplay inputs become commands, so a recording replays exactly what was applied
+    commands = []
     running = True
     while running:
-        attack = AttackDirection.NONE
+        ticks = scheduler.begin_frame()
         keys = pygame.key.get_pressed()
         
         for event in pygame.event.get():
@@ -45,40 +59,69 @@ def main():
                     running = False
                 # Z + Arrow keys for double speed movement
                 elif keys[pygame.K_z] and event.key == pygame.K_RIGHT:
-                    game_engine.player.move(statics.PLAYER_SPEED * 2, 0)
+                    commands.append((COMMAND_MOVE, statics.PLAYER_SPEED * 2, 0))
                 elif keys[pygame.K_z] and event.key == pygame.K_LEFT:
-                    game_engine.player.move(-statics.PLAYER_SPEED * 2, 0)
+                    commands.append((COMMAND_MOVE, -statics.PLAYER_SPEED * 2, 0))
                 elif keys[pygame.K_z] and event.key == pygame.K_UP:
-                    game_engine.player.move(0, -statics.PLAYER_SPEED * 2)
+                    commands.append((COMMAND_MOVE, 0, -statics.PLAYER_SPEED * 2))
                 elif keys[pygame.K_z] and event.key == pygame.K_DOWN:
-                    game_engine.player.move(0, statics.PLAYER_SPEED * 2)
+                    commands.append((COMMAND_MOVE, 0, statics.PLAYER_SPEED * 2))
                 # X + Arrow keys for attacks
                 elif keys[pygame.K_x] and event.key == pygame.K_RIGHT:
-                    attack = AttackDirection.RIGHT
+                    commands.append((COMMAND_ATTACK, AttackDirection.RIGHT.value, 0))
                 elif keys[pygame.K_x] and event.key == pygame.K_LEFT:
-                    attack = AttackDirection.LEFT
+                    commands.append((COMMAND_ATTACK, AttackDirection.LEFT.value, 0))
                 elif keys[pygame.K_x] and event.key == pygame.K_UP:
-                    attack = AttackDirection.UP
+                    commands.append((COMMAND_ATTACK, AttackDirection.UP.value, 0))
                 elif keys[pygame.K_x] and event.key == pygame.K_DOWN:
-                    attack = AttackDirection.DOWN
+                    commands.append((COMMAND_ATTACK, AttackDirection.DOWN.value, 0))
                 elif event.key == pygame.K_LEFT:
-                    game_engine.player.move(-statics.PLAYER_SPEED, 0)
+                    commands.append((COMMAND_MOVE, -statics.PLAYER_SPEED, 0))
                 elif event.key == pygame.K_RIGHT:
-                    game_engine.player.move(statics.PLAYER_SPEED, 0)
+                    commands.append((COMMAND_MOVE, statics.PLAYER_SPEED, 0))
                 elif event.key == pygame.K_UP:
-                    game_engine.player.move(0, -statics.PLAYER_SPEED)
+                    commands.append((COMMAND_MOVE, 0, -statics.PLAYER_SPEED))
                 elif event.key == pygame.K_DOWN:
-                    game_engine.player.move(0, statics.PLAYER_SPEED)
+                    commands.append((COMMAND_MOVE, 0, statics.PLAYER_SPEED))
                 elif event.key == pygame.K_r:
-                    game_engine.reset_player()
+                    commands.append((COMMAND_RESET_PLAYER, 0, 0))
                 elif event.key == pygame.K_i:
-                    game_engine.player.inventory.toggle_inventory()
+                    commands.append((COMMAND_TOGGLE_INVENTORY, 0, 0))
                 elif event.key == pygame.K_w:
-                    game_engine.game_logic.change_weapon()
-
-        game_engine.map_engine.update(attack_direction=attack)
-
-
+                    commands.append((COMMAND_CHANGE_WEAPON, 0, 0))
+                elif event.key == pygame.K_F3:
+                    game_engine.map_engine.profiler.toggle_overlay()
+                elif event.key == pygame.K_F4:
+                    game_engine.map_engine.profiler.capture_frames()
+                elif event.key == pygame.K_F5:
+                    game_engine.save_snapshot()
+                elif event.key == pygame.K_F6:
+                    if recorder.active:
+                        save_recording()
+                    else:
+                        recorder.start(game_engine)
+                elif event.key == pygame.K_F9 and os.path.exists(statics.SNAPSHOT_PATH):
+                    # Loading is not an input a recording can replay, so it ends the recording
+                    if recorder.active:
+                        save_recording()
+                    game_engine.load_snapshot()
+
+        frame_start = time.perf_counter()
+        # Inputs go to the next logic tick, a frame without one keeps them for the next frame
+        for _ in range(ticks):
+            attack = apply_commands(game_engine, commands)
+            game_engine.step(attack)
+            recorder.record_frame(game_engine, commands)
+            commands = []
+        game_engine.render()
+        if profiler.enabled:
+            profiler.record("frame", (time.perf_counter() - frame_start) * 1000)
+        # Sleeps off the rest of the frame, after spending some of it on deferred work
+        scheduler.end_frame()
+
+    if recorder.active:
+        save_recording()
+    game_engine.snapshot_writer.close()
     pygame.quit()
 
 
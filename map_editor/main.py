@@ -5,7 +5,6 @@ import os
 # Add parent directory to path to import from parent package
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from interfaces import AttackDirection
 from game_engine import GameEngine
 import statics
 from map_editor import MapEditor
@@ -28,13 +27,24 @@ def main():
     import os
     os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-    game_engine.map_engine.load_map(map_name)
+    # Edits are journaled beside the map file, and a journal left by a crash is replayed here
+    map_editor.open_map(map_name)
 
     running = True
     selected_tile = None
+    tool = "brush"  # brush, rect or fill
+    brush_radius = statics.EDITOR_BRUSH_RADIUS
+    last_tile = None  # Tile the brush was last painted on while dragging
+    drag_start = None  # Corner tile of the rectangle being dragged out
+    copy_start = None
 
+    def mouse_tile():
+        mouse_x, mouse_y = pygame.mouse.get_pos()
+        return (mouse_x + game_engine.camera.x) // statics.TILE_SIZE, (mouse_y + game_engine.camera.y) // statics.TILE_SIZE
+
+    scheduler = game_engine.scheduler
     while running:
-        attack = AttackDirection.NONE
+        ticks = scheduler.begin_frame()
         keys = pygame.key.get_pressed()
 
         for event in pygame.event.get():
@@ -61,21 +71,63 @@ def main():
                     selected_tile = 3
                 elif ctrls := pygame.key.get_mods() & pygame.KMOD_CTRL:
                     if event.key == pygame.K_s:
-                        # Save the current map
-                        game_engine.map_engine.save_map(map_name)
+                        # Fold the journal into the map file in the background
+                        map_editor.save()
+                    elif event.key == pygame.K_z:
+                        map_editor.undo()
+                    elif event.key == pygame.K_y:
+                        map_editor.redo()
+                    elif event.key == pygame.K_v:
+                        map_editor.paste(*mouse_tile())
+                elif event.key == pygame.K_b:
+                    tool = "brush"
+                elif event.key == pygame.K_r:
+                    tool = "rect"
+                elif event.key == pygame.K_f:
+                    tool = "fill"
+                elif event.key == pygame.K_LEFTBRACKET:
+                    brush_radius = max(brush_radius - 1, 0)
+                elif event.key == pygame.K_RIGHTBRACKET:
+                    brush_radius = min(brush_radius + 1, statics.EDITOR_MAX_BRUSH_RADIUS)
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                if event.button == 1:  # Left mouse button
-                    mouse_x, mouse_y = pygame.mouse.get_pos()
-                    tile_x = (mouse_x + game_engine.camera.x) // statics.TILE_SIZE
-                    tile_y = (mouse_y + game_engine.camera.y) // statics.TILE_SIZE
-                    if selected_tile is not None:
-                        map_editor.change_tile(tile_x, tile_y, selected_tile)
-
-        game_engine.map_engine.update()
-
-        
-        pygame.display.flip()
-
+                tile_x, tile_y = mouse_tile()
+                if event.button == 1 and selected_tile is not None:  # Left mouse button
+                    if tool == "brush":
+                        # A whole drag is one undo step
+                        map_editor.begin_stroke()
+                        map_editor.paint(tile_x, tile_y, selected_tile, brush_radius)
+                        last_tile = (tile_x, tile_y)
+                    elif tool == "rect":
+                        drag_start = (tile_x, tile_y)
+                    elif tool == "fill":
+                        map_editor.flood_fill(tile_x, tile_y, selected_tile)
+                elif event.button == 3:  # Right mouse drag copies a region
+                    copy_start = (tile_x, tile_y)
+            elif event.type == pygame.MOUSEMOTION:
+                if last_tile is not None:
+                    tile = mouse_tile()
+                    if tile != last_tile:
+                        map_editor.paint(*tile, selected_tile, brush_radius, from_tile=last_tile)
+                        last_tile = tile
+            elif event.type == pygame.MOUSEBUTTONUP:
+                tile_x, tile_y = mouse_tile()
+                if event.button == 1:
+                    if last_tile is not None:
+                        map_editor.end_stroke()
+                        last_tile = None
+                    if drag_start is not None:
+                        map_editor.fill_rect(*drag_start, tile_x, tile_y, selected_tile)
+                        drag_start = None
+                elif event.button == 3 and copy_start is not None:
+                    map_editor.copy_region(*copy_start, tile_x, tile_y)
+                    copy_start = None
+
+        for _ in range(ticks):
+            game_engine.step()
+        game_engine.render()
+        scheduler.end_frame()
+
+    map_editor.close()
     pygame.quit()
 
 
@@ -1,20 +1,197 @@
 import pygame
 import sys
 import os
+from array import array
+from concurrent.futures import Future
+from typing import Optional
 # Add parent directory to path to import from parent package
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from interfaces import AttackDirection
 from game_engine import GameEngine
+from map_journal import MapJournal, TileEdits
+import tile_ops
+import statics
+
+try:
+    import numpy as np
+except ImportError:  # Bulk edits fall back to plain loops
+    np = None
 
 
 
 class MapEditor:
     def __init__(self, game_engine: GameEngine):
         self.game_engine = game_engine
+        self.journal: Optional[MapJournal] = None
+        self.undo_stack: list[TileEdits] = []
+        self.redo_stack: list[TileEdits] = []
+        self.clipboard: Optional[tile_ops.TileRegion] = None
+        self._stroke: Optional[list[TileEdits]] = None  # Edits of the brush stroke in progress
+
+    def open_map(self, map_name: str) -> None:
+        """
+        Load a map for editing and replay the edit journal an earlier session left next to it.
+        """
+        self.close()
+        map_engine = self.game_engine.map_engine
+        map_engine.load_map(map_name)
+        self.journal = MapJournal(f"{statics.MAPS_ROOT}/{map_name}")
+        if self.journal.replay(map_engine.map_data):
+            map_engine.invalidate_screen()
+        self.journal.open()
+        self.undo_stack.clear()
+        self.redo_stack.clear()
 
     def change_tile(self, tile_x: int, tile_y: int, new_tile_type: int) -> None:
         """
         Change the tile at the specified coordinates to a new tile type.
         """
+        map_data = self.game_engine.map_engine.map_data
+        in_bounds = bool(map_data) and 0 <= tile_y < len(map_data) and 0 <= tile_x < len(map_data[0])
+        old_tile_type = map_data[tile_y][tile_x] if in_bounds else None
         self.game_engine.map_engine.change_tile(tile_x, tile_y, new_tile_type)
+        if old_tile_type != new_tile_type:
+            self._record(TileEdits.single(tile_x, tile_y, old_tile_type, new_tile_type))
+
+    def paint(self, tile_x: int, tile_y: int, new_tile_type: int, radius: int = statics.EDITOR_BRUSH_RADIUS,
+              from_tile: Optional[tuple[int, int]] = None) -> None:
+        """
+        Paint a round brush of the given radius on a tile, or along the line to it from from_tile while dragging.
+        """
+        start_x, start_y = from_tile if from_tile is not None else (tile_x, tile_y)
+        tile_xs, tile_ys = tile_ops.brush_tiles(self.game_engine.map_engine.map_data, start_x, start_y, tile_x, tile_y, radius)
+        self.change_tiles(tile_xs, tile_ys, new_tile_type)
+
+    def begin_stroke(self) -> None:
+        """
+        Group the edits made until end_stroke() into one undo step, like a drag of the brush.
+        """
+        self.end_stroke()
+        self._stroke = []
+
+    def end_stroke(self) -> None:
+        stroke, self._stroke = self._stroke, None
+        if stroke:
+            merged = TileEdits(array("I"), array("I"), array("H"), array("H"))
+            for edits in stroke:
+                for column, part in zip(merged, edits):
+                    column.extend(part)
+            self.undo_stack.append(merged)
+
+    def fill_rect(self, x0: int, y0: int, x1: int, y1: int, new_tile_type: int) -> None:
+        """
+        Fill the rectangle between two corner tiles, both included.
+        """
+        tile_xs, tile_ys = tile_ops.rect_tiles(self.game_engine.map_engine.map_data, x0, y0, x1, y1)
+        self.change_tiles(tile_xs, tile_ys, new_tile_type)
+
+    def flood_fill(self, tile_x: int, tile_y: int, new_tile_type: int) -> None:
+        """
+        Replace the connected area of tiles of the same type as the given one with a new tile type.
+        """
+        map_data = self.game_engine.map_engine.map_data
+        if not map_data or not (0 <= tile_y < len(map_data) and 0 <= tile_x < len(map_data[0])):
+            return
+        if map_data[tile_y][tile_x] == new_tile_type:
+            return
+        tile_xs, tile_ys = tile_ops.flood_fill_tiles(map_data, tile_x, tile_y)
+        self.change_tiles(tile_xs, tile_ys, new_tile_type)
+
+    def copy_region(self, x0: int, y0: int, x1: int, y1: int) -> None:
+        """
+        Copy the rectangle between two corner tiles to the clipboard.
+        """
+        self.clipboard = tile_ops.TileRegion.copy_from(self.game_engine.map_engine.map_data, x0, y0, x1, y1)
+
+    def paste(self, tile_x: int, tile_y: int) -> None:
+        """
+        Paste the clipboard with its top-left corner on a tile.
+        """
+        if self.clipboard is None:
+            return
+        tile_xs, tile_ys, tile_types = self.clipboard.paste_tiles(self.game_engine.map_engine.map_data, tile_x, tile_y)
+        self.change_tiles(tile_xs, tile_ys, tile_types)
+
+    def change_tiles(self, tile_xs, tile_ys, new_tile_types) -> None:
+        """
+        Change many tiles as one edit: a single batched write, cache invalidation, journal block and undo step.
+        """
+        if not len(tile_xs):
+            return
+        old_tile_types = self.game_engine.map_engine.change_tiles(tile_xs, tile_ys, new_tile_types)
+        if isinstance(new_tile_types, int):
+            new_tile_types = array("H", [new_tile_types]) * len(tile_xs)
+        edits = TileEdits(array("I", tile_xs), array("I", tile_ys), old_tile_types, array("H", new_tile_types))
+        # Only tiles that really changed are recorded, a brush passing over painted tiles records nothing
+        if np is not None:
+            changed = np.flatnonzero(np.asarray(edits.old) != np.asarray(edits.new))
+            if len(changed) < len(edits.xs):
+                edits = TileEdits(*(array(column.typecode, np.asarray(column)[changed].tobytes()) for column in edits))
+        else:
+            changed = [index for index, (old, new) in enumerate(zip(edits.old, edits.new)) if old != new]
+            if len(changed) < len(edits.xs):
+                edits = TileEdits(*(array(column.typecode, [column[index] for index in changed]) for column in edits))
+        if len(edits.xs):
+            self._record(edits)
+
+    def undo(self) -> bool:
+        """
+        Revert the last edit. Returns whether there was one.
+        """
+        self.end_stroke()
+        if not self.undo_stack:
+            return False
+        edits = self.undo_stack.pop()
+        self._apply(edits.inverted())
+        self.redo_stack.append(edits)
+        return True
+
+    def redo(self) -> bool:
+        """
+        Apply the last undone edit again. Returns whether there was one.
+        """
+        self.end_stroke()
+        if not self.redo_stack:
+            return False
+        edits = self.redo_stack.pop()
+        self._apply(edits)
+        self.undo_stack.append(edits)
+        return True
+
+    def save(self) -> Optional[Future]:
+        """
+        Fold the journal into the map file on a background thread.
+        """
+        if self.journal is None:
+            return None
+        return self.journal.compact(self.game_engine.map_engine.map_data)
+
+    def close(self) -> None:
+        """
+        Save the map, wait for it to be written and close the journal.
+        """
+        self.end_stroke()
+        if self.journal is None:
+            return
+        self.save()
+        self.journal.close()
+        self.journal = None
+
+    def _apply(self, edits: TileEdits) -> None:
+        self.game_engine.map_engine.change_tiles(edits.xs, edits.ys, edits.new)
+        self._journal(edits)
+
+    def _record(self, edits: TileEdits) -> None:
+        if self._stroke is not None:
+            self._stroke.append(edits)
+        else:
+            self.undo_stack.append(edits)
+        self.redo_stack.clear()
+        self._journal(edits)
 
+    def _journal(self, edits: TileEdits) -> None:
+        if self.journal is None:
+            return
+        self.journal.append(edits)
+        if self.journal.needs_compaction():
+            self.save()
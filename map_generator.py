@@ -0,0 +1,106 @@
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import statics
+import map_io
+
+try:
+    import numpy as np
+except ImportError:  # The pure Python generator is used instead
+    np = None
+
+# Tile ids: 0 = grass, 1 = water, 2 = mountain, 3 = forest.
+# A uniform roll below a band's threshold picks the tile at the same position.
+CENTER_THRESHOLDS = (0.6, 0.8, 0.9)
+CENTER_TILES = (0, 3, 1, 2)  # Center areas more likely to be traversable
+OUTER_THRESHOLDS = (0.3, 0.5, 0.8)
+OUTER_TILES = (2, 1, 3, 0)  # Outer areas more likely to be mountains or water
+OUTER_RADIUS_RATIO = 0.3  # Tiles further than width * ratio from the center use the outer band
+ROLL_RESOLUTION = 100  # Thresholds must be multiples of 1 / ROLL_RESOLUTION
+
+
+def _pick_tile(roll: float, thresholds, tiles) -> int:
+    for threshold, tile in zip(thresholds, tiles):
+        if roll < threshold:
+            return tile
+    return tiles[-1]
+
+
+def _roll_table():
+    # Rolls are drawn as integers in [0, ROLL_RESOLUTION), so the tile for every
+    # roll of both bands fits in one lookup table indexed by band * ROLL_RESOLUTION + roll.
+    table = [_pick_tile(roll / ROLL_RESOLUTION, CENTER_THRESHOLDS, CENTER_TILES) for roll in range(ROLL_RESOLUTION)]
+    table += [_pick_tile(roll / ROLL_RESOLUTION, OUTER_THRESHOLDS, OUTER_TILES) for roll in range(ROLL_RESOLUTION)]
+    return np.asarray(table, dtype=np.uint8)
+
+
+def generate_chunk(entropy: int, chunk_index: int, width: int, height: int, chunk_rows: int) -> bytes:
+    """Generate rows [chunk_index * chunk_rows, ...) of the terrain as uint8 tile bytes.
+
+    Each chunk draws from its own Generator seeded from (entropy, chunk_index),
+    so chunks can be generated in any order or process with the same result.
+    """
+    start_y = chunk_index * chunk_rows
+    end_y = min(start_y + chunk_rows, height)
+    rng = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(chunk_index,)))
+    rolls = rng.random((end_y - start_y, width), dtype=np.float32)
+    rolls *= ROLL_RESOLUTION
+    index = rolls.astype(np.uint8)
+
+    xs = np.arange(width, dtype=np.float64) - width // 2
+    ys = np.arange(start_y, end_y, dtype=np.float64)[:, None] - height // 2
+    outer_radius = width * OUTER_RADIUS_RATIO
+    outer = (xs * xs + ys * ys) > outer_radius * outer_radius
+    index += outer.view(np.uint8) * np.uint8(ROLL_RESOLUTION)
+    return _roll_table()[index].tobytes()
+
+
+def generate_terrain(seed=None, width: int = 20, height: int = 20, workers: int = statics.MAPGEN_WORKERS,
+                     chunk_rows: int = statics.MAPGEN_CHUNK_ROWS) -> map_io.TileGrid:
+    """Generate a terrain map as a TileGrid without touching the global random module.
+
+    The map is built in bands of chunk_rows rows, each with its own seed derived from
+    seed, so the result for a given seed does not depend on workers. workers=0 uses
+    every CPU for maps of at least statics.MAPGEN_PARALLEL_MIN_TILES tiles and the
+    current process otherwise. Without NumPy a slower pure Python generator is used,
+    which is deterministic too but produces different maps for the same seed.
+    """
+    if np is None:
+        return _generate_terrain_python(seed, width, height)
+
+    entropy = np.random.SeedSequence(seed).entropy
+    num_chunks = (height + chunk_rows - 1) // chunk_rows
+    if workers == 0:
+        workers = (os.cpu_count() or 1) if width * height >= statics.MAPGEN_PARALLEL_MIN_TILES else 1
+    workers = max(1, min(workers, num_chunks))
+
+    tiles = bytearray(width * height)
+    chunk_bytes = chunk_rows * width
+    if workers == 1:
+        chunks = (generate_chunk(entropy, index, width, height, chunk_rows) for index in range(num_chunks))
+        for index, chunk in enumerate(chunks):
+            tiles[index * chunk_bytes:index * chunk_bytes + len(chunk)] = chunk
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = executor.map(generate_chunk, [entropy] * num_chunks, range(num_chunks),
+                                  [width] * num_chunks, [height] * num_chunks, [chunk_rows] * num_chunks)
+            for index, chunk in enumerate(chunks):
+                tiles[index * chunk_bytes:index * chunk_bytes + len(chunk)] = chunk
+    return map_io.TileGrid(width, height, tiles)
+
+
+def _generate_terrain_python(seed, width: int, height: int) -> map_io.TileGrid:
+    rng = random.Random(seed)
+    tiles = bytearray(width * height)
+    outer_radius = width * OUTER_RADIUS_RATIO
+    for y in range(height):
+        offset = y * width
+        for x in range(width):
+            # Use position-based probability for varied terrain
+            distance_from_center = ((x - width // 2) ** 2 + (y - height // 2) ** 2) ** 0.5
+            if distance_from_center > outer_radius:
+                tiles[offset + x] = _pick_tile(rng.random(), OUTER_THRESHOLDS, OUTER_TILES)
+            else:
+                tiles[offset + x] = _pick_tile(rng.random(), CENTER_THRESHOLDS, CENTER_TILES)
+    return map_io.TileGrid(width, height, tiles)
@@ -0,0 +1,186 @@
+import argparse
+import mmap
+import os
+import struct
+from array import array
+
+import statics
+
+# Binary map layout: a fixed little-endian header followed by width * height
+# row-major tiles of the header's dtype.
+#   magic (4s) | version (H) | dtype typecode (c) | pad (x) | width (I) | height (I)
+BINARY_MAP_MAGIC = b"LMAP"
+BINARY_MAP_VERSION = 1
+BINARY_MAP_HEADER = struct.Struct("<4sHcxII")
+TILE_TYPECODES = {"B": 1, "H": 2}  # uint8 and uint16 tiles
+
+
+class TileGrid:
+    """Compact row-major tile grid stored in one flat buffer.
+
+    Behaves like the list of lists maps used to be: grid[y][x] reads and
+    writes a tile, len(grid) is the height, len(grid[0]) the width and
+    iterating yields rows. The buffer can be a bytearray, an array or a
+    memory-mapped file, so binary maps open without being parsed.
+    """
+
+    def __init__(self, width: int, height: int, buffer=None, typecode: str = "B", offset: int = 0):
+        if typecode not in TILE_TYPECODES:
+            raise ValueError(f"Unsupported tile typecode '{typecode}'.")
+        if buffer is None:
+            buffer = bytearray(width * height * TILE_TYPECODES[typecode])
+        self.width = width
+        self.height = height
+        self.typecode = typecode
+        self._buffer = buffer  # Keeps an mmap alive while views exist
+        size = width * height * TILE_TYPECODES[typecode]
+        self.tiles = memoryview(buffer).cast("B")[offset:offset + size].cast(typecode)
+        self._rows = [self.tiles[y * width:(y + 1) * width] for y in range(height)]
+
+    @classmethod
+    def from_rows(cls, rows) -> "TileGrid":
+        """Build a grid from a list of equally long rows of tile ids."""
+        height = len(rows)
+        width = len(rows[0]) if height else 0
+        values = []
+        for row in rows:
+            if len(row) != width:
+                raise ValueError("All map rows must have the same length.")
+            values.extend(row)
+        typecode = "B" if not values or max(values) < 256 else "H"
+        return cls(width, height, array(typecode, values), typecode)
+
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, y):
+        return self._rows[y]
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def tobytes(self) -> bytes:
+        return self.tiles.tobytes()
+
+    def copy(self) -> "TileGrid":
+        """Get an independent in-memory copy of the grid."""
+        return TileGrid(self.width, self.height, bytearray(self.tiles.cast("B")), self.typecode)
+
+    def close(self):
+        """Release the buffer. The grid must not be used afterwards."""
+        self._rows = []
+        self.tiles.release()
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+
+def is_binary_map(path: str) -> bool:
+    """Check whether a map file is in the binary format."""
+    with open(path, "rb") as f:
+        return f.read(len(BINARY_MAP_MAGIC)) == BINARY_MAP_MAGIC
+
+
+def read_binary_map(path: str) -> TileGrid:
+    """Memory-map a binary map file. Edits to the grid are never written back to the file."""
+    with open(path, "rb") as f:
+        header = f.read(BINARY_MAP_HEADER.size)
+        if len(header) < BINARY_MAP_HEADER.size:
+            raise ValueError(f"'{path}' is too short to be a binary map.")
+        magic, version, typecode, width, height = BINARY_MAP_HEADER.unpack(header)
+        if magic != BINARY_MAP_MAGIC:
+            raise ValueError(f"'{path}' is not a binary map.")
+        if version != BINARY_MAP_VERSION:
+            raise ValueError(f"Unsupported binary map version {version}.")
+        typecode = typecode.decode("ascii")
+        if typecode not in TILE_TYPECODES:
+            raise ValueError(f"Unsupported tile typecode '{typecode}'.")
+        expected_size = BINARY_MAP_HEADER.size + width * height * TILE_TYPECODES[typecode]
+        if os.fstat(f.fileno()).st_size < expected_size:
+            raise ValueError(f"'{path}' is truncated.")
+        if width * height == 0:
+            return TileGrid(width, height, typecode=typecode)
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    return TileGrid(width, height, mapped, typecode, offset=BINARY_MAP_HEADER.size)
+
+
+def read_text_map(path: str) -> TileGrid:
+    """Read a map stored as whitespace separated tile ids, one row per line."""
+    with open(path, "r") as f:
+        rows = [list(map(int, line.split())) for line in f if line.strip()]
+    return TileGrid.from_rows(rows)
+
+
+def read_map(path: str) -> TileGrid:
+    """Read a map file, detecting its format from its contents."""
+    if is_binary_map(path):
+        return read_binary_map(path)
+    return read_text_map(path)
+
+
+def as_grid(map_data) -> TileGrid:
+    """Get map data as a TileGrid, converting a list of rows. A TileGrid is returned as is, not copied."""
+    return map_data if isinstance(map_data, TileGrid) else TileGrid.from_rows(map_data)
+
+
+def replace_file(path: str, write):
+    """Replace a file atomically with what write(f) writes to a binary file object.
+
+    The data is written next to the target and swapped in, so a mapped or
+    half-written file is never left behind.
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        write(f)
+    os.replace(temp_path, path)
+
+
+def write_binary_map(path: str, map_data):
+    """Write a map in the binary format."""
+    grid = as_grid(map_data)
+
+    def write(f):
+        f.write(BINARY_MAP_HEADER.pack(BINARY_MAP_MAGIC, BINARY_MAP_VERSION, grid.typecode.encode("ascii"),
+                                       grid.width, grid.height))
+        f.write(grid.tiles.cast("B"))
+
+    replace_file(path, write)
+
+
+def write_text_map(path: str, map_data):
+    """Write a map as whitespace separated tile ids, one row per line."""
+    def write(f):
+        for row in map_data:
+            if isinstance(row, int):
+                f.write(f"{row}\n".encode("ascii"))
+            else:
+                f.write((' '.join(map(str, row)) + '\n').encode("ascii"))
+
+    replace_file(path, write)
+
+
+def write_map(path: str, map_data, binary: bool = None):
+    """Write a map. By default the format follows the file extension."""
+    if binary is None:
+        binary = path.endswith(statics.BINARY_MAP_EXTENSION)
+    if binary:
+        write_binary_map(path, map_data)
+    else:
+        write_text_map(path, map_data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert map files between the text and binary formats.")
+    parser.add_argument("source", help="map file to read, in either format")
+    parser.add_argument("destination", help="map file to write")
+    parser.add_argument("--format", choices=("text", "binary"),
+                        help=f"output format (default: binary for '{statics.BINARY_MAP_EXTENSION}' files, text otherwise)")
+    args = parser.parse_args(argv)
+
+    grid = read_map(args.source)
+    binary = None if args.format is None else args.format == "binary"
+    write_map(args.destination, grid, binary=binary)
+    print(f"Converted {args.source} -> {args.destination} ({grid.width}x{grid.height})")
+
+
+if __name__ == '__main__':
+    main()
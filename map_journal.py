@@ -0,0 +1,196 @@
+import os
+import struct
+import threading
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+import map_io
+import statics
+
+# Journal layout: a header, then one block per editor operation, all little-endian.
+#   header: magic (4s) | version (H) | pad (xx)
+#   block:  kind (B) | pad (xxx) | count (I) | xs (count I) | ys (count I) | old tiles (count H) | new tiles (count H)
+# Blocks hold absolute tile values, so replaying a block the map already contains changes nothing.
+JOURNAL_MAGIC = b"LJRN"
+JOURNAL_VERSION = 1
+JOURNAL_HEADER = struct.Struct("<4sHxx")
+BLOCK_HEADER = struct.Struct("<BxxxI")
+BLOCK_TILES = 1
+COLUMN_TYPECODES = ("I", "I", "H", "H")
+TILE_RECORD_SIZE = sum(array(typecode).itemsize for typecode in COLUMN_TYPECODES)
+
+
+class TileEdits(NamedTuple):
+    """Tiles changed by one editor operation, as parallel arrays in the order they were changed."""
+    xs: array
+    ys: array
+    old: array
+    new: array
+
+    @classmethod
+    def single(cls, tile_x: int, tile_y: int, old: int, new: int) -> "TileEdits":
+        return cls(array("I", [tile_x]), array("I", [tile_y]), array("H", [old]), array("H", [new]))
+
+    def inverted(self) -> "TileEdits":
+        """Get the edits that undo these ones, in reverse order."""
+        return TileEdits(self.xs[::-1], self.ys[::-1], self.new[::-1], self.old[::-1])
+
+
+def journal_path(map_path: str) -> str:
+    return f"{map_path}{statics.MAP_JOURNAL_SUFFIX}"
+
+
+def _parse_journal(path: str, data: bytes) -> tuple[list[TileEdits], int]:
+    # Returns the complete blocks and the number of bytes they end at
+    if len(data) < JOURNAL_HEADER.size:
+        raise ValueError(f"'{path}' is too short to be a map journal.")
+    magic, version = JOURNAL_HEADER.unpack_from(data)
+    if magic != JOURNAL_MAGIC:
+        raise ValueError(f"'{path}' is not a map journal.")
+    if version != JOURNAL_VERSION:
+        raise ValueError(f"Unsupported map journal version {version}.")
+
+    blocks = []
+    offset = JOURNAL_HEADER.size
+    while offset + BLOCK_HEADER.size <= len(data):
+        kind, count = BLOCK_HEADER.unpack_from(data, offset)
+        if kind != BLOCK_TILES:
+            raise ValueError(f"Unknown map journal block kind {kind}.")
+        if offset + BLOCK_HEADER.size + count * TILE_RECORD_SIZE > len(data):
+            break
+        offset += BLOCK_HEADER.size
+        columns = []
+        for typecode in COLUMN_TYPECODES:
+            column = array(typecode)
+            column.frombytes(data[offset:offset + count * column.itemsize])
+            offset += count * column.itemsize
+            columns.append(column)
+        blocks.append(TileEdits(*columns))
+    return blocks, offset
+
+
+def read_journal(path: str) -> list[TileEdits]:
+    """Read the blocks of a journal file. A missing file has none, and a block cut short by a crash is dropped."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+    return _parse_journal(path, data)[0] if data else []
+
+
+def encode_block(edits: TileEdits) -> bytes:
+    return BLOCK_HEADER.pack(BLOCK_TILES, len(edits.xs)) + b"".join(column.tobytes() for column in edits)
+
+
+class MapJournal:
+    """Append-only log of the tile edits made to a map file, folded back into the file in the background.
+
+    Every operation is appended and flushed as it happens, so a crash loses at
+    most the operation being written. compact() writes a copy of the map over
+    the base file on a worker thread and then drops the blocks that copy
+    contains, while edits made in the meantime keep being appended. Opening a
+    map replays whatever journal an earlier session left behind.
+    """
+
+    def __init__(self, map_path: str, compact_bytes: int = statics.MAP_JOURNAL_COMPACT_BYTES):
+        self.map_path = map_path
+        self.path = journal_path(map_path)
+        self.compact_bytes = compact_bytes
+        self.size = 0  # Bytes in the journal file
+        self._dropped = 0  # Bytes compactions removed from the front, so offsets stay comparable
+        self._file = None
+        self._lock = threading.Lock()  # Guards the file between appends and compactions
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: list[Future] = []
+
+    def replay(self, map_data) -> int:
+        """Apply the journal left next to the map to freshly loaded map data. Returns the number of tiles written."""
+        written = 0
+        for edits in read_journal(self.path):
+            for tile_x, tile_y, tile_type in zip(edits.xs, edits.ys, edits.new):
+                map_data[tile_y][tile_x] = tile_type
+            written += len(edits.xs)
+        return written
+
+    def open(self):
+        """Open the journal for appending, creating it if needed."""
+        self._file = open(self.path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION))
+            self._file.flush()
+        else:
+            # Cut a block a crash left half written, or new blocks would follow it unreadably
+            with open(self.path, "rb") as f:
+                end = _parse_journal(self.path, f.read())[1]
+            self._file.truncate(end)
+            self._file.seek(end)
+        self.size = self._file.tell()
+
+    def append(self, edits: TileEdits):
+        """Append and flush one operation."""
+        if not len(edits.xs):
+            return
+        block = encode_block(edits)
+        with self._lock:
+            self._file.write(block)
+            self._file.flush()
+            self.size += len(block)
+
+    @property
+    def compacting(self) -> bool:
+        return any(not future.done() for future in self._pending)
+
+    def needs_compaction(self) -> bool:
+        return self.size >= self.compact_bytes and not self.compacting
+
+    def compact(self, map_data) -> Future:
+        """Write map_data over the base map on a worker thread, then drop the journal blocks it contains.
+
+        map_data must hold exactly the edits journaled so far. It is copied
+        before this returns, so editing can go on right away.
+        """
+        grid = map_io.as_grid(map_data).copy()
+        with self._lock:
+            mark = self._dropped + self.size
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="map-journal")
+        self._pending = [future for future in self._pending if not future.done()]
+        future = self._executor.submit(self._compact, grid, mark)
+        self._pending.append(future)
+        return future
+
+    def _compact(self, grid, mark: int):
+        # Replacing the map first is safe: if the journal rewrite never happens,
+        # replaying its blocks over the new map changes nothing.
+        map_io.write_map(self.map_path, grid)
+        with self._lock:
+            start = mark - self._dropped
+            with open(self.path, "rb") as f:
+                f.seek(start)
+                tail = f.read()
+            self._file.close()
+            header = JOURNAL_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION)
+            map_io.replace_file(self.path, lambda f: f.write(header + tail))
+            self._file = open(self.path, "ab")
+            self._dropped += start - JOURNAL_HEADER.size
+            self.size = JOURNAL_HEADER.size + len(tail)
+
+    def wait(self):
+        """Block until every compaction finished. Raises the first compaction error, if any."""
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
+    def close(self):
+        self.wait()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.size <= JOURNAL_HEADER.size and os.path.exists(self.path):
+            # Everything is in the map file
+            os.remove(self.path)
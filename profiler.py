@@ -0,0 +1,133 @@
+import cProfile
+from collections import deque
+from time import perf_counter
+from typing import Optional
+
+import pygame
+import statics
+from interfaces import FontCache
+
+
+def call_untimed(phase: str, function, *args):
+    """Stand-in for FrameProfiler.run when profiling is off."""
+    return function(*args)
+
+
+class FrameProfiler:
+    """Switchable per-phase frame timers with rolling statistics.
+
+    While disabled, callers use call_untimed instead of run, so the only
+    cost is one extra function call per phase. Rolling windows keep the
+    last `window` samples of each phase for mean, p95 and max.
+    """
+
+    def __init__(self, window: int = statics.PROFILER_WINDOW_FRAMES):
+        self.enabled = False
+        self.show_overlay = False
+        self.window = window
+        self._samples: dict[str, deque] = {}
+        self._capture: Optional[cProfile.Profile] = None
+        self._capture_frames_left = 0
+        self._capture_path = None
+
+    @property
+    def runner(self):
+        """The phase runner to use this frame: timed when enabled, a plain call otherwise."""
+        return self.run if self.enabled else call_untimed
+
+    @property
+    def capturing(self) -> bool:
+        return self._capture is not None
+
+    def run(self, phase: str, function, *args):
+        """Call function and record how long it took under phase."""
+        start = perf_counter()
+        result = function(*args)
+        self.record(phase, (perf_counter() - start) * 1000)
+        return result
+
+    def record(self, phase: str, milliseconds: float):
+        samples = self._samples.get(phase)
+        if samples is None:
+            samples = self._samples[phase] = deque(maxlen=self.window)
+        samples.append(milliseconds)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Get mean, p95 and max in milliseconds for every recorded phase."""
+        result = {}
+        for phase, samples in self._samples.items():
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            result[phase] = {
+                "mean_ms": sum(ordered) / len(ordered),
+                "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                "max_ms": ordered[-1],
+                "samples": len(ordered),
+            }
+        return result
+
+    def reset(self):
+        self._samples.clear()
+
+    def toggle(self):
+        self.enabled = not self.enabled
+
+    def toggle_overlay(self):
+        """Show or hide the overlay. Timers run while it is shown."""
+        self.show_overlay = not self.show_overlay
+        self.enabled = self.show_overlay
+
+    def capture_frames(self, num_frames: int = statics.PROFILER_CAPTURE_FRAMES, path: str = statics.PROFILER_CAPTURE_PATH):
+        """Record a cProfile capture of the next num_frames frames to path."""
+        if self.capturing:
+            return
+        self._capture_frames_left = num_frames
+        self._capture_path = path
+        self._capture = cProfile.Profile()
+        self._capture.enable()
+
+    def begin_frame(self):
+        """Advance a running cProfile capture by one frame and save it when it is done."""
+        if self._capture is None:
+            return
+        if self._capture_frames_left > 0:
+            self._capture_frames_left -= 1
+            return
+        self._capture.disable()
+        self._capture.dump_stats(self._capture_path)
+        print(f"Saved profile capture to {self._capture_path}")
+        self._capture = None
+
+    def draw_overlay(self, screen):
+        """Draw the rolling phase statistics in the top right corner and return the rect they cover."""
+        if not self.show_overlay:
+            return
+        font = FontCache.get_font(statics.FONT_SIZE - 2)
+        rows = [("phase", "mean ms", "p95 ms", "max ms")]
+        for phase, stat in sorted(self.stats().items(), key=lambda item: -item[1]["mean_ms"]):
+            rows.append((phase, f"{stat['mean_ms']:.2f}", f"{stat['p95_ms']:.2f}", f"{stat['max_ms']:.2f}"))
+        if self.capturing:
+            rows.append((f"capturing, {self._capture_frames_left} frames left", "", "", ""))
+
+        # Values change every frame, so they are rendered directly instead of through TextCache
+        rendered = [[font.render(cell, True, statics.COLOR_WHITE) for cell in row] for row in rows]
+        column_gap = 12
+        column_widths = [max(row[i].get_width() for row in rendered) for i in range(4)]
+        width = sum(column_widths) + column_gap * 3 + 10
+        line_height = font.get_linesize()
+        height = line_height * len(rendered) + 10
+        x = screen.get_width() - width - 10
+        background = pygame.Surface((width, height))
+        background.set_alpha(180)
+        background.fill(statics.COLOR_BLACK)
+        overlay_rect = screen.blit(background, (x, 10))
+        for i, row in enumerate(rendered):
+            y = 15 + i * line_height
+            screen.blit(row[0], (x + 5, y))
+            # Numeric columns are right aligned
+            column_right = x + 5 + column_widths[0]
+            for column, text in enumerate(row[1:], start=1):
+                column_right += column_gap + column_widths[column]
+                screen.blit(text, (column_right - text.get_width(), y))
+        return overlay_rect
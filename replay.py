@@ -0,0 +1,219 @@
+"""Deterministic input recording and headless replay.
+
+A recording holds a snapshot of the game it started from (which includes
+the random module's state), the input commands of every frame and hashes
+of the game state at regular checkpoints. Replaying restores the snapshot
+and feeds the commands back through GameEngine.step with no rendering, as
+fast as the simulation runs, checking the hashes on the way.
+
+    python replay.py saves/session.lrec
+    python replay.py saves/session.lrec --no-verify --repeat 5
+"""
+import argparse
+import hashlib
+import statistics
+import struct
+import sys
+import time
+from typing import NamedTuple, Optional
+
+import snapshot
+import statics
+from interfaces import AttackDirection
+
+RECORDING_MAGIC = b"LREC"
+RECORDING_VERSION = 1
+RECORDING_HEADER = struct.Struct("<4sHxxIII")  # magic | version | frames | view width | view height
+
+COMMAND_MOVE = 1  # a, b: pixels to move by
+COMMAND_ATTACK = 2  # a: AttackDirection value
+COMMAND_CHANGE_WEAPON = 3
+COMMAND_RESET_PLAYER = 4
+COMMAND_TOGGLE_INVENTORY = 5
+
+
+class InputCommand(NamedTuple):
+    """One player input of a frame."""
+    op: int
+    a: int = 0
+    b: int = 0
+
+
+def apply_commands(game_engine, commands) -> AttackDirection:
+    """Apply a frame's input commands and return the attack direction to step the frame with."""
+    attack = AttackDirection.NONE
+    for op, a, b in commands:
+        if op == COMMAND_MOVE:
+            game_engine.player.move(a, b)
+        elif op == COMMAND_ATTACK:
+            attack = AttackDirection(a)
+        elif op == COMMAND_CHANGE_WEAPON:
+            game_engine.game_logic.change_weapon()
+        elif op == COMMAND_RESET_PLAYER:
+            game_engine.reset_player()
+        elif op == COMMAND_TOGGLE_INVENTORY:
+            game_engine.player.inventory.toggle_inventory()
+        else:
+            raise ValueError(f"Unknown input command {op}.")
+    return attack
+
+
+def state_hash(game_engine) -> int:
+    """Hash the full game state, as stored by a snapshot, into 64 bits."""
+    return int.from_bytes(hashlib.blake2b(game_engine.snapshot(), digest_size=8).digest(), "little")
+
+
+class Recording:
+    """A recorded session: the state it started from, every frame's inputs and state hashes at checkpoints."""
+
+    def __init__(self, initial_state: bytes, view_size: tuple[int, int]):
+        self.initial_state = initial_state
+        self.view_size = tuple(view_size)  # The camera follows the player by it, so replays must use the same
+        self.frames = 0
+        self.commands: list[tuple[int, InputCommand]] = []  # (frame, command) in the order they were applied
+        self.checkpoints: dict[int, int] = {}  # frame -> state hash after that frame
+
+    def frame_commands(self) -> list[list[InputCommand]]:
+        """Get the commands grouped by frame, one list per frame."""
+        frames = [[] for _ in range(self.frames)]
+        for frame, command in self.commands:
+            frames[frame].append(command)
+        return frames
+
+    def to_bytes(self) -> bytes:
+        writer = snapshot.Writer()
+        writer.pack(RECORDING_HEADER, RECORDING_MAGIC, RECORDING_VERSION, self.frames, *self.view_size)
+        writer.blob(self.initial_state)
+        writer.column("I", [frame for frame, _ in self.commands])
+        writer.column("B", [command.op for _, command in self.commands])
+        writer.column("i", [command.a for _, command in self.commands])
+        writer.column("i", [command.b for _, command in self.commands])
+        writer.column("I", list(self.checkpoints))
+        writer.column("Q", list(self.checkpoints.values()))
+        return writer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data) -> "Recording":
+        reader = snapshot.Reader(data)
+        magic, version, frames, view_width, view_height = reader.unpack(RECORDING_HEADER)
+        if magic != RECORDING_MAGIC:
+            raise ValueError("Not an input recording.")
+        if version != RECORDING_VERSION:
+            raise ValueError(f"Unsupported recording version {version}.")
+        recording = cls(bytes(reader.blob()), (view_width, view_height))
+        recording.frames = frames
+        command_frames = reader.column("I")
+        commands = list(map(InputCommand, reader.column("B"), reader.column("i"), reader.column("i")))
+        if len(command_frames) != len(commands) or any(frame >= frames for frame in command_frames):
+            raise ValueError("Recording commands do not match its frames.")
+        recording.commands = list(zip(command_frames, commands))
+        recording.checkpoints = dict(zip(reader.column("I"), reader.column("Q")))
+        return recording
+
+
+def read_recording(path: str) -> Recording:
+    return Recording.from_bytes(snapshot.read_snapshot(path))
+
+
+class InputRecorder:
+    """Records the inputs applied each frame of a running game, with a state hash every checkpoint_interval frames."""
+
+    def __init__(self, checkpoint_interval: int = statics.REPLAY_CHECKPOINT_INTERVAL):
+        self.checkpoint_interval = checkpoint_interval
+        self.recording: Optional[Recording] = None
+
+    @property
+    def active(self) -> bool:
+        return self.recording is not None
+
+    def start(self, game_engine):
+        """Start a new recording from the current game state."""
+        self.recording = Recording(game_engine.snapshot(), game_engine.map_engine.view_size)
+
+    def record_frame(self, game_engine, commands):
+        """Log the commands a frame was stepped with. Call it after the frame was simulated."""
+        recording = self.recording
+        if recording is None:
+            return
+        frame = recording.frames
+        recording.commands.extend((frame, InputCommand(*command)) for command in commands)
+        recording.frames += 1
+        if recording.frames % self.checkpoint_interval == 0:
+            recording.checkpoints[frame] = state_hash(game_engine)
+
+    def stop(self, game_engine) -> Optional[Recording]:
+        """Finish the recording, checkpointing its last frame, and return it."""
+        recording, self.recording = self.recording, None
+        if recording is not None and recording.frames and recording.frames - 1 not in recording.checkpoints:
+            recording.checkpoints[recording.frames - 1] = state_hash(game_engine)
+        return recording
+
+
+class ReplayResult(NamedTuple):
+    frames: int  # Frames stepped
+    seconds: float
+    checkpoints: int  # Checkpoints that matched
+    mismatch_frame: Optional[int]  # First checkpoint whose hash differed, None if all matched
+
+
+def replay(game_engine, recording: Recording, verify: bool = True) -> ReplayResult:
+    """Restore a recording's initial state and step its inputs through the engine as fast as possible.
+
+    Nothing is drawn. With verify, the state is hashed at every checkpoint and
+    the replay stops at the first one that differs from the recording.
+    """
+    game_engine.map_engine.view_size = recording.view_size
+    game_engine.restore(recording.initial_state)
+    checkpoints = recording.checkpoints if verify else {}
+    step = game_engine.step
+    no_attack = AttackDirection.NONE
+    matched = 0
+    start = time.perf_counter()
+    for frame, commands in enumerate(recording.frame_commands()):
+        step(apply_commands(game_engine, commands) if commands else no_attack)
+        expected = checkpoints.get(frame)
+        if expected is not None:
+            if state_hash(game_engine) != expected:
+                return ReplayResult(frame + 1, time.perf_counter() - start, matched, frame)
+            matched += 1
+    return ReplayResult(recording.frames, time.perf_counter() - start, matched, None)
+
+
+def build_replay_engine():
+    """Create a headless engine with the weapons main.py defines, ready to replay recordings into."""
+    from game_engine import GameEngine
+    from define_additional_content import main as define_additional_content_main
+
+    game_engine = GameEngine(headless=True)
+    define_additional_content_main(game_engine)
+    return game_engine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded session headless.")
+    parser.add_argument("recording", nargs="?", default=statics.RECORDING_PATH, help="recording file to replay")
+    parser.add_argument("--no-verify", action="store_true", help="skip the state hash checks, for pure timing")
+    parser.add_argument("--repeat", type=int, default=1, help="times to replay the recording (default: 1)")
+    args = parser.parse_args(argv)
+
+    recording = read_recording(args.recording)
+    game_engine = build_replay_engine()
+    timings = []
+    for _ in range(args.repeat):
+        result = replay(game_engine, recording, verify=not args.no_verify)
+        if result.mismatch_frame is not None:
+            print(f"State diverged at frame {result.mismatch_frame} "
+                  f"after {result.checkpoints} matching checkpoint(s).")
+            return 1
+        timings.append(result.seconds)
+
+    seconds = statistics.median(timings)
+    print(f"Replayed {recording.frames} frames in {seconds * 1000:.1f}ms "
+          f"({recording.frames / seconds if seconds else 0:.0f} frames/s)")
+    if not args.no_verify:
+        print(f"{result.checkpoints} checkpoint(s) matched")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
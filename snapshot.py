@@ -0,0 +1,565 @@
+import gc
+import os
+import random
+import struct
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import compress
+from typing import NamedTuple, Optional
+
+import map_io
+from chunked_world import ChunkedWorld
+from interfaces import AttackDirection, Entity, EntityType, WeaponType
+
+try:
+    import numpy as np
+except ImportError:  # Snapshots with an enemy swarm need NumPy, like the swarm itself
+    np = None
+
+# Snapshot layout: a header followed by sections in a fixed order, all little-endian.
+#   header | map | world | names | entities | player | weapons | inventory | swarm | rng
+# Entity records are stored column by column (one array per field), so packing and
+# unpacking them is a handful of C-level conversions instead of one struct call each.
+SNAPSHOT_MAGIC = b"LSNP"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_HEADER = struct.Struct("<4sHBx")  # magic | version | map kind
+MAP_NONE, MAP_INLINE, MAP_STREAMED = 0, 1, 2
+GRID_HEADER = struct.Struct("<cxII")  # tile typecode | width | height
+WORLD = struct.Struct("<QiBxddBBxxq")  # enemy tick | attack timer | attack direction | camera x, y, flags | has seed | seed
+PLAYER = struct.Struct("<ddBqiiqqiBBI")  # x, y, flags | health | level | size | coins | experience | invincibility |
+#                                         alive | weapon type (0 = none) | name index
+COUNT = struct.Struct("<I")
+FLAG = struct.Struct("<B")
+RNG_TAIL = struct.Struct("<Bd")  # has gauss_next | gauss_next
+
+KIND_ENTITY, KIND_ENEMY, KIND_PLAYER = 0, 1, 2
+FLAG_INT_X, FLAG_INT_Y = 1, 2  # Positions are stored as doubles, these restore integer ones exactly
+SWARM_ARRAYS = ("x", "y", "health", "level", "damage_cooldown", "speed", "size", "alive", "hit_this_attack", "chasing")
+
+
+class Writer:
+    """Builds little-endian binary data from struct records, counts, length-prefixed blobs and array columns."""
+
+    def __init__(self):
+        self.parts = []
+
+    def pack(self, layout: struct.Struct, *values):
+        self.parts.append(layout.pack(*values))
+
+    def count(self, value: int):
+        self.parts.append(COUNT.pack(value))
+
+    def blob(self, data):
+        self.count(len(data))
+        self.parts.append(data)
+
+    def column(self, typecode: str, values):
+        self.blob(array(typecode, values).tobytes())
+
+    def getvalue(self) -> bytes:
+        return b"".join(self.parts)
+
+
+class Reader:
+    """Reads back what a Writer wrote, in the same order."""
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def unpack(self, layout: struct.Struct):
+        values = layout.unpack_from(self.data, self.offset)
+        self.offset += layout.size
+        return values
+
+    def count(self) -> int:
+        return self.unpack(COUNT)[0]
+
+    def blob(self) -> memoryview:
+        size = self.count()
+        if self.offset + size > len(self.data):
+            raise ValueError("Snapshot is truncated.")
+        blob = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return blob
+
+    def column(self, typecode: str) -> array:
+        values = array(typecode)
+        values.frombytes(self.blob())
+        return values
+
+    def strings(self, count: int) -> list[str]:
+        """Read count blobs as UTF-8 strings, like decoding blob() count times but with less overhead per string."""
+        data = self.data
+        offset = self.offset
+        unpack = COUNT.unpack_from
+        strings = []
+        for _ in range(count):
+            size, = unpack(data, offset)
+            offset += COUNT.size
+            if offset + size > len(data):
+                raise ValueError("Snapshot is truncated.")
+            strings.append(str(data[offset:offset + size], "utf-8"))
+            offset += size
+        self.offset = offset
+        return strings
+
+
+class _Names:
+    """String table, so each distinct entity name is stored once."""
+
+    def __init__(self):
+        self.indices = {}
+
+    def index(self, name) -> int:
+        index = self.indices.get(name)
+        if index is None:
+            index = self.indices[name] = len(self.indices)
+        return index
+
+
+def _entity_columns(entities) -> tuple:
+    """Copy the fields snapshots store of each entity: types, names, xs, ys, healths, levels, sizes."""
+    return ([entity.entity_type for entity in entities], [entity.name for entity in entities],
+            [entity.x for entity in entities], [entity.y for entity in entities],
+            [entity.health for entity in entities], [entity.level for entity in entities],
+            [entity.size for entity in entities])
+
+
+def _write_entities(writer: Writer, columns, names: _Names, kinds):
+    types, entity_names, xs, ys, healths, levels, sizes = columns
+    type_values = {entity_type: entity_type.value for entity_type in EntityType}
+    type_values[None] = 0
+    name_indices = names.indices
+    columns = (
+        kinds,
+        array("B", [type_values[entity_type] for entity_type in types]),
+        array("I", [name_indices.setdefault(name, len(name_indices)) for name in entity_names]),
+        array("d", xs),
+        array("d", ys),
+        array("B", [(type(x) is int) * FLAG_INT_X | (type(y) is int) * FLAG_INT_Y for x, y in zip(xs, ys)]),
+        array("q", healths),
+        array("i", levels),
+        array("i", sizes),
+    )
+    writer.count(len(types))
+    for column in columns:
+        writer.blob(column.tobytes())
+
+
+def _read_entities(reader: Reader) -> list:
+    """Read entity columns as lists: kinds, types, name indices, xs, ys, position flags, healths, levels, sizes."""
+    count = reader.count()
+    columns = [reader.column(typecode).tolist() for typecode in ("B", "B", "I", "d", "d", "B", "q", "i", "i")]
+    if any(len(column) != count for column in columns):
+        raise ValueError("Snapshot entity columns do not match the entity count.")
+    return columns
+
+
+def _position_flags(x, y) -> int:
+    # Same flags as the position column of _write_entities
+    return (type(x) is int) * FLAG_INT_X | (type(y) is int) * FLAG_INT_Y
+
+
+def _read_position(x, y, flags):
+    return (int(x) if flags & FLAG_INT_X else x), (int(y) if flags & FLAG_INT_Y else y)
+
+
+class GameState(NamedTuple):
+    """Copies of everything a snapshot stores, taken by copy_state() so encode() can run later on another thread."""
+    map_kind: int
+    map_data: object  # TileGrid copy, list of row copies or the path of a streamed world
+    world: tuple  # WORLD fields
+    player: object  # Only compared by identity, to find the player's row
+    entities: list  # Registered entities in registry order, only compared by identity
+    entity_classes: list
+    entity_columns: tuple  # See _entity_columns
+    enemy_columns: tuple  # Speeds, damage cooldowns, experience rewards, last ticks and chase flags of the Enemy rows
+    damaged: list
+    player_fields: tuple  # PLAYER fields, with the player's name in place of its name index
+    required_exp: dict
+    weapon_timers: tuple  # Weapon types, attack timers and cooldown timers of weapons_list
+    show_inventory: bool
+    inventory_columns: tuple
+    swarm: Optional[dict]  # Copies of the live part of each swarm array, None without a swarm
+    rng_state: tuple
+
+
+def copy_state(game_engine) -> GameState:
+    """Copy the state of a running game, as cheaply as possible, for encode().
+
+    Entity fields are copied column by column into lists of the values they
+    hold. All the conversion work (names table, type values, position flags,
+    dormant enemy catch-up and packing) is left to encode(). Weapon
+    definitions are not stored: restoring expects the same weapons_list, as
+    set up by define_additional_content.
+    """
+    from game_engine import Enemy
+
+    map_engine = game_engine.map_engine
+    game_logic = game_engine.game_logic
+    player = game_engine.player
+
+    map_data = map_engine.map_data
+    if isinstance(map_data, ChunkedWorld):
+        map_data.flush()
+        map_kind, map_copy = MAP_STREAMED, map_data.path
+    elif isinstance(map_data, map_io.TileGrid):
+        map_kind, map_copy = MAP_INLINE, map_data.copy()
+    elif map_data:
+        map_kind, map_copy = MAP_INLINE, [list(row) for row in map_data]
+    else:
+        map_kind, map_copy = MAP_NONE, None
+
+    seed = map_engine.seed
+    has_seed = isinstance(seed, int) and -2 ** 63 <= seed < 2 ** 63
+    direction = map_engine.current_attack_direction
+    camera = game_engine.camera
+    world = (map_engine.enemy_tick, map_engine.attack_timer, direction.value if direction else 0,
+             camera.x, camera.y, _position_flags(camera.x, camera.y), has_seed, seed if has_seed else 0)
+
+    entities = game_logic.entities.to_list()
+    classes = [type(entity) for entity in entities]
+    unknown = set(classes) - {Entity, Enemy, type(player)}
+    if unknown:
+        raise TypeError(f"Cannot snapshot entities of type {next(iter(unknown)).__name__}.")
+    enemies = [entity for entity, cls in zip(entities, classes) if cls is Enemy]
+    enemy_columns = ([enemy.speed for enemy in enemies], [enemy.damage_cooldown for enemy in enemies],
+                     [enemy.exp_reward for enemy in enemies], [enemy.last_tick for enemy in enemies],
+                     [enemy.chasing for enemy in enemies])
+
+    weapon = player.weapon
+    weapons = list(game_engine.weapons_list.values())
+    if weapon is not None and weapon not in weapons:
+        raise ValueError("The player's weapon is not in weapons_list, so it cannot be restored.")
+    player_fields = (player.x, player.y, _position_flags(player.x, player.y), player.health, player.level,
+                     player.size, player.coins, player.experience, player.invincibility_timer,
+                     not player.is_disposed(), weapon.weapon_type.value if weapon else 0, player.name)
+    weapon_timers = ([weapon.weapon_type.value for weapon in weapons], [weapon.attack_timer for weapon in weapons],
+                     [weapon.cooldown_timer for weapon in weapons])
+
+    swarm = game_logic.enemy_swarm
+    swarm_arrays = None
+    if swarm is not None:
+        swarm_arrays = {name: getattr(swarm, name)[:swarm.count].copy() for name in SWARM_ARRAYS}
+
+    return GameState(map_kind, map_copy, world, player, entities, classes, _entity_columns(entities), enemy_columns,
+                     list(map_engine.damaged_entities_this_attack), player_fields, dict(player.required_exp),
+                     weapon_timers, player.inventory.show_inventory, _entity_columns(player.inventory.items),
+                     swarm_arrays, random.getstate())
+
+
+def encode(state: GameState) -> bytes:
+    """Serialize a GameState into snapshot bytes. Only reads the state, so it can run on any thread."""
+    from game_engine import Enemy
+
+    writer = Writer()
+    names = _Names()
+
+    if state.map_kind == MAP_STREAMED:
+        writer.pack(SNAPSHOT_HEADER, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, MAP_STREAMED)
+        writer.blob(os.fsencode(state.map_data))
+    elif state.map_kind == MAP_INLINE:
+        grid = map_io.as_grid(state.map_data)
+        writer.pack(SNAPSHOT_HEADER, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, MAP_INLINE)
+        writer.pack(GRID_HEADER, grid.typecode.encode("ascii"), grid.width, grid.height)
+        writer.blob(grid.tiles.cast("B"))
+    else:
+        writer.pack(SNAPSHOT_HEADER, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, MAP_NONE)
+    writer.pack(WORLD, *state.world)
+    enemy_tick = state.world[0]
+
+    # Registry order is kept, since enemies act and entities are drawn in that order.
+    # Disposed entities are waiting for cleanup_disposed_entities and left out.
+    player = state.player
+    kinds = array("B")
+    kept = []
+    kept_enemies = []
+    for entity, cls, entity_type in zip(state.entities, state.entity_classes, state.entity_columns[0]):
+        if entity is player:
+            kinds.append(KIND_PLAYER)
+        elif entity_type is not None:
+            kinds.append(KIND_ENEMY if cls is Enemy else KIND_ENTITY)
+        if cls is Enemy and entity is not player:
+            kept_enemies.append(entity_type is not None)
+        kept.append(entity is player or entity_type is not None)
+    entity_columns = [list(compress(column, kept)) for column in state.entity_columns]
+    speeds, cooldowns, rewards, last_ticks, chasing = [list(compress(column, kept_enemies))
+                                                       for column in state.enemy_columns]
+    # Dormant enemies are stored as if caught up to the current tick, see Enemy.catch_up
+    cooldowns = [max(cooldown - (enemy_tick - last_tick), 0) if cooldown > 0 else cooldown
+                 for cooldown, last_tick in zip(cooldowns, last_ticks)]
+    chasing = [enemy_chasing and last_tick == enemy_tick for enemy_chasing, last_tick in zip(chasing, last_ticks)]
+
+    entity_writer = Writer()
+    # Only the position of the player's row matters, its state is in the player section
+    _write_entities(entity_writer, entity_columns, names, kinds)
+    entity_writer.column("d", speeds)
+    entity_writer.column("i", cooldowns)
+    entity_writer.column("i", rewards)
+    entity_writer.column("B", chasing)
+    indices = {entity: index for index, entity in enumerate(compress(state.entities, kept))}
+    # Sorted, so equal states give equal bytes whatever the set's iteration order
+    entity_writer.column("i", sorted(indices[entity] for entity in state.damaged if entity in indices))
+
+    *player_fields, player_name = state.player_fields
+    tail = Writer()
+    tail.pack(PLAYER, *player_fields, names.index(player_name))
+    tail.column("i", list(state.required_exp))
+    tail.column("q", list(state.required_exp.values()))
+    weapon_types, attack_timers, cooldown_timers = state.weapon_timers
+    tail.column("B", weapon_types)
+    tail.column("i", attack_timers)
+    tail.column("i", cooldown_timers)
+    tail.pack(FLAG, state.show_inventory)
+    _write_entities(tail, state.inventory_columns, names, array("B", [KIND_ENTITY] * len(state.inventory_columns[0])))
+
+    tail.pack(FLAG, state.swarm is not None)
+    if state.swarm is not None:
+        tail.count(len(state.swarm["x"]))
+        for name in SWARM_ARRAYS:
+            values = state.swarm[name]
+            tail.blob(values.dtype.str.encode("ascii"))
+            tail.blob(values.tobytes())
+
+    version, internal_state, gauss_next = state.rng_state
+    tail.count(version)
+    tail.column("I", internal_state)
+    tail.pack(RNG_TAIL, gauss_next is not None, gauss_next or 0.0)
+
+    # The names table goes first, so it is only written once every name is known
+    writer.count(len(names.indices))
+    for name in names.indices:
+        writer.blob(str(name).encode("utf-8"))
+    return writer.getvalue() + entity_writer.getvalue() + tail.getvalue()
+
+
+def capture(game_engine) -> bytes:
+    """Serialize the full state of a running game into snapshot bytes.
+
+    Covers the map, every registered entity in registry order, the player with
+    its inventory, the weapon timers, the enemy swarm and the random module's
+    state. Same as encode(copy_state(game_engine)).
+    """
+    return encode(copy_state(game_engine))
+
+
+@contextmanager
+def _gc_paused():
+    # Building every entity at once sets off repeated garbage collections that find nothing to free
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def restore(game_engine, data):
+    """Replace the state of a game with a snapshot made by capture(). The engine must be initialized."""
+    with _gc_paused():
+        _restore(game_engine, data)
+
+
+def _restore(game_engine, data):
+    from game_engine import Enemy, Inventory
+
+    reader = Reader(data)
+    magic, version, map_kind = reader.unpack(SNAPSHOT_HEADER)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("Not a game snapshot.")
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}.")
+
+    # Everything is parsed before the game is touched, so a bad snapshot leaves it as it was
+    map_data = None
+    if map_kind == MAP_INLINE:
+        typecode, width, height = reader.unpack(GRID_HEADER)
+        map_data = map_io.TileGrid(width, height, bytearray(reader.blob()), typecode.decode("ascii"))
+    elif map_kind == MAP_STREAMED:
+        map_data = ChunkedWorld(os.fsdecode(bytes(reader.blob())))
+    enemy_tick, attack_timer, direction, camera_x, camera_y, camera_flags, has_seed, seed = reader.unpack(WORLD)
+    names = reader.strings(reader.count())
+
+    records = _read_entities(reader)
+    speeds = reader.column("d").tolist()
+    cooldowns = reader.column("i").tolist()
+    rewards = reader.column("i").tolist()
+    chasing = reader.column("B").tolist()
+    damaged = reader.column("i").tolist()
+
+    (player_x, player_y, player_flags, player_health, player_level, player_size, coins, experience, invincibility,
+     player_alive, weapon_type, player_name) = reader.unpack(PLAYER)
+    required_exp = dict(zip(reader.column("i"), reader.column("q")))
+    weapon_timers = list(zip(reader.column("B"), reader.column("i"), reader.column("i")))
+    show_inventory, = reader.unpack(FLAG)
+    inventory_records = _read_entities(reader)
+
+    has_swarm, = reader.unpack(FLAG)
+    swarm_arrays = None
+    if has_swarm:
+        if np is None:
+            raise RuntimeError("This snapshot has an enemy swarm, which requires NumPy.")
+        swarm_count = reader.count()
+        swarm_arrays = {}
+        for name in SWARM_ARRAYS:
+            dtype = np.dtype(bytes(reader.blob()).decode("ascii"))
+            swarm_arrays[name] = np.frombuffer(reader.blob(), dtype=dtype).copy()
+
+    rng_version = reader.count()
+    rng_state = tuple(reader.column("I"))
+    has_gauss, gauss_next = reader.unpack(RNG_TAIL)
+
+    # Apply
+    map_engine = game_engine.map_engine
+    game_logic = game_engine.game_logic
+    player = game_engine.player
+    map_engine.release_map()  # Flushes a streamed world before it may be reopened here
+    map_engine.map_data = map_data
+    map_engine.seed = seed if has_seed else None
+    map_engine.terrain_cache.clear()
+    map_engine.flow_field.invalidate()
+    map_engine.invalidate_screen()
+    map_engine.enemy_tick = enemy_tick
+    map_engine.attack_timer = attack_timer
+    map_engine.current_attack_direction = AttackDirection(direction) if direction else AttackDirection.NONE
+    game_engine.camera.x, game_engine.camera.y = _read_position(camera_x, camera_y, camera_flags)
+
+    game_logic.entities.clear()
+    spatial_index = game_logic.spatial_index
+    occupancy = spatial_index.occupancy
+    spatial_index.clear()
+    spatial_index.occupancy = None  # Rebuilt once at the end instead of counted entity by entity
+
+    player.x, player.y = _read_position(player_x, player_y, player_flags)
+    player.health = player_health
+    player.level = player_level
+    player.size = player_size
+    player.name = names[player_name]
+    player.coins = coins
+    player.experience = experience
+    player.invincibility_timer = invincibility
+    player.required_exp = required_exp
+    player.entity_type = EntityType.PLAYER if player_alive else None
+    weapons = {weapon.weapon_type.value: weapon for weapon in game_engine.weapons_list.values()}
+    for value, weapon_attack_timer, weapon_cooldown_timer in weapon_timers:
+        weapon = weapons.get(value)
+        if weapon is not None:
+            weapon.attack_timer = weapon_attack_timer
+            weapon.cooldown_timer = weapon_cooldown_timer
+    player.weapon = game_engine.weapons_list.get(WeaponType(weapon_type)) if weapon_type else None
+    inventory = Inventory()
+    inventory.show_inventory = bool(show_inventory)
+    for _, type_value, name_index, x, y, flags, health, level, size in zip(*inventory_records):
+        inventory.append(Entity(name=names[name_index], entity_type=EntityType(type_value),
+                                starting_pos=_read_position(x, y, flags), size=size, health=health, level=level))
+    player.inventory = inventory
+
+    entity_types = {entity_type.value: entity_type for entity_type in EntityType}
+    entities = []
+    append = entities.append
+    new_entity = Entity.__new__
+    new_enemy = Enemy.__new__
+    enemy_columns = zip(speeds, cooldowns, rewards, chasing)
+    # Entities are built without __init__, which would only have its fields overwritten here
+    for kind, type_value, name_index, x, y, flags, health, level, size in zip(*records):
+        if kind == KIND_ENTITY:
+            entity = new_entity(Entity)
+        elif kind == KIND_ENEMY:
+            entity = new_enemy(Enemy)
+            entity.game_engine = game_engine
+            entity.speed, entity.damage_cooldown, entity.exp_reward, enemy_chasing = next(enemy_columns)
+            entity.chasing = bool(enemy_chasing)
+            entity.last_tick = enemy_tick
+        else:
+            append(player)
+            continue
+        entity.name = names[name_index]
+        entity.x = int(x) if flags & FLAG_INT_X else x
+        entity.y = int(y) if flags & FLAG_INT_Y else y
+        entity.health = health
+        entity.entity_type = entity_types[type_value]
+        entity.size = size
+        entity.level = level
+        append(entity)
+    game_logic.add_entities(entities)
+    map_engine.damaged_entities_this_attack = {entities[index] for index in damaged}
+
+    if swarm_arrays is not None:
+        game_logic.enable_enemy_swarm()
+        swarm = game_logic.enemy_swarm
+        swarm.clear()
+        swarm.reserve(swarm_count)
+        for name, values in swarm_arrays.items():
+            getattr(swarm, name)[:swarm_count] = values
+        swarm.count = swarm_count
+    else:
+        # The game the snapshot came from kept its enemies as objects
+        game_logic.enemy_swarm = None
+    if occupancy is not None:
+        if map_data and not isinstance(map_data, ChunkedWorld):
+            game_logic.attach_occupancy(len(map_data[0]), len(map_data))
+        else:
+            game_logic.attach_occupancy(occupancy.width, occupancy.height)
+
+    random.setstate((rng_version, rng_state, gauss_next if has_gauss else None))
+
+
+def write_snapshot(path: str, data: bytes):
+    """Write snapshot bytes to a file, replacing it atomically."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    map_io.replace_file(path, lambda f: f.write(data))
+
+
+def read_snapshot(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def save_state(path: str, state: GameState):
+    """Encode a copied GameState and write it to a file."""
+    write_snapshot(path, encode(state))
+
+
+class SnapshotWriter:
+    """Encodes and writes snapshots on one background thread, in the order they were queued.
+
+    copy_state() already made an independent copy of the game, so the game
+    can keep running while the copy is encoded and written.
+    """
+
+    def __init__(self):
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: list[Future] = []
+
+    def _submit(self, function, *args) -> Future:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot")
+        self._pending = [future for future in self._pending if not future.done()]
+        future = self._executor.submit(function, *args)
+        self._pending.append(future)
+        return future
+
+    def write(self, path: str, data: bytes) -> Future:
+        """Queue already encoded snapshot bytes to be written."""
+        return self._submit(write_snapshot, path, data)
+
+    def save(self, path: str, state: GameState) -> Future:
+        """Queue a copied GameState to be encoded and written."""
+        return self._submit(save_state, path, state)
+
+    def wait(self):
+        """Block until every queued snapshot is written. Raises the first write error, if any."""
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
+    def close(self):
+        self.wait()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
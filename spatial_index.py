@@ -0,0 +1,185 @@
+from typing import Optional
+
+import statics
+
+
+class OccupancyGrid:
+    """Number of live entities on each tile, stored row-major in one bytearray.
+
+    Counts saturate at 255. That is plenty for telling free tiles apart,
+    but a tile holding more entities than that can read free too early.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.counts = bytearray(width * height)
+
+    def _offset(self, tile_x, tile_y):
+        if 0 <= tile_x < self.width and 0 <= tile_y < self.height:
+            return tile_y * self.width + tile_x
+        return None
+
+    def add(self, tile_x: int, tile_y: int):
+        offset = self._offset(tile_x, tile_y)
+        if offset is not None and self.counts[offset] < 255:
+            self.counts[offset] += 1
+
+    def add_many(self, cells):
+        """Count one more entity on each (tile_x, tile_y) cell, like calling add() on each but with less overhead."""
+        width, height, counts = self.width, self.height, self.counts
+        for tile_x, tile_y in cells:
+            if 0 <= tile_x < width and 0 <= tile_y < height:
+                offset = tile_y * width + tile_x
+                if counts[offset] < 255:
+                    counts[offset] += 1
+
+    def remove(self, tile_x: int, tile_y: int):
+        offset = self._offset(tile_x, tile_y)
+        if offset is not None and self.counts[offset] > 0:
+            self.counts[offset] -= 1
+
+    def is_occupied(self, tile_x: int, tile_y: int) -> bool:
+        offset = self._offset(tile_x, tile_y)
+        return offset is not None and self.counts[offset] > 0
+
+
+class SpatialIndex:
+    """Uniform grid of tile-sized buckets used to look entities up by position.
+
+    Every tracked entity lives in the bucket of the tile its center is on, so
+    queries only visit the buckets they overlap instead of every entity.
+    Buckets are small lists in insertion order, which keeps iteration
+    deterministic and costs far less memory per entity than a dict.
+    """
+
+    def __init__(self):
+        self.cell_size = statics.TILE_SIZE
+        self._buckets: dict[tuple[int, int], list] = {}
+        self._cells: dict = {}  # entity -> (cell_x, cell_y)
+        self.max_entity_size = 0
+        self.occupancy: Optional[OccupancyGrid] = None
+
+    def __len__(self):
+        return len(self._cells)
+
+    def __contains__(self, entity):
+        return entity in self._cells
+
+    def attach_occupancy(self, width: int, height: int) -> OccupancyGrid:
+        """Maintain an OccupancyGrid of the given size (in tiles) from now on, rebuilt from tracked entities."""
+        occupancy = OccupancyGrid(width, height)
+        occupancy.add_many(self._cells.values())
+        self.occupancy = occupancy
+        return occupancy
+
+    def cell_of(self, x, y) -> tuple[int, int]:
+        """Get the bucket (tile) coordinates of a world position."""
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def insert(self, entity):
+        """Start tracking an entity. Inserting a tracked entity just refreshes its bucket."""
+        if entity in self._cells:
+            self.update(entity)
+            return
+        cell = self.cell_of(entity.x, entity.y)
+        self._cells[entity] = cell
+        self._buckets.setdefault(cell, []).append(entity)
+        if self.occupancy is not None:
+            self.occupancy.add(*cell)
+        if entity.size > self.max_entity_size:
+            self.max_entity_size = entity.size
+
+    def insert_many(self, entities):
+        """Start tracking many entities, like calling insert() on each but with less overhead per entity."""
+        cell_size = self.cell_size
+        cells = self._cells
+        buckets = self._buckets
+        max_entity_size = self.max_entity_size
+        new_cells = []
+        for entity in entities:
+            if entity in cells:
+                self.update(entity)
+                continue
+            cell = (int(entity.x // cell_size), int(entity.y // cell_size))
+            cells[entity] = cell
+            bucket = buckets.get(cell)
+            if bucket is None:
+                buckets[cell] = [entity]
+            else:
+                bucket.append(entity)
+            new_cells.append(cell)
+            if entity.size > max_entity_size:
+                max_entity_size = entity.size
+        self.max_entity_size = max_entity_size
+        if self.occupancy is not None:
+            self.occupancy.add_many(new_cells)
+
+    def remove(self, entity):
+        """Stop tracking an entity. Unknown entities are ignored."""
+        cell = self._cells.pop(entity, None)
+        if cell is None:
+            return
+        bucket = self._buckets[cell]
+        bucket.remove(entity)
+        if not bucket:
+            del self._buckets[cell]
+        if self.occupancy is not None:
+            self.occupancy.remove(*cell)
+
+    def update(self, entity):
+        """Move a tracked entity to the bucket matching its current position."""
+        old_cell = self._cells.get(entity)
+        if old_cell is None:
+            return
+        new_cell = self.cell_of(entity.x, entity.y)
+        if new_cell == old_cell:
+            return
+        bucket = self._buckets[old_cell]
+        bucket.remove(entity)
+        if not bucket:
+            del self._buckets[old_cell]
+        self._cells[entity] = new_cell
+        self._buckets.setdefault(new_cell, []).append(entity)
+        if self.occupancy is not None:
+            self.occupancy.remove(*old_cell)
+            self.occupancy.add(*new_cell)
+
+    def clear(self):
+        self._buckets.clear()
+        self._cells.clear()
+        self.max_entity_size = 0
+        if self.occupancy is not None:
+            self.occupancy = OccupancyGrid(self.occupancy.width, self.occupancy.height)
+
+    def query_tile(self, tile_x: int, tile_y: int) -> list:
+        """Get the live entities whose center is on the given tile."""
+        bucket = self._buckets.get((tile_x, tile_y))
+        if not bucket:
+            return []
+        return [entity for entity in bucket if not entity.is_disposed()]
+
+    def query_rect(self, left, top, width, height) -> list:
+        """Get the live entities whose center lies inside [left, left+width) x [top, top+height)."""
+        right = left + width
+        bottom = top + height
+        start_x, start_y = self.cell_of(left, top)
+        end_x, end_y = self.cell_of(right, bottom)
+        buckets = self._buckets
+        result = []
+        for cell_y in range(start_y, end_y + 1):
+            for cell_x in range(start_x, end_x + 1):
+                bucket = buckets.get((cell_x, cell_y))
+                if not bucket:
+                    continue
+                for entity in bucket:
+                    if (left <= entity.x < right and top <= entity.y < bottom
+                            and not entity.is_disposed()):
+                        result.append(entity)
+        return result
+
+    def query_radius(self, x, y, radius) -> list:
+        """Get the live entities whose center is within radius of (x, y)."""
+        radius_sq = radius * radius
+        return [entity for entity in self.query_rect(x - radius, y - radius, radius * 2 + 1, radius * 2 + 1)
+                if (entity.x - x) ** 2 + (entity.y - y) ** 2 <= radius_sq]
@@ -2,7 +2,30 @@ import pygame
 
 
 MAPS_ROOT = "maps"
+SAVES_ROOT = "saves"
+SNAPSHOT_PATH = f"{SAVES_ROOT}/quicksave.lsnp"  # Written by F5 and read by F9 in main.py
+RECORDING_PATH = f"{SAVES_ROOT}/session.lrec"  # Input recording toggled by F6 in main.py
+REPLAY_CHECKPOINT_INTERVAL = 60  # Frames between the state hashes a recording stores for verification
+BINARY_MAP_EXTENSION = ".lmap"  # Maps saved with this extension use the binary format (see map_io.py)
+MAP_JOURNAL_SUFFIX = ".journal"  # Map editor edit journals are kept beside the map file with this suffix
+MAP_JOURNAL_COMPACT_BYTES = 1 << 20  # Journal size at which the editor folds it into the map in the background
+EDITOR_BRUSH_RADIUS = 0  # Starting map editor brush radius in tiles, 0 paints single tiles
+EDITOR_MAX_BRUSH_RADIUS = 16
+MAPGEN_CHUNK_ROWS = 256  # Rows per independently seeded map generation chunk, changing it changes generated maps
+MAPGEN_WORKERS = 0  # Map generation processes, 0 picks automatically
+MAPGEN_PARALLEL_MIN_TILES = 4_000_000  # Smaller maps are generated in-process
 TEXTURES_ROOT = "textures"
+ATLAS_SPRITES = {  # Sprites packed into the entity texture atlas, by name
+    "coin": f"{TEXTURES_ROOT}/coin16x16.png",
+    "heart": f"{TEXTURES_ROOT}/hearth16x16.png",
+}
+ATLAS_MAX_WIDTH = 512  # Width at which the atlas starts a new row of sprites
+WEAPON_TEXTURES_ROOT = f"{TEXTURES_ROOT}/weapons"  # Weapon icons are named after WeaponType, like SWORD.png
+WEAPON_ICON_SIZE = 32
+ASSET_MANIFEST = tuple(  # Image variants loaded at startup, as (path, size, angle, tint) with optional tails
+    (f"{WEAPON_TEXTURES_ROOT}/{name}.png", (WEAPON_ICON_SIZE, WEAPON_ICON_SIZE)) for name in ("SWORD", "HAMMER", "PIKE")
+)
+ASSET_BUDGET_BYTES = 64 * 1024 * 1024  # Pixel data the asset manager keeps before evicting
 TILE_SIZE = 32
 PLAYER_SIZE = 20
 PLAYER_SPEED = TILE_SIZE
@@ -18,10 +41,22 @@ NPC_COLOR = (0, 255, 0)  # Green for NPCs
 ENEMY_COLOR = (255, 0, 0)  # Red for enemies
 ENEMY_STARTING_POSITION = (100, 100)  # Example enemy starting position
 ENEMY_SIZE = 20
-ENEMY_SPEED = 0.75  # Much slower movement - 1 pixel per frame
+ENEMY_SPEED = 0.75  # Much slower movement - pixels per logic tick
 ENEMY_AGGRO_RADIUS = TILE_SIZE * 5  # Enemies will chase player within this radius
+ENEMY_CHASE_STEPS = ENEMY_AGGRO_RADIUS // TILE_SIZE * 2  # Chasing enemies give up once their way to the player is longer than this many tiles
+FLOW_FIELD_RADIUS_TILES = ENEMY_CHASE_STEPS  # Pathfinding window around the player, holds every way of up to ENEMY_CHASE_STEPS tiles
+ENEMY_WAKE_RADIUS = (FLOW_FIELD_RADIUS_TILES + 1) * TILE_SIZE * 3 // 2  # Enemies further than this from the player are dormant, covers the whole window
 ENEMY_DAMAGE = 10
-FPS = 60
+USE_ENEMY_SWARM = False  # Batch enemy updates with NumPy (see enemy_swarm.py)
+FPS = 60  # Logic ticks per second, enemy speeds and all timers count these ticks
+MAX_FPS = 60  # Cap on drawn frames per second, 0 for no cap (see frame_scheduler.py)
+MAX_CATCH_UP_TICKS = 5  # Most logic ticks run in one frame after a slow one, the rest are dropped
+DEFERRED_WORK_BUDGET_MS = 2.0  # Frame time given to deferred jobs like terrain prefetching
+USE_DIRTY_RECTS = True  # Present only the changed screen regions while the camera is still
+DIRTY_RECTS_MAX = 512  # More rects than this in a frame fall back to a full redraw
+PROFILER_WINDOW_FRAMES = 120  # Rolling window for per-phase frame statistics
+PROFILER_CAPTURE_FRAMES = 300  # Frames recorded by a cProfile capture
+PROFILER_CAPTURE_PATH = "profile_capture.prof"
 MAP_WIDTH = 1920
 MAP_HEIGHT = 1080
 
@@ -30,8 +65,20 @@ COLOR_BLACK = (0, 0, 0)
 
 FONT_NAME = "freesansbold.ttf"
 FONT_SIZE = 16
+TEXT_CACHE_SIZE = 512  # Rendered text surfaces kept by TextCache
 
 
+TILE_COLORS = {
+    0: (50, 150, 50),  # grass - green
+    1: (50, 50, 150),  # water - blue
+    2: (100, 100, 100),  # mountain - gray
+    3: (0, 100, 0)  # forest - dark green
+}
+TERRAIN_CHUNK_TILES = 16  # Terrain is pre-rendered in chunks of 16x16 tiles
+TERRAIN_CACHE_MAX_CHUNKS = 64  # LRU bound on pre-rendered chunks kept in memory
+WORLD_CHUNK_TILES = 64  # Streamed worlds are paged from disk in chunks of 64x64 tiles
+WORLD_VIEW_RADIUS_CHUNKS = 2  # Chunks kept resident around the camera and the player
+
 TILE_VALUES = {
     0: "empty",
     1: "water",
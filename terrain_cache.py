@@ -0,0 +1,138 @@
+from collections import OrderedDict
+import pygame
+import statics
+
+
+class TerrainChunkCache:
+    """Pre-rendered terrain split into square chunks of tiles.
+
+    Each chunk is drawn to its own surface once and then blitted as a whole,
+    so a frame only costs one blit per chunk overlapping the camera. Chunks
+    are kept in LRU order and the least recently drawn ones are dropped once
+    more than max_chunks are cached.
+    """
+
+    def __init__(self, chunk_tiles: int = statics.TERRAIN_CHUNK_TILES, max_chunks: int = statics.TERRAIN_CACHE_MAX_CHUNKS):
+        self.chunk_tiles = chunk_tiles
+        self.max_chunks = max_chunks
+        self._chunks: OrderedDict[tuple[int, int], pygame.Surface] = OrderedDict()
+        self._source = None  # map_data the cached chunks were rendered from
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def clear(self):
+        self._chunks.clear()
+        self._source = None
+
+    def invalidate_tile(self, tile_x: int, tile_y: int):
+        """Drop the chunk containing a tile so it is re-rendered on next draw."""
+        self._chunks.pop((tile_x // self.chunk_tiles, tile_y // self.chunk_tiles), None)
+
+    def invalidate_rect(self, left: int, top: int, right: int, bottom: int):
+        """Drop the chunks overlapping the tiles from (left, top) to (right, bottom), both included."""
+        chunk_tiles = self.chunk_tiles
+        for chunk in [chunk for chunk in self._chunks
+                      if left // chunk_tiles <= chunk[0] <= right // chunk_tiles
+                      and top // chunk_tiles <= chunk[1] <= bottom // chunk_tiles]:
+            del self._chunks[chunk]
+
+    def _render_chunk(self, map_data, chunk_x: int, chunk_y: int) -> pygame.Surface:
+        tile_size = statics.TILE_SIZE
+        map_width = len(map_data[0])
+        map_height = len(map_data)
+        start_x = chunk_x * self.chunk_tiles
+        start_y = chunk_y * self.chunk_tiles
+        end_x = min(start_x + self.chunk_tiles, map_width)
+        end_y = min(start_y + self.chunk_tiles, map_height)
+
+        surface = pygame.Surface(((end_x - start_x) * tile_size, (end_y - start_y) * tile_size))
+        tile_colors = statics.TILE_COLORS
+        for y in range(start_y, end_y):
+            row = map_data[y]
+            draw_y = (y - start_y) * tile_size
+            for x in range(start_x, end_x):
+                color = tile_colors.get(row[x], statics.COLOR_WHITE)
+                surface.fill(color, ((x - start_x) * tile_size, draw_y, tile_size, tile_size))
+        return surface
+
+    def get_chunk(self, map_data, chunk_x: int, chunk_y: int) -> pygame.Surface:
+        """Get a chunk surface, rendering it if it is not cached."""
+        if map_data is not self._source:
+            self.clear()
+            self._source = map_data
+        key = (chunk_x, chunk_y)
+        chunk = self._chunks.get(key)
+        if chunk is None:
+            chunk = self._render_chunk(map_data, chunk_x, chunk_y)
+            self._chunks[key] = chunk
+            while len(self._chunks) > self.max_chunks:
+                self._chunks.popitem(last=False)
+        else:
+            self._chunks.move_to_end(key)
+        return chunk
+
+    def prefetch(self, map_data, camera_x: int, camera_y: int, view_width: int, view_height: int,
+                 margin_chunks: int = 1) -> bool:
+        """Render one missing chunk in or around the view, nearest to its center first. Returns whether more are missing.
+
+        Meant to run as deferred work, so scrolling finds the chunks it needs already rendered. Nothing is rendered
+        when the view and its margin hold more chunks than the cache keeps, since they would evict each other.
+        """
+        if not map_data:
+            return False
+        chunk_pixels = self.chunk_tiles * statics.TILE_SIZE
+        map_chunks_x = (len(map_data[0]) + self.chunk_tiles - 1) // self.chunk_tiles
+        map_chunks_y = (len(map_data) + self.chunk_tiles - 1) // self.chunk_tiles
+        start_x = max(camera_x // chunk_pixels - margin_chunks, 0)
+        start_y = max(camera_y // chunk_pixels - margin_chunks, 0)
+        end_x = min((camera_x + view_width) // chunk_pixels + 1 + margin_chunks, map_chunks_x)
+        end_y = min((camera_y + view_height) // chunk_pixels + 1 + margin_chunks, map_chunks_y)
+        if (end_x - start_x) * (end_y - start_y) > self.max_chunks:
+            return False
+
+        cached = self._chunks if map_data is self._source else {}
+        missing = [(chunk_x, chunk_y) for chunk_y in range(start_y, end_y) for chunk_x in range(start_x, end_x)
+                   if (chunk_x, chunk_y) not in cached]
+        if not missing:
+            return False
+        center_x = (camera_x + view_width / 2) / chunk_pixels - 0.5
+        center_y = (camera_y + view_height / 2) / chunk_pixels - 0.5
+        self.get_chunk(map_data, *min(missing, key=lambda chunk: (chunk[0] - center_x) ** 2 + (chunk[1] - center_y) ** 2))
+        return len(missing) > 1
+
+    def draw(self, screen, map_data, camera_x: int, camera_y: int):
+        """Draw the part of the map under the camera. Areas beyond the map stay black."""
+        screen.fill(statics.COLOR_BLACK)
+        if not map_data:
+            return
+        self._blit_chunks(screen, map_data, camera_x, camera_y, screen.get_rect())
+
+    def draw_rects(self, screen, map_data, camera_x: int, camera_y: int, rects):
+        """Redraw the map only inside the given screen rects, leaving the rest of the screen untouched."""
+        screen_rect = screen.get_rect()
+        previous_clip = screen.get_clip()
+        for rect in rects:
+            area = screen_rect.clip(rect)
+            if not area:
+                continue
+            screen.set_clip(area)
+            screen.fill(statics.COLOR_BLACK, area)
+            if map_data:
+                self._blit_chunks(screen, map_data, camera_x, camera_y, area)
+        screen.set_clip(previous_clip)
+
+    def _blit_chunks(self, screen, map_data, camera_x: int, camera_y: int, area):
+        chunk_pixels = self.chunk_tiles * statics.TILE_SIZE
+        map_chunks_x = (len(map_data[0]) + self.chunk_tiles - 1) // self.chunk_tiles
+        map_chunks_y = (len(map_data) + self.chunk_tiles - 1) // self.chunk_tiles
+
+        start_chunk_x = max((camera_x + area.left) // chunk_pixels, 0)
+        start_chunk_y = max((camera_y + area.top) // chunk_pixels, 0)
+        end_chunk_x = min((camera_x + area.right) // chunk_pixels + 1, map_chunks_x)
+        end_chunk_y = min((camera_y + area.bottom) // chunk_pixels + 1, map_chunks_y)
+
+        for chunk_y in range(start_chunk_y, end_chunk_y):
+            for chunk_x in range(start_chunk_x, end_chunk_x):
+                chunk = self.get_chunk(map_data, chunk_x, chunk_y)
+                screen.blit(chunk, (chunk_x * chunk_pixels - camera_x, chunk_y * chunk_pixels - camera_y))
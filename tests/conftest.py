@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules live at the top of the repository and are imported directly, like main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Map editor tests build engines, which must never open a window
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
@@ -0,0 +1,85 @@
+import pytest
+
+import map_io
+import snapshot
+import statics
+from game_engine import GameEngine
+from interfaces import EntityType
+
+MAP_NAME = "wall.lmap"
+WALL_X = 8
+WALL_ROWS = range(3, 12)  # A nine tile water wall between the enemy and the player
+ENEMY_TILE = (6, 7)
+PLAYER_TILE = (10, 7)
+
+
+@pytest.fixture
+def maps_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(statics, "MAPS_ROOT", str(tmp_path))
+    grid = map_io.TileGrid(20, 16)
+    for tile_y in WALL_ROWS:
+        grid[tile_y][WALL_X] = 1
+    map_io.write_map(str(tmp_path / MAP_NAME), grid)
+    return tmp_path
+
+
+def tile_center(tile):
+    return tuple(coordinate * statics.TILE_SIZE + statics.TILE_SIZE // 2 for coordinate in tile)
+
+
+def enemy_position(game_engine: GameEngine):
+    swarm = game_engine.game_logic.enemy_swarm
+    if swarm is not None:
+        return float(swarm.x[0]), float(swarm.y[0])
+    enemy = next(entity for entity in game_engine.game_logic.entities if entity.entity_type == EntityType.ENEMY)
+    return enemy.x, enemy.y
+
+
+def enemy_tile(game_engine: GameEngine):
+    return tuple(int(coordinate // statics.TILE_SIZE) for coordinate in enemy_position(game_engine))
+
+
+def start_game(use_enemy_swarm) -> GameEngine:
+    if use_enemy_swarm:
+        pytest.importorskip("numpy")
+    game_engine = GameEngine(use_enemy_swarm=use_enemy_swarm, headless=True)
+    game_engine.initialize()
+    game_engine.map_engine.initialize()
+    game_engine.map_engine.load_map(MAP_NAME)
+    game_engine.player.x, game_engine.player.y = tile_center(PLAYER_TILE)
+    game_engine.player.health = 1_000_000
+    game_engine.game_logic.create_entity(name="Enemy", entity_type=EntityType.ENEMY,
+                                         starting_pos=tile_center(ENEMY_TILE), size=statics.ENEMY_SIZE)
+    return game_engine
+
+
+def chase(game_engine: GameEngine, ticks: int = 2000):
+    for _ in range(ticks):
+        game_engine.map_engine.simulate()
+        if enemy_tile(game_engine) == PLAYER_TILE:
+            return
+
+
+@pytest.mark.parametrize("use_enemy_swarm", [False, True])
+def test_enemy_walks_around_a_wall(maps_root, use_enemy_swarm):
+    game_engine = start_game(use_enemy_swarm)
+    # The way around the wall leaves the aggro radius, the enemy must keep following it to the player
+    chase(game_engine)
+    assert enemy_tile(game_engine) == PLAYER_TILE
+
+
+@pytest.mark.parametrize("use_enemy_swarm", [False, True])
+def test_chase_survives_a_snapshot(maps_root, use_enemy_swarm):
+    game_engine = start_game(use_enemy_swarm)
+    player_x, player_y = game_engine.player.x, game_engine.player.y
+    # Walk until the enemy is on the far side of the wall's end, outside the aggro radius
+    for _ in range(2000):
+        game_engine.map_engine.simulate()
+        enemy_x, enemy_y = enemy_position(game_engine)
+        if enemy_tile(game_engine)[1] > WALL_ROWS[-1]:
+            break
+    assert ((enemy_x - player_x) ** 2 + (enemy_y - player_y) ** 2) ** 0.5 >= statics.ENEMY_AGGRO_RADIUS
+
+    snapshot.restore(game_engine, snapshot.capture(game_engine))
+    chase(game_engine)
+    assert enemy_tile(game_engine) == PLAYER_TILE
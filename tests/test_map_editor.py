@@ -0,0 +1,99 @@
+import random
+
+import pytest
+
+import map_io
+import statics
+from game_engine import GameEngine
+from map_editor.map_editor import MapEditor
+
+MAP_NAME = "edit.lmap"
+
+
+@pytest.fixture
+def maps_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(statics, "MAPS_ROOT", str(tmp_path))
+    map_io.write_map(str(tmp_path / MAP_NAME), map_io.TileGrid(40, 30))
+    return tmp_path
+
+
+def open_editor() -> MapEditor:
+    game_engine = GameEngine(is_map_editor=True, headless=True)
+    editor = MapEditor(game_engine)
+    editor.open_map(MAP_NAME)
+    return editor
+
+
+def tiles(editor: MapEditor) -> list:
+    return [list(row) for row in editor.game_engine.map_engine.map_data]
+
+
+def test_undo_redo_round_trip(maps_root):
+    editor = open_editor()
+    rng = random.Random(4)
+    states = [tiles(editor)]
+    for _ in range(30):
+        editor.change_tile(rng.randrange(40), rng.randrange(30), rng.randrange(1, 4))
+        if tiles(editor) != states[-1]:
+            states.append(tiles(editor))
+
+    for state in reversed(states[:-1]):
+        assert editor.undo()
+        assert tiles(editor) == state
+    assert not editor.undo()
+    for state in states[1:]:
+        assert editor.redo()
+        assert tiles(editor) == state
+    assert not editor.redo()
+    editor.close()
+
+
+def test_new_edit_clears_redo(maps_root):
+    editor = open_editor()
+    editor.change_tile(1, 1, 2)
+    editor.undo()
+    editor.change_tile(2, 2, 3)
+    assert not editor.redo()
+    assert tiles(editor)[1][1] == 0 and tiles(editor)[2][2] == 3
+    editor.close()
+
+
+def test_undone_edits_survive_a_crash(maps_root):
+    editor = open_editor()
+    editor.change_tile(3, 4, 2)
+    editor.change_tile(5, 6, 3)
+    editor.undo()
+    expected = tiles(editor)
+    editor.journal._file.close()  # A crash: nothing is saved and the journal stays behind
+
+    reopened = open_editor()
+    assert tiles(reopened) == expected
+    reopened.close()
+    assert [list(row) for row in map_io.read_map(str(maps_root / MAP_NAME))] == expected
+
+
+def test_bulk_edits_undo_and_redo_as_one_step(maps_root):
+    editor = open_editor()
+    states = [tiles(editor)]
+    editor.fill_rect(2, 2, 12, 9, 2)
+    states.append(tiles(editor))
+    editor.flood_fill(0, 0, 3)
+    states.append(tiles(editor))
+    editor.begin_stroke()
+    editor.paint(5, 5, 1, radius=2)
+    editor.paint(15, 8, 1, radius=2, from_tile=(5, 5))
+    editor.end_stroke()
+    states.append(tiles(editor))
+    editor.copy_region(0, 0, 9, 9)
+    editor.paste(25, 15)
+    states.append(tiles(editor))
+
+    for state in reversed(states[:-1]):
+        assert editor.undo()
+        assert tiles(editor) == state
+    for state in states[1:]:
+        assert editor.redo()
+        assert tiles(editor) == state
+    editor.close()
+
+    assert [list(row) for row in map_io.read_map(str(maps_root / MAP_NAME))] == states[-1]
@@ -0,0 +1,103 @@
+from array import array
+
+import map_io
+from map_journal import JOURNAL_HEADER, MapJournal, TileEdits, encode_block, read_journal
+
+
+def _edits(*tiles):
+    """Build TileEdits from (x, y, old, new) tuples."""
+    xs, ys, old, new = zip(*tiles)
+    return TileEdits(array("I", xs), array("I", ys), array("H", old), array("H", new))
+
+
+def _write_map(path, width=8, height=6):
+    map_io.write_map(str(path), map_io.TileGrid(width, height))
+    return map_io.read_map(str(path)).copy()
+
+
+def _apply(map_data, edits):
+    for tile_x, tile_y, tile_type in zip(edits.xs, edits.ys, edits.new):
+        map_data[tile_y][tile_x] = tile_type
+
+
+def test_open_truncates_torn_block(tmp_path):
+    map_path = tmp_path / "m.lmap"
+    _write_map(map_path)
+    first = _edits((1, 1, 0, 2), (2, 1, 0, 2))
+    second = _edits((3, 4, 0, 1))
+    journal = MapJournal(str(map_path))
+    journal.open()
+    journal.append(first)
+    journal.append(second)
+    complete_size = journal.size
+    journal._file.close()  # A crash: the journal is left behind without close()
+
+    # Half of a third block, as if the crash hit while it was being written
+    torn = encode_block(_edits((5, 5, 0, 3), (6, 5, 0, 3)))
+    with open(journal.path, "ab") as f:
+        f.write(torn[:len(torn) // 2])
+    assert read_journal(journal.path) == [first, second]
+
+    reopened = MapJournal(str(map_path))
+    reopened.open()
+    assert reopened.size == complete_size
+    third = _edits((0, 0, 0, 1))
+    reopened.append(third)
+    reopened._file.close()
+    assert read_journal(reopened.path) == [first, second, third]
+
+
+def test_replay_applies_blocks_to_the_base_map(tmp_path):
+    map_path = tmp_path / "m.lmap"
+    map_data = _write_map(map_path)
+    journal = MapJournal(str(map_path))
+    journal.open()
+    journal.append(_edits((1, 2, 0, 3), (4, 5, 0, 1)))
+    journal.append(_edits((1, 2, 3, 2)))
+    journal._file.close()
+
+    assert MapJournal(str(map_path)).replay(map_data) == 3
+    assert map_data[2][1] == 2 and map_data[5][4] == 1
+
+
+def test_compaction_keeps_later_edits(tmp_path):
+    map_path = tmp_path / "m.lmap"
+    map_data = _write_map(map_path)
+    journal = MapJournal(str(map_path))
+    journal.open()
+    before = _edits((1, 1, 0, 2), (2, 2, 0, 3))
+    journal.append(before)
+    _apply(map_data, before)
+
+    journal.compact(map_data)
+    # Made while the compaction may still be running, so it must survive whichever finishes first
+    after = _edits((3, 3, 0, 1))
+    journal.append(after)
+    _apply(map_data, after)
+    journal.wait()
+
+    assert read_journal(journal.path) == [after]
+    assert journal.size == JOURNAL_HEADER.size + len(encode_block(after))
+    base = map_io.read_map(str(map_path))
+    assert base[1][1] == 2 and base[2][2] == 3 and base[3][3] == 0
+
+    # The base map plus what is left of the journal is the edited map
+    journal.close()
+    reopened = map_io.read_map(str(map_path)).copy()
+    MapJournal(str(map_path)).replay(reopened)
+    assert [list(row) for row in reopened] == [list(row) for row in map_data]
+
+
+def test_close_removes_a_fully_compacted_journal(tmp_path):
+    map_path = tmp_path / "m.lmap"
+    map_data = _write_map(map_path)
+    journal = MapJournal(str(map_path))
+    journal.open()
+    edits = _edits((0, 1, 0, 2))
+    journal.append(edits)
+    _apply(map_data, edits)
+    journal.compact(map_data)
+    journal.close()
+
+    assert read_journal(journal.path) == []
+    assert map_io.read_map(str(map_path))[1][0] == 2
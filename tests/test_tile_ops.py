@@ -0,0 +1,74 @@
+import random
+from collections import deque
+
+import pytest
+
+import map_io
+from tile_ops import TileRegion, flood_fill_tiles, rect_tiles
+
+
+def naive_flood_fill(rows, tile_x, tile_y) -> set:
+    """Plain 4-connected BFS, the reference for the scanline fill."""
+    height, width = len(rows), len(rows[0])
+    tile_type = rows[tile_y][tile_x]
+    seen = {(tile_x, tile_y)}
+    queue = deque(seen)
+    while queue:
+        x, y = queue.popleft()
+        for next_x, next_y in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if (0 <= next_x < width and 0 <= next_y < height and (next_x, next_y) not in seen
+                    and rows[next_y][next_x] == tile_type):
+                seen.add((next_x, next_y))
+                queue.append((next_x, next_y))
+    return seen
+
+
+def random_rows(rng, width, height, tile_types):
+    return [[rng.choice(tile_types) for _ in range(width)] for _ in range(height)]
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("as_grid", [False, True])
+def test_flood_fill_matches_bfs(seed, as_grid):
+    rng = random.Random(seed)
+    width, height = rng.randint(1, 40), rng.randint(1, 40)
+    # Few tile types give large winding areas, many give small scattered ones
+    rows = random_rows(rng, width, height, range(rng.choice((2, 3, 5))))
+    map_data = map_io.TileGrid.from_rows(rows) if as_grid else rows
+    for _ in range(5):
+        tile_x, tile_y = rng.randrange(width), rng.randrange(height)
+        xs, ys = flood_fill_tiles(map_data, tile_x, tile_y)
+        selected = list(zip(xs, ys))
+        assert len(selected) == len(set(selected))
+        assert set(selected) == naive_flood_fill(rows, tile_x, tile_y)
+
+
+def test_flood_fill_wide_tile_types():
+    # Tile ids above 255 use a uint16 grid, which has no byte translation shortcut
+    rows = [[300, 300, 7], [7, 300, 300], [300, 7, 300]]
+    xs, ys = flood_fill_tiles(map_io.TileGrid.from_rows(rows), 0, 0)
+    assert set(zip(xs, ys)) == naive_flood_fill(rows, 0, 0)
+
+
+def test_flood_fill_outside_the_map_selects_nothing():
+    rows = [[0, 0], [0, 0]]
+    for tile_x, tile_y in ((-1, 0), (0, 2), (2, 0)):
+        xs, ys = flood_fill_tiles(rows, tile_x, tile_y)
+        assert not xs and not ys
+
+
+def test_rect_tiles_are_clipped_to_the_map():
+    xs, ys = rect_tiles([[0] * 4 for _ in range(3)], 5, -2, 2, 1)
+    assert list(zip(xs, ys)) == [(2, 0), (3, 0), (2, 1), (3, 1)]
+
+
+def test_region_paste_round_trip():
+    rng = random.Random(1)
+    rows = random_rows(rng, 10, 8, range(4))
+    region = TileRegion.copy_from(rows, 2, 1, 5, 4)
+    xs, ys, tiles = region.paste_tiles(rows, 2, 1)
+    assert [rows[y][x] for x, y in zip(xs, ys)] == list(tiles)
+    # Pasting over the edge keeps only the part inside the map
+    xs, ys, tiles = region.paste_tiles(rows, 8, 6)
+    assert list(zip(xs, ys)) == [(8, 6), (9, 6), (8, 7), (9, 7)]
+    assert list(tiles) == [rows[1][2], rows[1][3], rows[2][2], rows[2][3]]
@@ -0,0 +1,86 @@
+from typing import Callable, NamedTuple, Optional
+
+import pygame
+import statics
+
+
+class AtlasRegion(NamedTuple):
+    """Where a sprite lives on the atlas surface."""
+    area: pygame.Rect  # Sub-rect of the atlas surface holding the trimmed sprite
+    offset_x: int  # Position of the trimmed area relative to the center of the original image
+    offset_y: int
+
+
+class TextureAtlas:
+    """One surface holding many named sprites, so a batch of them is drawn with a single Surface.blits call.
+
+    Sprites are trimmed to their visible pixels before they are packed in
+    rows, and each region keeps where its trimmed area sat relative to the
+    center of the original image. Drawing a region centered on a point
+    therefore gives the same pixels as drawing the whole image there.
+    Converting surfaces needs a display, so build() is called once it exists
+    (see MapEngine.initialize). An atlas that was never built is built on
+    first use.
+    """
+
+    def __init__(self, sprites: dict[str, str], load: Callable[[str], pygame.Surface],
+                 max_width: int = statics.ATLAS_MAX_WIDTH):
+        self.paths = dict(sprites)  # sprite name -> image path
+        self.load = load  # Loads the image at a path, like ImageCache.load
+        self.max_width = max_width
+        self.surface: Optional[pygame.Surface] = None
+        self.regions: dict[str, AtlasRegion] = {}
+
+    def build(self):
+        """Load, trim and pack every sprite onto a fresh atlas surface."""
+        trimmed = []
+        for name, path in self.paths.items():
+            image = self.load(path)
+            bounds = image.get_bounding_rect()
+            if bounds.width == 0 or bounds.height == 0:
+                bounds = pygame.Rect(0, 0, 1, 1)
+            trimmed.append((name, image, bounds,
+                            bounds.x - image.get_width() // 2, bounds.y - image.get_height() // 2))
+
+        # Shelf packing, tallest sprites first, with a pixel of padding against bleeding
+        placements = []
+        x = y = shelf_height = atlas_width = 0
+        for name, image, bounds, offset_x, offset_y in sorted(trimmed, key=lambda item: -item[2].height):
+            if x and x + bounds.width > self.max_width:
+                x = 0
+                y += shelf_height + 1
+                shelf_height = 0
+            placements.append((name, image, bounds, offset_x, offset_y, x, y))
+            x += bounds.width + 1
+            shelf_height = max(shelf_height, bounds.height)
+            atlas_width = max(atlas_width, x)
+
+        surface = pygame.Surface((max(atlas_width, 1), max(y + shelf_height, 1)), pygame.SRCALPHA).convert_alpha()
+        surface.fill((0, 0, 0, 0))
+        regions = {}
+        for name, image, bounds, offset_x, offset_y, x, y in placements:
+            surface.blit(image, (x, y), bounds)
+            regions[name] = AtlasRegion(pygame.Rect(x, y, bounds.width, bounds.height), offset_x, offset_y)
+        self.surface = surface
+        self.regions = regions
+
+    def region(self, name: str) -> AtlasRegion:
+        if self.surface is None:
+            self.build()
+        return self.regions[name]
+
+    def blit(self, screen, name: str, center) -> pygame.Rect:
+        """Draw one sprite centered on a screen position and return the rect it touched."""
+        area, offset_x, offset_y = self.region(name)
+        return screen.blit(self.surface, (center[0] + offset_x, center[1] + offset_y), area)
+
+    def blit_many(self, screen, name: str, centers) -> list:
+        """Draw one sprite centered on each screen position in a single batched call and return the touched rects."""
+        area, offset_x, offset_y = self.region(name)
+        surface = self.surface
+        return screen.blits([(surface, (x + offset_x, y + offset_y), area) for x, y in centers])
+
+    def clear(self):
+        """Drop the atlas surface. It is rebuilt on next use."""
+        self.surface = None
+        self.regions = {}
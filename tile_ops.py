@@ -0,0 +1,153 @@
+from array import array
+from typing import NamedTuple
+
+# Bulk tile selections for the map editor. Every function returns the selected
+# tiles as two parallel array("I") of x and y coordinates, clipped to the map,
+# which MapEngine.change_tiles writes in one go.
+
+
+def _bounds(map_data) -> tuple[int, int]:
+    return (len(map_data[0]) if map_data else 0), len(map_data)
+
+
+def rect_tiles(map_data, x0: int, y0: int, x1: int, y1: int) -> tuple[array, array]:
+    """Select the rectangle between two corner tiles, both included, in row-major order."""
+    width, height = _bounds(map_data)
+    left, right = max(min(x0, x1), 0), min(max(x0, x1) + 1, width)
+    top, bottom = max(min(y0, y1), 0), min(max(y0, y1) + 1, height)
+    xs = array("I")
+    ys = array("I")
+    if left >= right or top >= bottom:
+        return xs, ys
+    row = array("I", range(left, right))
+    for y in range(top, bottom):
+        xs.extend(row)
+        ys.extend(array("I", [y]) * len(row))
+    return xs, ys
+
+
+def brush_tiles(map_data, x0: int, y0: int, x1: int, y1: int, radius: int) -> tuple[array, array]:
+    """Select the tiles a round brush of the given radius covers when dragged from one tile to another.
+
+    The brush is stamped on every tile of the line between them, so fast drags leave no gaps. Each tile is selected once.
+    """
+    width, height = _bounds(map_data)
+    offsets = [(dx, dy) for dy in range(-radius, radius + 1) for dx in range(-radius, radius + 1)
+               if dx * dx + dy * dy <= radius * radius + radius]
+    selected = {}
+    for cx, cy in line_tiles(x0, y0, x1, y1):
+        for dx, dy in offsets:
+            x, y = cx + dx, cy + dy
+            if 0 <= x < width and 0 <= y < height:
+                selected[y * width + x] = None
+    return array("I", [index % width for index in selected]), array("I", [index // width for index in selected])
+
+
+def line_tiles(x0: int, y0: int, x1: int, y1: int) -> list[tuple[int, int]]:
+    """Get the tiles on the line between two tiles (Bresenham), both ends included."""
+    dx, dy = abs(x1 - x0), -abs(y1 - y0)
+    step_x = 1 if x0 < x1 else -1
+    step_y = 1 if y0 < y1 else -1
+    error = dx + dy
+    tiles = [(x0, y0)]
+    while (x0, y0) != (x1, y1):
+        double_error = 2 * error
+        if double_error >= dy:
+            error += dy
+            x0 += step_x
+        if double_error <= dx:
+            error += dx
+            y0 += step_y
+        tiles.append((x0, y0))
+    return tiles
+
+
+def _row_mask(row, tile_type: int) -> bytearray:
+    # 1 where the row holds tile_type, 0 elsewhere
+    if isinstance(row, memoryview) and row.format == "B":
+        table = bytearray(256)
+        if 0 <= tile_type < 256:
+            table[tile_type] = 1
+        return bytearray(row.tobytes().translate(table))
+    return bytearray(tile == tile_type for tile in row)
+
+
+def flood_fill_tiles(map_data, tile_x: int, tile_y: int) -> tuple[array, array]:
+    """Select the 4-connected area of tiles of the same type as the given one.
+
+    Scanline fill: the area is walked in horizontal spans whose ends are found
+    with bytes searches over per-row masks, so the Python work grows with the
+    number of spans rather than the number of tiles.
+    """
+    width, height = _bounds(map_data)
+    xs = array("I")
+    ys = array("I")
+    if not (0 <= tile_x < width and 0 <= tile_y < height):
+        return xs, ys
+    tile_type = map_data[tile_y][tile_x]
+    masks: list = [None] * height  # Built on demand, filled tiles are cleared so they are never revisited
+    masks[tile_y] = _row_mask(map_data[tile_y], tile_type)
+    columns = array("I", range(width))  # Spans are copied out of this instead of built from ranges
+    seeds = [(tile_x, tile_y)]
+    while seeds:
+        x, y = seeds.pop()
+        mask = masks[y]
+        if not mask[x]:
+            continue
+        left = mask.rfind(0, 0, x) + 1
+        right = mask.find(0, x)
+        if right < 0:
+            right = width
+        mask[left:right] = bytes(right - left)
+        xs.extend(columns[left:right])
+        ys.extend(array("I", [y]) * (right - left))
+        for next_y in (y - 1, y + 1):
+            if not 0 <= next_y < height:
+                continue
+            next_mask = masks[next_y]
+            if next_mask is None:
+                next_mask = masks[next_y] = _row_mask(map_data[next_y], tile_type)
+            # One seed per run of fillable tiles next to the span
+            position = left
+            while position < right:
+                start = next_mask.find(1, position, right)
+                if start < 0:
+                    break
+                seeds.append((start, next_y))
+                position = next_mask.find(0, start, right)
+                if position < 0:
+                    break
+    return xs, ys
+
+
+class TileRegion(NamedTuple):
+    """A rectangle of tiles copied out of a map, stored row-major."""
+    width: int
+    height: int
+    tiles: array
+
+    @classmethod
+    def copy_from(cls, map_data, x0: int, y0: int, x1: int, y1: int) -> "TileRegion":
+        """Copy the rectangle between two corner tiles, both included and clipped to the map."""
+        xs, ys = rect_tiles(map_data, x0, y0, x1, y1)
+        if not xs:
+            return cls(0, 0, array("H"))
+        left, top = xs[0], ys[0]
+        width, height = xs[-1] - left + 1, ys[-1] - top + 1
+        tiles = array("H")
+        for y in range(top, top + height):
+            tiles.extend(map_data[y][left:left + width])
+        return cls(width, height, tiles)
+
+    def paste_tiles(self, map_data, left: int, top: int) -> tuple[array, array, array]:
+        """Get the tiles and tile types pasting the region with its top-left corner on a tile writes, clipped to the map."""
+        if not self.tiles:
+            return array("I"), array("I"), array("H")
+        xs, ys = rect_tiles(map_data, left, top, left + self.width - 1, top + self.height - 1)
+        if not xs:
+            return xs, ys, array("H")
+        first_x, last_x = xs[0] - left, xs[-1] - left + 1
+        tiles = array("H")
+        for y in range(ys[0] - top, ys[-1] - top + 1):
+            tiles.extend(self.tiles[y * self.width + first_x:y * self.width + last_x])
+        return xs, ys, tiles